@@ -4,6 +4,32 @@ __version__ = "0.2.2"
 from skillmodels.likelihood_function import get_maximization_inputs
 from skillmodels.simulate_data import simulate_dataset
 from skillmodels.filtered_states import get_filtered_states
+from skillmodels.smoothed_states import get_smoothed_states
+from skillmodels.posterior_draws import draw_posterior_states
+from skillmodels.scoring import get_scorer
+from skillmodels.projection import project_states
+from skillmodels.fit import fit
+from skillmodels.start_params import get_start_params
+from skillmodels.multistart import fit_multistart
+from skillmodels.two_step import fit_two_step
+from skillmodels.bootstrap import bootstrap
+from skillmodels.inference import standard_errors
+from skillmodels.monte_carlo import run_monte_carlo
 
 
-__all__ = ["get_maximization_inputs", "simulate_dataset", "get_filtered_states"]
+__all__ = [
+    "get_maximization_inputs",
+    "simulate_dataset",
+    "get_filtered_states",
+    "get_smoothed_states",
+    "draw_posterior_states",
+    "get_scorer",
+    "project_states",
+    "fit",
+    "get_start_params",
+    "fit_multistart",
+    "fit_two_step",
+    "bootstrap",
+    "standard_errors",
+    "run_monte_carlo",
+]
@@ -0,0 +1,188 @@
+"""Bootstrap standard errors with weighted likelihoods.
+
+Drawing individuals with replacement is equivalent to weighting the log likelihood
+contribution of each individual with the number of times it was drawn. The
+bootstrap therefore keeps the processed data fixed and evaluates one compiled
+likelihood with different weights instead of processing the data and compiling the
+likelihood for each bootstrap sample.
+
+"""
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from skillmodels.fit import fit
+from skillmodels.fit import get_jacobian_type
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.utilities import save_atomically
+
+
+def bootstrap(
+    model_dict,
+    data,
+    params,
+    n_draws=200,
+    algorithm="lbfgs",
+    algo_options=None,
+    seed=0,
+    n_threads=1,
+    output_dir=None,
+    maximization_inputs=None,
+):
+    """Calculate bootstrap standard errors of the estimated parameters.
+
+    Each bootstrap replication draws multinomial weights for the individuals and
+    maximizes the weighted log likelihood with :func:`skillmodels.fit.fit`, starting
+    from the point estimates. The replications share the compiled likelihood and can
+    run in several threads. jax releases the GIL while it evaluates the likelihood.
+
+    If output_dir is given, the result of each replication is saved there as soon as
+    it is available. Replications whose results are already saved in output_dir are
+    loaded instead of being run again, such that an interrupted bootstrap can be
+    resumed.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        params (pandas.DataFrame): The estimated parameters. They are the start values
+            of all replications.
+        n_draws (int): Number of bootstrap replications.
+        algorithm (str): "lbfgs" or "bhhh".
+        algo_options (dict): Keyword arguments for the optimizer.
+        seed (int): Seed for the bootstrap weights.
+        n_threads (int): Number of replications that run at the same time.
+        output_dir (str or pathlib.Path): Directory for the results of the
+            replications.
+        maximization_inputs (dict): Output of :func:`get_maximization_inputs` with
+            free_params=True.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "estimates" (pandas.DataFrame): The estimated parameters of each
+              replication. It has one row per replication and the params index as
+              columns.
+            - "standard_errors" (pandas.Series): Standard deviation of the estimates.
+            - "summary" (pandas.DataFrame): The log likelihood, convergence status
+              and number of iterations of each replication.
+
+    """
+    if maximization_inputs is None:
+        jacobian_type = get_jacobian_type(algorithm)
+        maximization_inputs = get_maximization_inputs(
+            model_dict, data, jacobian_type=jacobian_type, free_params=True
+        )
+    inputs = maximization_inputs
+
+    weights = get_bootstrap_weights(inputs["n_obs"], n_draws, seed)
+
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    def _run_replication(draw):
+        path = None if output_dir is None else output_dir / f"draw_{draw}.pickle"
+        if path is not None and path.exists():
+            with open(path, "rb") as f:
+                return pickle.load(f)
+
+        res = fit(
+            model_dict,
+            data,
+            params,
+            algorithm=algorithm,
+            algo_options=algo_options,
+            maximization_inputs=get_weighted_maximization_inputs(inputs, weights[draw]),
+        )
+        res["draw"] = draw
+        if path is not None:
+            save_atomically(res, path)
+        return res
+
+    if n_threads == 1:
+        results = [_run_replication(draw) for draw in range(n_draws)]
+    else:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            results = list(executor.map(_run_replication, range(n_draws)))
+
+    estimates = pd.DataFrame(
+        [res["params"]["value"].to_numpy() for res in results],
+        columns=inputs["params_template"].index,
+    )
+    estimates.index.name = "draw"
+
+    summary = pd.DataFrame(
+        {
+            "value": [res["value"] for res in results],
+            "converged": [res["converged"] for res in results],
+            "n_iterations": [res["n_iterations"] for res in results],
+        }
+    )
+    summary.index.name = "draw"
+
+    out = {
+        "estimates": estimates,
+        "standard_errors": estimates.std(),
+        "summary": summary,
+    }
+    return out
+
+
+def get_bootstrap_weights(n_obs, n_draws, seed=0):
+    """Draw the weights of individuals for bootstrap replications.
+
+    The weight of an individual is the number of times it is drawn when n_obs
+    individuals are drawn with replacement.
+
+    Args:
+        n_obs (int): Number of individuals.
+        n_draws (int): Number of bootstrap replications.
+        seed (int): Seed for the weights.
+
+    Returns:
+        numpy.ndarray: Integer array of shape (n_draws, n_obs).
+
+    """
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n_obs, np.full(n_obs, 1 / n_obs), size=n_draws)
+
+
+def get_weighted_maximization_inputs(maximization_inputs, weights):
+    """Replace the free likelihood functions by their weighted versions.
+
+    Args:
+        maximization_inputs (dict): Output of :func:`get_maximization_inputs` with
+            free_params=True.
+        weights (numpy.ndarray): Integer array with one weight per individual.
+
+    Returns:
+        dict: Copy of maximization_inputs in which free_loglike,
+            free_loglike_and_gradient and free_jacobian refer to the weighted log
+            likelihood. The jacobian repeats the scores of each individual as often
+            as the individual was drawn.
+
+    """
+    inputs = maximization_inputs
+
+    def free_loglike(free_vec):
+        out = inputs["free_loglike"](free_vec)
+        out["contributions"] = weights * out["contributions"]
+        out["value"] = float(out["contributions"].sum())
+        return out
+
+    def free_loglike_and_gradient(free_vec):
+        value, grad = inputs["free_weighted_loglike_and_gradient"](free_vec, weights)
+        return {"value": value}, grad
+
+    def free_jacobian(free_vec):
+        return np.repeat(inputs["free_jacobian"](free_vec), weights, axis=0)
+
+    weighted = {
+        **inputs,
+        "free_loglike": free_loglike,
+        "free_loglike_and_gradient": free_loglike_and_gradient,
+        "free_jacobian": free_jacobian,
+    }
+    return weighted
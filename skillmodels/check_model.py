@@ -32,6 +32,7 @@ def check_model(model_dict, labels, dimensions, anchoring):
     report += _check_anchoring(anchoring)
     report += _check_measurements(model_dict, labels["latent_factors"])
     report += _check_normalizations(model_dict, labels["latent_factors"])
+    report += _check_estimation_options(model_dict)
 
     report = "\n".join(report)
     if report != "":
@@ -143,6 +144,14 @@ def _check_loadings_are_not_normalized_to_zero(list_of_normdicts, factor):
     return report
 
 
+def _check_estimation_options(model_dict):
+    report = []
+    options = model_dict.get("estimation_options", {})
+    if options.get("memory_layout", "aos") not in ("aos", "soa"):
+        report.append("estimation_options['memory_layout'] must be 'aos' or 'soa'.")
+    return report
+
+
 def _is_list_of(candidate, type_):
     """Check if candidate is a list that only contains elements of type.
 
@@ -63,8 +63,11 @@ def add_bounds(params_df, bounds_distance=0.0):
         )
         if "lower_bound" not in df.columns:
             df["lower_bound"] = -np.inf
-        df.loc["meas_sds", "lower_bound"] = bounds_distance
-        df.loc["shock_sds", "lower_bound"] = bounds_distance
+        categories = df.index.get_level_values("category")
+        for category in ["meas_sds", "shock_sds"]:
+            # models with only one period have no shock_sds
+            if category in categories:
+                df.loc[category, "lower_bound"] = bounds_distance
 
         cholcov_index = df.query("category == 'initial_cholcovs'").index.tolist()
         ind_tups = [tup for tup in cholcov_index if _is_diagonal_entry(tup)]
@@ -72,7 +72,6 @@ def anchor_states_df(states_df, model_dict, params):
         parsing_info=parsing_info,
         dimensions=model["dimensions"],
         labels=model["labels"],
-        n_obs=1,
     )
 
     n_latent = model["dimensions"]["n_latent_factors"]
@@ -0,0 +1,213 @@
+"""Estimate a model by maximum likelihood with checkpoints."""
+import functools
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.optimizers import maximize_bhhh
+from skillmodels.optimizers import maximize_lbfgs
+from skillmodels.utilities import initialize_compilation_cache
+from skillmodels.utilities import save_atomically
+
+ALGORITHMS = ["lbfgs", "bhhh"]
+
+
+def fit(
+    model_dict,
+    data,
+    start_params,
+    algorithm="lbfgs",
+    algo_options=None,
+    checkpoint_path=None,
+    checkpoint_frequency=1,
+    compilation_cache_dir=None,
+    maximization_inputs=None,
+):
+    """Estimate a model by maximum likelihood.
+
+    The optimization runs over the free parameters (see
+    :func:`skillmodels.free_params.get_free_params_info`), such that all constraints
+    that are implied by the model specification are satisfied.
+
+    If checkpoint_path is given, the free parameters, the optimizer state and the
+    history of the optimization are regularly saved to that file. If the file exists
+    when fit is called, the optimization is resumed from the saved state and the start
+    params are ignored.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        start_params (pandas.DataFrame): Parameter DataFrame with the start values in
+            the "value" column. It has to satisfy the constraints of the model.
+        algorithm (str): "lbfgs" or "bhhh". See
+            :func:`skillmodels.optimizers.maximize_lbfgs` and
+            :func:`skillmodels.optimizers.maximize_bhhh`.
+        algo_options (dict): Keyword arguments for the optimizer, e.g.
+            max_iterations or convergence_gtol.
+        checkpoint_path (str or pathlib.Path): File in which checkpoints are saved.
+        checkpoint_frequency (int): Number of iterations between checkpoints. The
+            final state is always saved.
+        compilation_cache_dir (str or pathlib.Path): Directory of the persistent jax
+            compilation cache. If given, compiled functions are loaded from it when a
+            resumed optimization runs in a new process.
+        maximization_inputs (dict): Output of :func:`get_maximization_inputs` with
+            free_params=True. If given, model_dict and data are not processed again
+            and the compiled functions are reused.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "params" (pandas.DataFrame): The estimated parameters.
+            - "free_params" (numpy.ndarray): The estimated free parameters.
+            - "value" (float): The log likelihood at the estimated parameters.
+            - "converged" (bool): Whether a convergence criterion was satisfied.
+            - "message" (str): The reason why the optimization stopped.
+            - "n_iterations" (int)
+            - "n_evaluations" (int): Number of evaluations in line searches.
+            - "history" (pandas.DataFrame): Log likelihood value and number of
+              evaluations after each iteration.
+
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"algorithm must be one of {ALGORITHMS}, not {algorithm}.")
+
+    if compilation_cache_dir is not None:
+        initialize_compilation_cache(compilation_cache_dir)
+
+    if maximization_inputs is None:
+        jacobian_type = get_jacobian_type(algorithm)
+        maximization_inputs = get_maximization_inputs(
+            model_dict, data, jacobian_type=jacobian_type, free_params=True
+        )
+    inputs = maximization_inputs
+
+    bounds = inputs["free_params_template"]
+    lower_bounds = bounds["lower_bound"].to_numpy()
+    upper_bounds = bounds["upper_bound"].to_numpy()
+
+    state = None
+    if checkpoint_path is not None and Path(checkpoint_path).exists():
+        state = load_checkpoint(checkpoint_path, algorithm, len(bounds))
+        x = state["x"]
+    else:
+        x = inputs["free_params_from_params"](start_params)
+
+    if checkpoint_path is None:
+        callback = None
+    else:
+        callback = functools.partial(
+            _save_checkpoint_periodically,
+            path=checkpoint_path,
+            algorithm=algorithm,
+            frequency=checkpoint_frequency,
+        )
+
+    algo_options = {} if algo_options is None else algo_options
+
+    if algorithm == "lbfgs":
+
+        def loglike_and_gradient(x):
+            crit, grad = inputs["free_loglike_and_gradient"](x)
+            return crit["value"], grad
+
+        state = maximize_lbfgs(
+            loglike_and_gradient,
+            x,
+            lower_bounds,
+            upper_bounds,
+            state=state,
+            callback=callback,
+            **algo_options,
+        )
+    else:
+        state = maximize_bhhh(
+            lambda x: inputs["free_loglike"](x)["value"],
+            inputs["free_jacobian"],
+            x,
+            lower_bounds,
+            upper_bounds,
+            state=state,
+            callback=callback,
+            **algo_options,
+        )
+
+    if checkpoint_path is not None:
+        save_checkpoint(state, checkpoint_path, algorithm)
+
+    result = {
+        "params": inputs["params_from_free_params"](state["x"]),
+        "free_params": state["x"],
+        "value": state["value"],
+        "converged": state["converged"],
+        "message": state["message"],
+        "n_iterations": state["iteration"],
+        "n_evaluations": state["n_evaluations"],
+        "history": pd.DataFrame(state["history"]).set_index("iteration"),
+    }
+    return result
+
+
+def get_jacobian_type(algorithm):
+    """Choose the jacobian_type of the maximization inputs for an algorithm.
+
+    bhhh needs the jacobian of the log likelihood contributions. Reverse mode needs
+    one backward pass per observation for it, which is too memory intensive for large
+    datasets. For the other algorithms, only the gradient is calculated, for which
+    reverse mode is efficient.
+
+    Args:
+        algorithm (str): "lbfgs" or "bhhh".
+
+    Returns:
+        str: "jacfwd" or "jacrev". See
+            :func:`skillmodels.likelihood_function.get_maximization_inputs`.
+
+    """
+    return "jacfwd" if algorithm == "bhhh" else "jacrev"
+
+
+def save_checkpoint(state, path, algorithm):
+    """Save the state of an optimization.
+
+    The file is replaced atomically, such that an interruption while saving does not
+    corrupt the previous checkpoint.
+
+    Args:
+        state (dict): State of an optimizer from :mod:`skillmodels.optimizers`.
+        path (str or pathlib.Path): Path of the checkpoint file.
+        algorithm (str): Name of the algorithm that produced the state.
+
+    """
+    save_atomically({"algorithm": algorithm, "state": state}, Path(path))
+
+
+def _save_checkpoint_periodically(state, path, algorithm, frequency):
+    if state["iteration"] % frequency == 0:
+        save_checkpoint(state, path, algorithm)
+
+
+def load_checkpoint(path, algorithm, n_free_params):
+    """Load the state of an optimization and check that it can be resumed.
+
+    Args:
+        path (str or pathlib.Path): Path of the checkpoint file.
+        algorithm (str): Name of the algorithm that will resume the optimization.
+        n_free_params (int): Number of free parameters of the model.
+
+    Returns:
+        dict: The state of the optimizer.
+
+    """
+    with open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+
+    if checkpoint["algorithm"] != algorithm:
+        raise ValueError(
+            f"The checkpoint in {path} was created with {checkpoint['algorithm']} "
+            f"and cannot be resumed with {algorithm}."
+        )
+    if len(checkpoint["state"]["x"]) != n_free_params:
+        raise ValueError(f"The checkpoint in {path} belongs to a different model.")
+
+    return checkpoint["state"]
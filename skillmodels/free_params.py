@@ -0,0 +1,252 @@
+"""Map a reduced vector of free parameters to the full parameter vector.
+
+The constraints that are implied by the model specification (see
+:mod:`skillmodels.constraints`) are usually enforced by estimagic, which
+reparametrizes the parameter vector in Python on every evaluation. This module
+builds the same reparametrization as a jax function, such that it can be compiled
+into the likelihood:
+
+- fixed parameters are not part of the free vector,
+- parameters that are equal (e.g. because periods belong to the same stage) share
+  one entry of the free vector,
+- parameters that are probabilities (e.g. mixture weights) are represented by
+  log ratios relative to the first probability in the group,
+- parameters that are increasing are represented by their first value and the logs
+  of the increments.
+
+Bounds that are not implied by constraints (e.g. on measurement standard deviations)
+are passed on to the free parameters.
+
+"""
+import warnings
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pandas as pd
+
+
+def get_free_params_info(params_template, constraints):
+    """Collect the information needed to map free parameters to all parameters.
+
+    Args:
+        params_template (pandas.DataFrame): Parameter DataFrame with the params index.
+            If it has the columns "lower_bound" and "upper_bound", they are used to
+            construct bounds for the free parameters.
+        constraints (list): List of estimagic constraints as generated by
+            :func:`skillmodels.constraints.get_constraints`. Supported types are
+            "fixed", "pairwise_equality", "probability" and "increasing".
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "representatives" (numpy.ndarray): For each parameter the position of
+              the parameter that represents its group of equal parameters.
+            - "fixed_values" (numpy.ndarray): Values of fixed parameters and zeros
+              elsewhere.
+            - "scalars" (numpy.ndarray): Positions of parameters that are free
+              without transformation.
+            - "probability_groups" (list): Arrays with positions of parameters that
+              are probabilities and sum to one.
+            - "increasing_groups" (list): Arrays with positions of parameters that
+              are increasing.
+            - "free_params_template" (pandas.DataFrame): DataFrame with one row per
+              free parameter and the columns "lower_bound" and "upper_bound". The
+              index entry of a free parameter is the index entry of the parameter it
+              is mainly responsible for.
+
+    """
+    index = params_template.index
+    n_params = len(index)
+    positions = pd.Series(np.arange(n_params), index=index)
+
+    parents = np.arange(n_params)
+    is_fixed = np.full(n_params, False)
+    values = np.zeros(n_params)
+    probability_groups, increasing_groups = [], []
+
+    for constr in constraints:
+        typ = constr["type"]
+        if typ == "pairwise_equality":
+            blocks = [_get_positions(positions, loc) for loc in constr["locs"]]
+            for block in blocks[1:]:
+                for first, other in zip(blocks[0], block):
+                    _union(parents, first, other)
+        elif typ == "fixed":
+            pos = _get_positions(positions, constr["loc"])
+            is_fixed[pos] = True
+            values[pos] = np.broadcast_to(constr["value"], len(pos))
+        elif typ == "probability":
+            probability_groups.append(_get_positions(positions, constr["loc"]))
+        elif typ == "increasing":
+            increasing_groups.append(_get_positions(positions, constr["loc"]))
+        else:
+            raise ValueError(
+                f"Constraints of type {typ} cannot be used for free params."
+            )
+
+    representatives = np.array([_find(parents, i) for i in range(n_params)])
+
+    fixed_values = np.zeros(n_params)
+    is_fixed_representative = np.full(n_params, False)
+    fixed_values[representatives[is_fixed]] = values[is_fixed]
+    is_fixed_representative[representatives[is_fixed]] = True
+
+    probability_groups = _get_unique_groups(
+        probability_groups, representatives, is_fixed_representative
+    )
+    increasing_groups = _get_unique_groups(
+        increasing_groups, representatives, is_fixed_representative
+    )
+
+    in_group = np.full(n_params, False)
+    for group in probability_groups + increasing_groups:
+        if in_group[group].any():
+            raise ValueError("Parameters cannot be part of several constraint groups.")
+        in_group[group] = True
+
+    is_scalar = np.full(n_params, False)
+    is_scalar[np.unique(representatives)] = True
+    is_scalar[is_fixed_representative | in_group] = False
+    scalars = np.arange(n_params)[is_scalar]
+
+    lower, upper = _get_representative_bounds(params_template, representatives)
+    free_positions = [scalars]
+    free_lower, free_upper = [lower[scalars]], [upper[scalars]]
+    for group in probability_groups:
+        free_positions.append(group[1:])
+        free_lower.append(np.full(len(group) - 1, -np.inf))
+        free_upper.append(np.full(len(group) - 1, np.inf))
+    for group in increasing_groups:
+        free_positions.append(group)
+        free_lower.append(np.r_[lower[group[0]], np.full(len(group) - 1, -np.inf)])
+        free_upper.append(np.r_[upper[group[0]], np.full(len(group) - 1, np.inf)])
+
+    free_params_template = pd.DataFrame(
+        {
+            "lower_bound": np.concatenate(free_lower),
+            "upper_bound": np.concatenate(free_upper),
+        },
+        index=index[np.concatenate(free_positions)],
+    )
+
+    info = {
+        "representatives": representatives,
+        "fixed_values": fixed_values,
+        "scalars": scalars,
+        "probability_groups": probability_groups,
+        "increasing_groups": increasing_groups,
+        "free_params_template": free_params_template,
+    }
+    return info
+
+
+def params_from_free_params(free_params, free_params_info):
+    """Map the free parameters to the full parameter vector.
+
+    This function is jax-differentiable and jax-jittable if free_params_info is static.
+
+    Args:
+        free_params (jax.numpy.array): 1d array with free parameters.
+        free_params_info (dict): See :func:`get_free_params_info`.
+
+    Returns:
+        jax.numpy.array: 1d array with all model parameters.
+
+    """
+    scalars = free_params_info["scalars"]
+    n_scalars = len(scalars)
+
+    params = jnp.array(free_params_info["fixed_values"], dtype=free_params.dtype)
+    params = params.at[scalars].set(free_params[:n_scalars])
+
+    start = n_scalars
+    for group in free_params_info["probability_groups"]:
+        stop = start + len(group) - 1
+        log_ratios = jnp.concatenate([jnp.zeros(1), free_params[start:stop]])
+        params = params.at[group].set(jax.nn.softmax(log_ratios))
+        start = stop
+
+    for group in free_params_info["increasing_groups"]:
+        stop = start + len(group)
+        first, log_increments = free_params[start], free_params[start + 1 : stop]
+        increments = jnp.concatenate(
+            [jnp.zeros(1), jnp.cumsum(jnp.exp(log_increments))]
+        )
+        params = params.at[group].set(first + increments)
+        start = stop
+
+    return params[free_params_info["representatives"]]
+
+
+def free_params_from_params(params, free_params_info):
+    """Extract the free parameters from the full parameter vector.
+
+    Probabilities and increments that are zero are replaced by a small positive
+    number, such that the free parameters are finite.
+
+    Args:
+        params (numpy.ndarray): 1d array with all model parameters. It has to satisfy
+            all constraints that were used to construct free_params_info.
+        free_params_info (dict): See :func:`get_free_params_info`.
+
+    Returns:
+        numpy.ndarray: 1d array with free parameters.
+
+    """
+    params = np.asarray(params, dtype=float)
+    free_params = [params[free_params_info["scalars"]]]
+
+    for group in free_params_info["probability_groups"]:
+        log_probs = np.log(np.clip(params[group], 1e-12, None))
+        free_params.append(log_probs[1:] - log_probs[0])
+
+    for group in free_params_info["increasing_groups"]:
+        increments = np.clip(np.diff(params[group]), 1e-12, None)
+        free_params.append(np.r_[params[group[0]], np.log(increments)])
+
+    return np.concatenate(free_params)
+
+
+def _get_positions(positions, loc):
+    with warnings.catch_warnings():
+        warnings.filterwarnings(
+            "ignore", message="indexing past lexsort depth may impact performance."
+        )
+        selected = positions.loc[loc]
+    return np.atleast_1d(np.asarray(selected))
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        i = parents[i]
+    return i
+
+
+def _union(parents, i, j):
+    """Merge the groups of i and j. The smaller position becomes the representative."""
+    root_i, root_j = _find(parents, i), _find(parents, j)
+    parents[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def _get_unique_groups(groups, representatives, is_fixed_representative):
+    """Replace positions by representatives and drop groups that appear repeatedly."""
+    unique = {}
+    for group in groups:
+        group = representatives[group]
+        if is_fixed_representative[group].any():
+            raise ValueError("Constrained groups of parameters cannot be fixed.")
+        unique.setdefault(tuple(group), group)
+    return list(unique.values())
+
+
+def _get_representative_bounds(params_template, representatives):
+    """Combine the bounds of all parameters that share a representative."""
+    n_params = len(params_template)
+    lower, upper = np.full(n_params, -np.inf), np.full(n_params, np.inf)
+    if "lower_bound" in params_template:
+        bounds = params_template["lower_bound"].to_numpy(dtype=float)
+        np.maximum.at(lower, representatives, bounds)
+    if "upper_bound" in params_template:
+        bounds = params_template["upper_bound"].to_numpy(dtype=float)
+        np.minimum.at(upper, representatives, bounds)
+    return lower, upper
@@ -0,0 +1,108 @@
+"""Standard errors based on the derivatives of the log likelihood."""
+import numpy as np
+import pandas as pd
+
+from skillmodels.likelihood_function import get_maximization_inputs
+
+
+SE_TYPES = ("sandwich", "opg", "hessian")
+
+
+def standard_errors(
+    model_dict,
+    data,
+    params,
+    chunk_size=10,
+    maximization_inputs=None,
+    types=SE_TYPES,
+):
+    """Calculate sandwich, outer product of gradients and hessian standard errors.
+
+    The derivatives are calculated with respect to the free parameters (see
+    :func:`skillmodels.free_params.get_free_params_info`) and the covariance matrices
+    are transformed to all parameters with the delta method. Fixed parameters have a
+    standard error of zero and parameters that are equal have the same standard error.
+
+    The outer product of the jacobian of the log likelihood contributions and the
+    hessian of the log likelihood are built from chunk_size columns at a time with
+    compiled matrix-vector products. The jacobian itself, which has one row per
+    individual, is never built. This limits the memory that is needed for the
+    automatic differentiation. Larger chunks are faster but need more memory. Only the
+    derivatives that are needed for the requested types are calculated.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        params (pandas.DataFrame): The estimated parameters.
+        chunk_size (int): Number of columns of the outer product and hessian that are
+            calculated at the same time.
+        maximization_inputs (dict): Output of :func:`get_maximization_inputs` with
+            free_params=True.
+        types (tuple): Types of standard errors that are calculated. Subset of
+            "sandwich", "opg" and "hessian".
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "standard_errors" (pandas.DataFrame): DataFrame with the params index and
+              one column per requested type.
+            - "cov_sandwich", "cov_opg", "cov_hessian" (pandas.DataFrame): The
+              covariance matrices of the parameters for the requested types.
+
+    """
+    invalid = [se_type for se_type in types if se_type not in SE_TYPES]
+    if invalid:
+        raise ValueError(
+            f"Invalid standard error types: {invalid}. Valid types are {SE_TYPES}."
+        )
+
+    if maximization_inputs is None:
+        maximization_inputs = get_maximization_inputs(
+            model_dict, data, free_params=True
+        )
+    inputs = maximization_inputs
+
+    x = inputs["free_params_from_params"](params)
+
+    if "sandwich" in types or "opg" in types:
+        outer_product = _get_columns(inputs["free_fisher_products"], x, chunk_size)
+        outer_product = (outer_product + outer_product.T) / 2
+    if "sandwich" in types or "hessian" in types:
+        hessian = _get_columns(inputs["free_hessian_products"], x, chunk_size)
+        hessian = (hessian + hessian.T) / 2
+        free_cov_hessian = np.linalg.inv(-hessian)
+
+    free_covs = {}
+    for se_type in types:
+        if se_type == "sandwich":
+            free_covs[se_type] = free_cov_hessian @ outer_product @ free_cov_hessian
+        elif se_type == "opg":
+            free_covs[se_type] = np.linalg.inv(outer_product)
+        else:
+            free_covs[se_type] = free_cov_hessian
+
+    to_params_jacobian = inputs["params_from_free_params_jacobian"](x)
+    index = inputs["params_template"].index
+    out = {"standard_errors": pd.DataFrame(index=index)}
+    for name, free_cov in free_covs.items():
+        cov = to_params_jacobian @ free_cov @ to_params_jacobian.T
+        out[f"cov_{name}"] = pd.DataFrame(cov, index=index, columns=index)
+        out["standard_errors"][name] = np.sqrt(np.clip(np.diag(cov), 0, None))
+
+    return out
+
+
+def _get_columns(products, x, chunk_size):
+    """Build a matrix from its products with chunks of unit vectors.
+
+    The last chunk is padded with zero vectors, such that products is always called
+    with the same shape and only compiled once.
+
+    """
+    n_params = len(x)
+    columns = []
+    for start in range(0, n_params, chunk_size):
+        stop = min(start + chunk_size, n_params)
+        vectors = np.zeros((n_params, chunk_size))
+        vectors[np.arange(start, stop), np.arange(stop - start)] = 1
+        columns.append(products(x, vectors)[:, : stop - start])
+    return np.concatenate(columns, axis=1)
@@ -25,10 +25,13 @@ def kalman_update(
 
     Args:
         states (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states) with
-            pre-update states estimates.
+            pre-update states estimates. The first dimension can also have length 1
+            if all individuals have the same states.
         upper_chols (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states,
             n_states) with the transpose of the lower triangular cholesky factor
-            of the pre-update covariance matrix of the state estimates.
+            of the pre-update covariance matrix of the state estimates. The first
+            dimension can also have length 1 if all individuals have the same
+            covariances.
         loadings (jax.numpy.array): 1d array of length n_states with factor loadings.
         control_params (jax.numpy.array): 1d array of length n_controls.
         meas_sd (float): Standard deviation of the measurement error.
@@ -38,12 +41,11 @@ def kalman_update(
             control variables.
         log_mixture_weights (jax.numpy.array): Array of shape (n_obs, n_mixtures) with
             the natural logarithm of the weights of each element of the mixture of
-            normals distribution.
+            normals distribution. The first dimension can also have length 1.
         debug (bool): If true, the debug_info contains the residuals of the update and
             their standard deviations. Otherwise, it is an empty dict.
 
     Returns:
-        states (jax.numpy.array): Same format as states.
         new_states (jax.numpy.array): Same format as states.
         new_upper_chols (jax.numpy.array): Same format as upper_chols
         new_log_mixture_weights: (jax.numpy.array): Same format as log_mixture_weights
@@ -51,7 +53,8 @@ def kalman_update(
         debug_info (dict): Empty or containing residuals and residual_sds
 
     """
-    n_obs, n_mixtures, n_states = states.shape
+    n_obs = len(measurements)
+    n_mixtures, n_states = states.shape[1:]
 
     not_missing = jnp.isfinite(measurements)
 
@@ -76,7 +79,8 @@ def kalman_update(
     _residuals = _safe_measurements.reshape(n_obs, 1) - _safe_expected_measurements
     _f_stars = jnp.dot(upper_chols, loadings.reshape(n_states, 1))
 
-    _m = jnp.zeros((n_obs, n_mixtures, n_states + 1, n_states + 1))
+    # the QR decomposition is only done once if all individuals have the same covs
+    _m = jnp.zeros((len(upper_chols), n_mixtures, n_states + 1, n_states + 1))
     _m = _m.at[..., 0, 0].set(meas_sd)
     _m = _m.at[..., 1:, :1].set(_f_stars)
     _m = _m.at[..., 1:, 1:].set(upper_chols)
@@ -88,7 +92,7 @@ def kalman_update(
     _abs_root_sigmas = jnp.abs(_root_sigmas)
     # it is important not to divide by the absolute value of _root_sigmas in order
     # to recover the sign of the Kalman gain.
-    _kalman_gains = _r[..., 0, 1:] / _root_sigmas.reshape(n_obs, n_mixtures, 1)
+    _kalman_gains = _r[..., 0, 1:] / _root_sigmas.reshape(-1, n_mixtures, 1)
     _new_states = states + _kalman_gains * _residuals.reshape(n_obs, n_mixtures, 1)
 
     # calculate log likelihood per individual and update mixture weights
@@ -203,18 +207,30 @@ def kalman_predict(
         jax.numpy.array: Predicted upper_chols, same shape as upper_chols.
 
     """
-    sigma_points = _calculate_sigma_points(
-        states, upper_chols, sigma_scaling_factor, observed_factors
-    )
+    if transition_info.get("constant_factors"):
+        return _kalman_predict_with_constant_factors(
+            states,
+            upper_chols,
+            sigma_scaling_factor,
+            sigma_weights,
+            transition_info,
+            trans_coeffs,
+            shock_sds,
+            anchoring_scaling_factors,
+            anchoring_constants,
+            observed_factors,
+        )
+
+    sigma_points = _calculate_sigma_points(states, upper_chols, sigma_scaling_factor)
     transformed = transform_sigma_points(
         sigma_points,
         transition_info,
         trans_coeffs,
         anchoring_scaling_factors,
         anchoring_constants,
+        observed_factors,
     )
 
-    # do not use sigma_points.shape because sigma_points contain observed factors
     n_obs, n_mixtures, n_sigma, n_fac = transformed.shape
 
     predicted_states = jnp.dot(sigma_weights, transformed)
@@ -230,7 +246,263 @@ def kalman_predict(
     return predicted_states, predicted_covs
 
 
-def _calculate_sigma_points(states, upper_chols, scaling_factor, observed_factors):
+def _kalman_predict_with_constant_factors(
+    states,
+    upper_chols,
+    sigma_scaling_factor,
+    sigma_weights,
+    transition_info,
+    trans_coeffs,
+    shock_sds,
+    anchoring_scaling_factors,
+    anchoring_constants,
+    observed_factors,
+):
+    """Make a unscented Kalman predict in a model with constant factors.
+
+    Constant factors only pass through the change of anchoring between periods, which
+    is an affine function. Their predicted means and their columns of the square-root
+    covariance are thus calculated exactly and only the dynamic factors are evaluated at
+    the sigma points.
+
+    If the transition functions of the dynamic factors only use some of the latent
+    factors, the square-root covariance is first rotated such that only its first rows
+    spread in the directions of these inputs. Sigma points along the other rows are
+    equal to the center point after the transformation, so only the sigma points
+    along the first rows are evaluated.
+
+    For the covariance, each pair of sigma points on opposite sides of the mean is
+    rotated into the difference and the sum of their deviations. The constant factors
+    are zero in the sums, so the sums, the center point and the shocks are condensed
+    into a small triangular block of the dynamic factors before the final QR
+    decomposition. The shocks of constant factors are fixed to zero by the model
+    constraints but are added if they are not.
+
+    Args and Returns are the same as in :func:`kalman_predict`. transition_info has
+    the additional entries "constant_factors" (positions of the constant factors),
+    "dynamic_func" (the transition function of the other factors) and
+    "dynamic_inputs" (positions of the latent factors that dynamic_func uses; None
+    means all).
+
+    """
+    n_obs, n_mixtures, n_fac = states.shape
+    constant = transition_info["constant_factors"]
+    dynamic = [i for i in range(n_fac) if i not in constant]
+    n_dynamic = len(dynamic)
+
+    slope, intercept = get_change_of_anchoring(
+        anchoring_scaling_factors, anchoring_constants, n_fac
+    )
+    pair_weight = jnp.sqrt(sigma_weights[1] / 2)
+    chol_scale = 2 * pair_weight * sigma_scaling_factor * slope
+
+    predicted_states = states * slope + intercept
+    constant_shocks = jnp.broadcast_to(
+        jnp.diag(shock_sds)[jnp.array(constant)],
+        (n_obs, n_mixtures, len(constant), n_fac),
+    )
+
+    if n_dynamic == 0:
+        qr_points = jnp.concatenate([upper_chols * chol_scale, constant_shocks], axis=2)
+        return predicted_states, array_qr_jax(qr_points)[1][:, :, :n_fac]
+
+    inputs = transition_info.get("dynamic_inputs")
+    inputs = list(range(n_fac)) if inputs is None else list(inputs)
+    n_inputs = len(inputs)
+    if n_inputs < n_fac:
+        order = inputs + [i for i in range(n_fac) if i not in inputs]
+        inverse_order = [order.index(i) for i in range(n_fac)]
+        sqrt_covs = array_qr_jax(upper_chols[..., jnp.array(order)])[1]
+        sqrt_covs = sqrt_covs[..., jnp.array(inverse_order)]
+    else:
+        sqrt_covs = upper_chols
+
+    # the sigma points along the rows after n_inputs are transformed to the same
+    # value as the center point
+    center_weight = sigma_weights[0] + 2 * (n_fac - n_inputs) * sigma_weights[1]
+    weights = jnp.concatenate(
+        [center_weight.reshape(1), sigma_weights[1 : 2 * n_inputs + 1]]
+    )
+
+    dynamic = jnp.array(dynamic)
+    sigma_points = _calculate_sigma_points(
+        states, sqrt_covs[:, :, :n_inputs], sigma_scaling_factor
+    )
+    transformed = transform_sigma_points_subset(
+        sigma_points,
+        transition_info["dynamic_func"],
+        dynamic,
+        trans_coeffs,
+        anchoring_scaling_factors,
+        anchoring_constants,
+        observed_factors,
+    )
+
+    dynamic_states = jnp.dot(weights, transformed)
+    predicted_states = predicted_states.at[..., dynamic].set(dynamic_states)
+
+    devs = transformed - dynamic_states.reshape(n_obs, n_mixtures, 1, n_dynamic)
+    plus, minus = devs[:, :, 1 : n_inputs + 1], devs[:, :, n_inputs + 1 :]
+
+    condensed_points = jnp.concatenate(
+        [
+            jnp.sqrt(center_weight) * devs[:, :, :1],
+            pair_weight * (plus + minus),
+            jnp.broadcast_to(
+                jnp.diag(shock_sds[dynamic]),
+                (n_obs, n_mixtures, n_dynamic, n_dynamic),
+            ),
+        ],
+        axis=2,
+    )
+    condensed = array_qr_jax(condensed_points)[1]
+
+    difference_points = (
+        (sqrt_covs * chol_scale)
+        .at[:, :, :n_inputs, dynamic]
+        .set(pair_weight * (plus - minus))
+        .at[:, :, n_inputs:, dynamic]
+        .set(0)
+    )
+    qr_points = jnp.concatenate(
+        [
+            difference_points,
+            jnp.zeros((n_obs, n_mixtures, n_dynamic, n_fac))
+            .at[..., dynamic]
+            .set(condensed),
+            constant_shocks,
+        ],
+        axis=2,
+    )
+    predicted_chols = array_qr_jax(qr_points)[1][:, :, :n_fac]
+
+    return predicted_states, predicted_chols
+
+
+# ======================================================================================
+# Smoothing Step
+# ======================================================================================
+
+
+def kalman_smooth(
+    states,
+    upper_chols,
+    smoothed_states,
+    smoothed_upper_chols,
+    sigma_scaling_factor,
+    sigma_weights,
+    transition_info,
+    trans_coeffs,
+    shock_sds,
+    anchoring_scaling_factors,
+    anchoring_constants,
+    observed_factors,
+):
+    """Make a square-root unscented Rauch-Tung-Striebel smoothing step.
+
+    The filtered states of period t are combined with the smoothed states of period
+    t + 1. The sigma points of the filtered states are transformed as in
+    :func:`kalman_predict`. A QR decomposition of the weighted deviations of the
+    transformed and the original sigma points, together with the shocks, yields the
+    upper cholesky factor of the joint covariance of the states in t + 1 and t. Its
+    blocks contain the square-root of the predicted covariance, the smoother gain and
+    the square-root of the covariance of the states in t conditional on the states in
+    t + 1.
+
+    Each element of a mixture of normals is smoothed separately.
+
+    The sigma points, their transformation and the predicted covariance are
+    calculated again instead of being taken from the filter. The predict step of the
+    filter only decomposes the transformed deviations, but the smoother gain and the
+    conditional covariance need the joint decomposition with the deviations of the
+    original sigma points. Doing this in the filter would double the width of the
+    QR decomposition in every likelihood evaluation and storing the transformed sigma
+    points would need 2 * n_states + 1 times the memory of the filtered states.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states) with
+            the filtered states of period t.
+        upper_chols (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states,
+            n_states) with the upper cholesky factors of the filtered covariances of
+            period t.
+        smoothed_states (jax.numpy.array): Like states but with the smoothed states
+            of period t + 1.
+        smoothed_upper_chols (jax.numpy.array): Like upper_chols but for the smoothed
+            covariances of period t + 1.
+
+        See :func:`kalman_predict` for the other arguments.
+
+    Returns:
+        jax.numpy.array: Smoothed states of period t, same shape as states.
+        jax.numpy.array: Smoothed upper_chols of period t, same shape as upper_chols.
+
+    """
+    n_obs, n_mixtures, n_fac = states.shape
+    n_sigma = 2 * n_fac + 1
+
+    sigma_points = _calculate_sigma_points(states, upper_chols, sigma_scaling_factor)
+    transformed = transform_sigma_points(
+        sigma_points,
+        transition_info,
+        trans_coeffs,
+        anchoring_scaling_factors,
+        anchoring_constants,
+        observed_factors,
+    )
+    predicted_states = jnp.dot(sigma_weights, transformed)
+
+    qr_weights = jnp.sqrt(sigma_weights).reshape(n_sigma, 1)
+    devs = jnp.concatenate(
+        [
+            transformed - predicted_states.reshape(n_obs, n_mixtures, 1, n_fac),
+            sigma_points - states.reshape(n_obs, n_mixtures, 1, n_fac),
+        ],
+        axis=-1,
+    )
+    qr_points = jnp.zeros((n_obs, n_mixtures, n_sigma + n_fac, 2 * n_fac))
+    qr_points = qr_points.at[:, :, :n_sigma].set(devs * qr_weights)
+    qr_points = qr_points.at[:, :, n_sigma:, :n_fac].set(jnp.diag(shock_sds))
+    joint_chols = array_qr_jax(qr_points)[1]
+
+    predicted_chols = joint_chols[..., :n_fac, :n_fac]
+    cross_chols = joint_chols[..., :n_fac, n_fac:]
+    conditional_chols = joint_chols[..., n_fac:, n_fac:]
+
+    # the transposed smoother gain solves predicted_chols @ gain = cross_chols
+    gains = jax.scipy.linalg.solve_triangular(predicted_chols, cross_chols)
+
+    diffs = (smoothed_states - predicted_states).reshape(n_obs, n_mixtures, 1, n_fac)
+    new_states = states + (diffs @ gains).reshape(n_obs, n_mixtures, n_fac)
+
+    stacked = jnp.concatenate([conditional_chols, smoothed_upper_chols @ gains], axis=2)
+    new_upper_chols = array_qr_jax(stacked)[1]
+
+    return new_states, new_upper_chols
+
+
+def get_change_of_anchoring(anchoring_scaling_factors, anchoring_constants, n_fac):
+    """Get the affine map of constant factors from one period to the next.
+
+    Args:
+        anchoring_scaling_factors (jax.numpy.array): Array of shape (2, n_fac) with
+            the scaling factors for anchoring.
+        anchoring_constants (jax.numpy.array): Array of shape (2, n_fac) with the
+            constants for anchoring.
+        n_fac (int): Number of latent factors.
+
+    Returns:
+        jax.numpy.array: 1d array of length n_fac with slopes.
+        jax.numpy.array: 1d array of length n_fac with intercepts.
+
+    """
+    scaling_factors = anchoring_scaling_factors[:, :n_fac]
+    constants = anchoring_constants[:, :n_fac]
+    slope = scaling_factors[0] / scaling_factors[1]
+    intercept = (constants[0] - constants[1]) / scaling_factors[1]
+    return slope, intercept
+
+
+def _calculate_sigma_points(states, upper_chols, scaling_factor):
     """Calculate the array of sigma_points for the unscented transform.
 
     Args:
@@ -238,34 +510,28 @@ def _calculate_sigma_points(states, upper_chols, scaling_factor, observed_factor
             pre-update states estimates.
         upper_chols (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states,
             n_states) with the transpose of the lower triangular cholesky factor
-            of the pre-update covariance matrix of the state estimates.
+            of the pre-update covariance matrix of the state estimates. Only the
+            first n_rows rows can be passed, in which case the sigma points only
+            spread along these rows.
         scaling_factor (float): A scaling factor that controls the spread of the
             sigma points. Bigger means that sigma points are further apart. Depends on
             the sigma_point algorithm chosen.
-        observed_factors (jax.numpy.array): Array of shape (n_obs, n_observed_factors)
-            with data on the observed factors in period t.
 
     Returns:
         jax.numpy.array: Array of shape n_obs, n_mixtures, n_sigma, n_fac (where n_sigma
-        equals 2 * n_fac + 1) with sigma points.
+        equals 2 * n_rows + 1) with sigma points.
 
     """
     n_obs, n_mixtures, n_fac = states.shape
-    n_sigma = 2 * n_fac + 1
-    n_observed = observed_factors.shape[1]
+    n_rows = upper_chols.shape[-2]
+    n_sigma = 2 * n_rows + 1
 
     scaled_upper_chols = upper_chols * scaling_factor
     sigma_points = jnp.repeat(states, n_sigma, axis=1).reshape(
         n_obs, n_mixtures, n_sigma, n_fac
     )
-    sigma_points = sigma_points.at[:, :, 1 : n_fac + 1].add(scaled_upper_chols)
-    sigma_points = sigma_points.at[:, :, n_fac + 1 :].add(-scaled_upper_chols)
-
-    observed_part = observed_factors.repeat(n_sigma, axis=0).reshape(
-        n_obs, n_mixtures, n_sigma, n_observed
-    )
-
-    sigma_points = jnp.concatenate([sigma_points, observed_part], axis=-1)
+    sigma_points = sigma_points.at[:, :, 1 : n_rows + 1].add(scaled_upper_chols)
+    sigma_points = sigma_points.at[:, :, n_rows + 1 :].add(-scaled_upper_chols)
     return sigma_points
 
 
@@ -275,14 +541,20 @@ def transform_sigma_points(
     trans_coeffs,
     anchoring_scaling_factors,
     anchoring_constants,
+    observed_factors,
 ):
     """Anchor sigma points, transform them and unanchor the transformed sigma points.
 
+    Only the latent factors are part of the sigma points. The observed factors are
+    passed separately to the transition function which combines them with each sigma
+    point of the same individual.
+
     Args:
         sigma_points (jax.numpy.array) of shape n_obs, n_mixtures, n_sigma, n_fac.
-        transition_info (dict): Dict with the entries "func" (the actual transition
-            function) and "columns" (a dictionary mapping factors that are needed
-            as individual columns to positions in the factor array).
+        transition_info (dict): Dict with the entry "func" (the actual transition
+            function). It takes params, an array of shape (n_obs, n_points, n_fac)
+            with states and an array of shape (n_obs, n_observed_factors) with
+            observed factors.
         trans_coeffs (tuple): Tuple of 1d jax.numpy.arrays with transition parameters.
         anchoring_scaling_factors (jax.numpy.array): Array of shape (2, n_states) with
             the scaling factors for anchoring. The first row corresponds to the input
@@ -290,29 +562,63 @@ def transform_sigma_points(
         anchoring_constants (jax.numpy.array): Array of shape (2, n_states) with the
             constants for anchoring. The first row corresponds to the input
             period, the second to the output period (i.e. input period + 1).
+        observed_factors (jax.numpy.array): Array of shape (n_obs, n_observed_factors)
+            with data on the observed factors in period t.
 
     Returns:
         jax.numpy.array: Array of shape n_obs, n_mixtures, n_sigma, n_fac (where n_sigma
         equals 2 * n_fac + 1) with transformed sigma points.
 
     """
-    n_obs, n_mixtures, n_sigma, n_fac = sigma_points.shape
+    n_fac = sigma_points.shape[-1]
+    return transform_sigma_points_subset(
+        sigma_points,
+        transition_info["func"],
+        jnp.arange(n_fac),
+        trans_coeffs,
+        anchoring_scaling_factors,
+        anchoring_constants,
+        observed_factors,
+    )
+
+
+def transform_sigma_points_subset(
+    sigma_points,
+    transition_function,
+    outputs,
+    trans_coeffs,
+    anchoring_scaling_factors,
+    anchoring_constants,
+    observed_factors,
+):
+    """Transform sigma points with a transition function for a subset of factors.
+
+    Args:
+        outputs (jax.numpy.array): Positions of the factors that are returned by
+            transition_function.
+
+    See :func:`transform_sigma_points` for the other arguments.
 
-    flat_sigma_points = sigma_points.reshape(-1, n_fac)
+    Returns:
+        jax.numpy.array: Array of shape n_obs, n_mixtures, n_sigma, len(outputs).
 
-    anchored = flat_sigma_points * anchoring_scaling_factors[0] + anchoring_constants[0]
+    """
+    n_obs, n_mixtures, n_sigma, n_fac = sigma_points.shape
 
-    transition_function = transition_info["func"]
+    points = sigma_points.reshape(n_obs, n_mixtures * n_sigma, n_fac)
 
-    transformed_anchored = transition_function(trans_coeffs, anchored)
+    # observed factors are never anchored
+    anchored = (
+        points * anchoring_scaling_factors[0][:n_fac] + anchoring_constants[0][:n_fac]
+    )
 
-    n_observed = transformed_anchored.shape[-1]
+    transformed_anchored = transition_function(trans_coeffs, anchored, observed_factors)
 
     transformed_unanchored = (
-        transformed_anchored - anchoring_constants[1][:n_observed]
-    ) / anchoring_scaling_factors[1][:n_observed]
+        transformed_anchored - anchoring_constants[1][outputs]
+    ) / anchoring_scaling_factors[1][outputs]
 
-    out_shape = (n_obs, n_mixtures, n_sigma, -1)
+    out_shape = (n_obs, n_mixtures, n_sigma, len(outputs))
     out = transformed_unanchored.reshape(out_shape)
 
     return out
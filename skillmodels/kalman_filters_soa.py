@@ -0,0 +1,456 @@
+"""Kalman filters with individuals as the trailing axis of all arrays.
+
+The kernels in this module do exactly the same calculations as the ones in
+:mod:`skillmodels.kalman_filters` but use a structure-of-arrays memory layout:
+
+- states have shape (n_mixtures, n_states, n_obs)
+- upper_chols have shape (n_mixtures, n_states, n_states, n_obs)
+- log_mixture_weights have shape (n_mixtures, n_obs)
+
+The small QR decompositions are written as unrolled Householder reflections that only
+consist of elementwise operations over the trailing axis. This lets XLA vectorize
+across individuals on the CPU instead of looping over many tiny matrices.
+
+"""
+import jax
+import jax.numpy as jnp
+
+from skillmodels.kalman_filters import get_change_of_anchoring
+from skillmodels.kalman_filters import transform_sigma_points
+from skillmodels.kalman_filters import transform_sigma_points_subset
+
+
+# ======================================================================================
+# Conversion between memory layouts
+# ======================================================================================
+
+
+def to_soa_layout(states, upper_chols, log_mixture_weights):
+    """Convert states, upper_chols and log_mixture_weights to the soa layout.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states).
+        upper_chols (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states,
+            n_states).
+        log_mixture_weights (jax.numpy.array): Array of shape (n_obs, n_mixtures).
+
+    Returns:
+        jax.numpy.array: states of shape (n_mixtures, n_states, n_obs)
+        jax.numpy.array: upper_chols of shape (n_mixtures, n_states, n_states, n_obs)
+        jax.numpy.array: log_mixture_weights of shape (n_mixtures, n_obs)
+
+    """
+    return (
+        jnp.moveaxis(states, 0, -1),
+        jnp.moveaxis(upper_chols, 0, -1),
+        jnp.moveaxis(log_mixture_weights, 0, -1),
+    )
+
+
+# ======================================================================================
+# Update Step
+# ======================================================================================
+
+
+def kalman_update_soa(
+    states,
+    upper_chols,
+    loadings,
+    control_params,
+    meas_sd,
+    measurements,
+    controls,
+    log_mixture_weights,
+    debug,
+):
+    """Perform a Kalman update with likelihood evaluation.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_mixtures, n_states, n_obs) with
+            pre-update states estimates. The last dimension can also have length 1
+            if all individuals have the same states.
+        upper_chols (jax.numpy.array): Array of shape (n_mixtures, n_states, n_states,
+            n_obs) with the transpose of the lower triangular cholesky factor
+            of the pre-update covariance matrix of the state estimates. The last
+            dimension can also have length 1 if all individuals have the same
+            covariances.
+        loadings (jax.numpy.array): 1d array of length n_states with factor loadings.
+        control_params (jax.numpy.array): 1d array of length n_controls.
+        meas_sd (float): Standard deviation of the measurement error.
+        measurements (jax.numpy.array): 1d array of length n_obs with measurements.
+            May contain NaNs if no measurement was observed.
+        controls (jax.numpy.array): Array of shape (n_obs, n_controls) with data on the
+            control variables.
+        log_mixture_weights (jax.numpy.array): Array of shape (n_mixtures, n_obs) with
+            the natural logarithm of the weights of each element of the mixture of
+            normals distribution. The last dimension can also have length 1.
+        debug (bool): If true, the debug_info contains the residuals of the update and
+            their standard deviations. Otherwise, it is an empty dict.
+
+    Returns:
+        new_states (jax.numpy.array): Same format as states.
+        new_upper_chols (jax.numpy.array): Same format as upper_chols
+        new_log_mixture_weights: (jax.numpy.array): Same format as log_mixture_weights
+        new_loglikes: (jax.numpy.array): 1d array of length n_obs
+        debug_info (dict): Empty or containing residuals and residual_sds of shape
+            (n_mixtures, n_obs).
+
+    """
+    n_obs = len(measurements)
+    n_mixtures, n_states = states.shape[:2]
+    n_chols = upper_chols.shape[-1]
+
+    not_missing = jnp.isfinite(measurements)
+
+    # see kalman_update for an explanation of the fill values
+    _safe_controls = jnp.where(not_missing.reshape(n_obs, 1), controls, 0)
+
+    _safe_expected_measurements = jnp.einsum("msi,s->mi", states, loadings) + jnp.dot(
+        _safe_controls, control_params
+    )
+
+    _safe_measurements = jnp.where(
+        not_missing, measurements, _safe_expected_measurements.mean(axis=0)
+    )
+
+    _residuals = _safe_measurements - _safe_expected_measurements
+    _f_stars = jnp.einsum("mrci,c->mri", upper_chols, loadings)
+
+    _first_col = jnp.concatenate(
+        [jnp.full((n_mixtures, 1, n_chols), meas_sd), _f_stars], axis=1
+    )
+    _other_cols = jnp.concatenate(
+        [jnp.zeros((n_mixtures, 1, n_states, n_chols)), upper_chols], axis=1
+    )
+    _m = jnp.concatenate([_first_col[:, :, None], _other_cols], axis=2)
+
+    _r = upper_triangular_factor_soa(_m)
+
+    _new_upper_chols = _r[:, 1:, 1:]
+    _root_sigmas = _r[:, 0, 0]
+    _abs_root_sigmas = jnp.abs(_root_sigmas)
+    # it is important not to divide by the absolute value of _root_sigmas in order
+    # to recover the sign of the Kalman gain.
+    _kalman_gains = _r[:, 0, 1:] / _root_sigmas.reshape(n_mixtures, 1, n_chols)
+    _new_states = states + _kalman_gains * _residuals.reshape(n_mixtures, 1, n_obs)
+
+    # calculate log likelihood per individual and update mixture weights
+    _loglikes_per_dist = jax.scipy.stats.norm.logpdf(_residuals, 0, _abs_root_sigmas)
+    if n_mixtures >= 2:
+        _weighted_loglikes_per_dist = _loglikes_per_dist + log_mixture_weights
+        _loglikes = jax.scipy.special.logsumexp(_weighted_loglikes_per_dist, axis=0)
+        _new_log_mixture_weights = _weighted_loglikes_per_dist - _loglikes
+    else:
+        _loglikes = _loglikes_per_dist[0]
+        _new_log_mixture_weights = log_mixture_weights
+
+    # combine pre-update quantities for missing observations with updated quantities
+    new_states = jnp.where(not_missing, _new_states, states)
+    new_upper_chols = jnp.where(not_missing, _new_upper_chols, upper_chols)
+    new_loglikes = jnp.where(not_missing, _loglikes, 0)
+    new_log_mixture_weights = jnp.where(
+        not_missing, _new_log_mixture_weights, log_mixture_weights
+    )
+
+    debug_info = {}
+    if debug:
+        debug_info["residuals"] = jnp.where(not_missing, _residuals, jnp.nan)
+        debug_info["residual_sds"] = jnp.where(not_missing, _abs_root_sigmas, jnp.nan)
+        debug_info["log_mixture_weights"] = new_log_mixture_weights
+
+    return (
+        new_states,
+        new_upper_chols,
+        new_log_mixture_weights,
+        new_loglikes,
+        debug_info,
+    )
+
+
+# ======================================================================================
+# Predict Step
+# ======================================================================================
+
+
+def kalman_predict_soa(
+    states,
+    upper_chols,
+    sigma_scaling_factor,
+    sigma_weights,
+    transition_info,
+    trans_coeffs,
+    shock_sds,
+    anchoring_scaling_factors,
+    anchoring_constants,
+    observed_factors,
+):
+    """Make a unscented Kalman predict.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_mixtures, n_states, n_obs) with
+            pre-update states estimates.
+        upper_chols (jax.numpy.array): Array of shape (n_mixtures, n_states, n_states,
+            n_obs) with the transpose of the lower triangular cholesky factor
+            of the pre-update covariance matrix of the state estimates.
+        sigma_scaling_factor (float): A scaling factor that controls the spread of the
+            sigma points. Bigger means that sigma points are further apart. Depends on
+            the sigma_point algorithm chosen.
+        sigma_weights (jax.numpy.array): 1d array of length n_sigma with non-negative
+            sigma weights.
+        transition_info (dict): Dict with the entries "func" (the actual transition
+            function) and "columns" (a dictionary mapping factors that are needed
+            as individual columns to positions in the factor array).
+        trans_coeffs (tuple): Tuple of 1d jax.numpy.arrays with transition parameters.
+        anchoring_scaling_factors (jax.numpy.array): Array of shape (2, n_fac) with
+            the scaling factors for anchoring. The first row corresponds to the input
+            period, the second to the output period (i.e. input period + 1).
+        anchoring_constants (jax.numpy.array): Array of shape (2, n_states) with the
+            constants for anchoring. The first row corresponds to the input
+            period, the second to the output period (i.e. input period + 1).
+        observed_factors (jax.numpy.array): Array of shape (n_obs, n_observed_factors)
+            with data on the observed factors in period t.
+
+    Returns:
+        jax.numpy.array: Predicted states, same shape as states.
+        jax.numpy.array: Predicted upper_chols, same shape as upper_chols.
+
+    """
+    if transition_info.get("constant_factors"):
+        return _kalman_predict_with_constant_factors_soa(
+            states,
+            upper_chols,
+            sigma_scaling_factor,
+            sigma_weights,
+            transition_info,
+            trans_coeffs,
+            shock_sds,
+            anchoring_scaling_factors,
+            anchoring_constants,
+            observed_factors,
+        )
+
+    sigma_points = _calculate_sigma_points_soa(
+        states, upper_chols, sigma_scaling_factor
+    )
+
+    # the transition function works on rows of factors, so the individual axis is
+    # temporarily moved to the front.
+    transformed = transform_sigma_points(
+        jnp.moveaxis(sigma_points, -1, 0),
+        transition_info,
+        trans_coeffs,
+        anchoring_scaling_factors,
+        anchoring_constants,
+        observed_factors,
+    )
+    transformed = jnp.moveaxis(transformed, 0, -1)
+
+    n_mixtures, n_sigma, n_fac, n_obs = transformed.shape
+
+    predicted_states = jnp.tensordot(sigma_weights, transformed, axes=(0, 1))
+
+    devs = transformed - predicted_states.reshape(n_mixtures, 1, n_fac, n_obs)
+
+    qr_weights = jnp.sqrt(sigma_weights).reshape(1, n_sigma, 1, 1)
+    shock_part = jnp.broadcast_to(
+        jnp.diag(shock_sds).reshape(1, n_fac, n_fac, 1),
+        (n_mixtures, n_fac, n_fac, n_obs),
+    )
+    qr_points = jnp.concatenate([devs * qr_weights, shock_part], axis=1)
+    predicted_covs = upper_triangular_factor_soa(qr_points)
+
+    return predicted_states, predicted_covs
+
+
+def _kalman_predict_with_constant_factors_soa(
+    states,
+    upper_chols,
+    sigma_scaling_factor,
+    sigma_weights,
+    transition_info,
+    trans_coeffs,
+    shock_sds,
+    anchoring_scaling_factors,
+    anchoring_constants,
+    observed_factors,
+):
+    """Make a unscented Kalman predict in a model with constant factors.
+
+    See :func:`skillmodels.kalman_filters._kalman_predict_with_constant_factors` for
+    details. Args and Returns are the same as in :func:`kalman_predict_soa`.
+
+    """
+    n_mixtures, n_fac, n_obs = states.shape
+    constant = transition_info["constant_factors"]
+    dynamic = [i for i in range(n_fac) if i not in constant]
+    n_dynamic = len(dynamic)
+
+    slope, intercept = get_change_of_anchoring(
+        anchoring_scaling_factors, anchoring_constants, n_fac
+    )
+    pair_weight = jnp.sqrt(sigma_weights[1] / 2)
+    chol_scale = (2 * pair_weight * sigma_scaling_factor * slope).reshape(n_fac, 1)
+
+    predicted_states = states * slope.reshape(n_fac, 1) + intercept.reshape(n_fac, 1)
+    constant_shocks = jnp.broadcast_to(
+        jnp.diag(shock_sds)[jnp.array(constant)].reshape(1, len(constant), n_fac, 1),
+        (n_mixtures, len(constant), n_fac, n_obs),
+    )
+
+    if n_dynamic == 0:
+        qr_points = jnp.concatenate([upper_chols * chol_scale, constant_shocks], axis=1)
+        return predicted_states, upper_triangular_factor_soa(qr_points)
+
+    inputs = transition_info.get("dynamic_inputs")
+    inputs = list(range(n_fac)) if inputs is None else list(inputs)
+    n_inputs = len(inputs)
+    if n_inputs < n_fac:
+        order = inputs + [i for i in range(n_fac) if i not in inputs]
+        inverse_order = [order.index(i) for i in range(n_fac)]
+        sqrt_covs = upper_triangular_factor_soa(upper_chols[:, :, jnp.array(order)])
+        sqrt_covs = sqrt_covs[:, :, jnp.array(inverse_order)]
+    else:
+        sqrt_covs = upper_chols
+
+    center_weight = sigma_weights[0] + 2 * (n_fac - n_inputs) * sigma_weights[1]
+    weights = jnp.concatenate(
+        [center_weight.reshape(1), sigma_weights[1 : 2 * n_inputs + 1]]
+    )
+
+    dynamic = jnp.array(dynamic)
+    sigma_points = _calculate_sigma_points_soa(
+        states, sqrt_covs[:, :n_inputs], sigma_scaling_factor
+    )
+    transformed = transform_sigma_points_subset(
+        jnp.moveaxis(sigma_points, -1, 0),
+        transition_info["dynamic_func"],
+        dynamic,
+        trans_coeffs,
+        anchoring_scaling_factors,
+        anchoring_constants,
+        observed_factors,
+    )
+    transformed = jnp.moveaxis(transformed, 0, -1)
+
+    dynamic_states = jnp.tensordot(weights, transformed, axes=(0, 1))
+    predicted_states = predicted_states.at[:, dynamic].set(dynamic_states)
+
+    devs = transformed - dynamic_states.reshape(n_mixtures, 1, n_dynamic, n_obs)
+    plus, minus = devs[:, 1 : n_inputs + 1], devs[:, n_inputs + 1 :]
+
+    shock_part = jnp.broadcast_to(
+        jnp.diag(shock_sds[dynamic]).reshape(1, n_dynamic, n_dynamic, 1),
+        (n_mixtures, n_dynamic, n_dynamic, n_obs),
+    )
+    condensed_points = jnp.concatenate(
+        [
+            jnp.sqrt(center_weight) * devs[:, :1],
+            pair_weight * (plus + minus),
+            shock_part,
+        ],
+        axis=1,
+    )
+    condensed = upper_triangular_factor_soa(condensed_points)
+
+    difference_points = (
+        (sqrt_covs * chol_scale)
+        .at[:, :n_inputs, dynamic]
+        .set(pair_weight * (plus - minus))
+        .at[:, n_inputs:, dynamic]
+        .set(0)
+    )
+    qr_points = jnp.concatenate(
+        [
+            difference_points,
+            jnp.zeros((n_mixtures, n_dynamic, n_fac, n_obs))
+            .at[:, :, dynamic]
+            .set(condensed),
+            constant_shocks,
+        ],
+        axis=1,
+    )
+    predicted_chols = upper_triangular_factor_soa(qr_points)
+
+    return predicted_states, predicted_chols
+
+
+def _calculate_sigma_points_soa(states, upper_chols, scaling_factor):
+    """Calculate the array of sigma_points for the unscented transform.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_mixtures, n_states, n_obs) with
+            pre-update states estimates.
+        upper_chols (jax.numpy.array): Array of shape (n_mixtures, n_states, n_states,
+            n_obs) with the transpose of the lower triangular cholesky factor
+            of the pre-update covariance matrix of the state estimates.
+        scaling_factor (float): A scaling factor that controls the spread of the
+            sigma points. Bigger means that sigma points are further apart. Depends on
+            the sigma_point algorithm chosen.
+
+    Returns:
+        jax.numpy.array: Array of shape n_mixtures, n_sigma, n_fac, n_obs (where
+        n_sigma equals 2 * n_rows + 1 and n_rows is the number of rows of
+        upper_chols) with sigma points.
+
+    """
+    n_mixtures, n_fac, n_obs = states.shape
+
+    scaled_upper_chols = upper_chols * scaling_factor
+    center = states.reshape(n_mixtures, 1, n_fac, n_obs)
+    sigma_points = jnp.concatenate(
+        [center, center + scaled_upper_chols, center - scaled_upper_chols], axis=1
+    )
+    return sigma_points
+
+
+# ======================================================================================
+# Elementwise QR decomposition
+# ======================================================================================
+
+
+def upper_triangular_factor_soa(arr):
+    """Calculate the upper triangular factor of the QR decomposition of many matrices.
+
+    The decomposition is done with Householder reflections that are unrolled over the
+    columns of the (small) matrices, such that all operations are elementwise over the
+    trailing axis. The result can differ from ``jnp.linalg.qr`` by the signs of the
+    rows of the triangular factor, which does not matter for any of its uses in the
+    Kalman filters.
+
+    Args:
+        arr (jax.numpy.array): Array of shape (..., n_rows, n_cols, n_obs) where
+            n_rows >= n_cols.
+
+    Returns:
+        jax.numpy.array: Array of shape (..., n_cols, n_cols, n_obs) with upper
+            triangular matrices.
+
+    """
+    n_rows, n_cols = arr.shape[-3:-1]
+
+    for j in range(n_cols):
+        col = arr[..., j:, j, :]
+        squared_norm = (col**2).sum(axis=-2)
+        # avoid NaNs in the gradient of columns that are already zero
+        is_positive = squared_norm > 0
+        norm = jnp.where(
+            is_positive, jnp.sqrt(jnp.where(is_positive, squared_norm, 1)), 0
+        )
+        alpha = -jnp.where(col[..., 0, :] >= 0, 1, -1) * norm
+
+        householder = col.at[..., 0, :].add(-alpha)
+        squared_h_norm = (householder**2).sum(axis=-2)
+        has_reflection = squared_h_norm > 0
+        beta = jnp.where(
+            has_reflection, 2 / jnp.where(has_reflection, squared_h_norm, 1), 0
+        )
+
+        block = arr[..., j:, :, :]
+        projection = (householder[..., None, :] * block).sum(axis=-3)
+        block = block - (beta[..., None, None, :] * householder[..., None, :]) * (
+            projection[..., None, :, :]
+        )
+        arr = jnp.concatenate([arr[..., :j, :, :], block], axis=-3)
+
+    mask = jnp.triu(jnp.ones((n_cols, n_cols))).reshape(n_cols, n_cols, 1)
+    return arr[..., :n_cols, :, :] * mask
@@ -1,3 +1,4 @@
+import copy
 import functools
 
 import jax
@@ -7,12 +8,16 @@ import pandas as pd
 from jax import config
 from jax import lax
 
+import skillmodels.free_params as fp
 from skillmodels.clipping import soft_clipping
 from skillmodels.constraints import add_bounds
 from skillmodels.constraints import get_constraints
 from skillmodels.kalman_filters import calculate_sigma_scaling_factor_and_weights
 from skillmodels.kalman_filters import kalman_predict
 from skillmodels.kalman_filters import kalman_update
+from skillmodels.kalman_filters_soa import kalman_predict_soa
+from skillmodels.kalman_filters_soa import kalman_update_soa
+from skillmodels.kalman_filters_soa import to_soa_layout
 from skillmodels.params_index import get_params_index
 from skillmodels.parse_params import create_parsing_info
 from skillmodels.parse_params import parse_params
@@ -22,13 +27,35 @@ from skillmodels.process_model import process_model
 
 config.update("jax_enable_x64", True)
 
+KERNELS = {
+    "aos": {"update": kalman_update, "predict": kalman_predict},
+    "soa": {"update": kalman_update_soa, "predict": kalman_predict_soa},
+}
 
-def get_maximization_inputs(model_dict, data, jacobian_type="jacrev"):
+
+def get_maximization_inputs(
+    model_dict,
+    data,
+    jacobian_type="jacrev",
+    free_params=False,
+    additional_constraints=None,
+):
     """Create inputs for estimagic's maximize function.
 
     Args:
         model_dict (dict): The model specification. See: :ref:`model_specs`
         data (DataFrame): dataset in long format.
+        jacobian_type (str): "jacrev" or "jacfwd". The jax function used to
+            calculate the jacobian of the log likelihood contributions. "jacfwd"
+            needs much less memory if there are many observations.
+        free_params (bool): If True, the result contains additional functions that
+            take a 1d array of free parameters instead of a params DataFrame. The
+            constraints implied by the model specification are built into the mapping
+            from free parameters to all parameters, such that no constraints are
+            needed for optimizing over the free parameters.
+        additional_constraints (list): estimagic constraints that are added to the
+            constraints implied by the model specification, e.g. to fix some
+            parameters at their current estimates.
 
     Returns a dictionary with keys:
         loglike (function): A jax jitted function that takes an estimagic-style
@@ -39,14 +66,74 @@ def get_maximization_inputs(model_dict, data, jacobian_type="jacrev"):
             - It is not jitted and thus faster on the first call and debuggable
             - It will add intermediate results as additional entries in the returned
               dictionary. Those can be used for debugging and plotting.
+        kalman_filter (function): A jax jitted function that takes an estimagic-style
+            params dataframe and returns the distributions of the latent factors
+            after each Kalman update as a dict of numpy arrays with entries:
+            - "filtered_states": Array of shape (n_updates, n_obs, n_mixtures,
+              n_states) with the means of the mixture elements.
+            - "filtered_upper_chols": Array of shape (n_updates, n_obs, n_mixtures,
+              n_states, n_states) with the upper cholesky factors of their
+              covariances.
+            - "log_mixture_weights": Array of shape (n_updates, n_obs, n_mixtures).
         gradient (function): The gradient of the scalar log likelihood
             function with respect to the parameters.
+        jacobian (function): The jacobian of the log likelihood contributions with
+            respect to the parameters, i.e. an array of shape (n_obs, n_params).
         loglike_and_gradient (function): Combination of loglike and
             loglike_gradient that is faster than calling the two functions separately.
+        hessian_vector_product (function): Takes a params DataFrame and a 1d array v
+            with one entry per parameter. Returns the product of the hessian of the
+            log likelihood and v, calculated with forward-over-reverse derivatives
+            without building the hessian.
+        incremental_loglike (function): Like loglike but keeps the filtered states at
+            the start of each period for the last evaluated params. If only
+            parameters of later periods change between two evaluations, the Kalman
+            filter resumes from the start of the first period whose parameters
+            changed. This is useful when late parameters are varied one at a time,
+            e.g. for profile likelihoods. Each start period is compiled once. The
+            function is not thread safe.
+        fisher_vector_product (function): Like hessian_vector_product but returns
+            J^T J v, where J is the jacobian of the log likelihood contributions,
+            without building J.
+        with_data (function): Takes another dataset in long format and returns the
+            inputs for that dataset. If the individuals of the new dataset drop out in
+            the same Kalman updates as in data, e.g. because both datasets have the
+            same number of individuals and no missing measurements, the new functions
+            reuse the compiled functions. Otherwise the likelihood is compiled again.
         constraints (list): List of estimagic constraints that are implied by the
-            model specification.
+            model specification and the additional constraints.
         params_template (pd.DataFrame): Parameter DataFrame with correct index and
             bounds but with empty value column.
+        n_obs (int): Number of individuals in the processed data.
+
+    If free_params is True, there are the following additional entries:
+        free_loglike, free_gradient, free_jacobian, free_loglike_and_gradient
+            (function): Versions of the functions above that take a 1d numpy array of
+            free parameters.
+        free_weighted_loglike_and_gradient (function): Takes a 1d numpy array of free
+            parameters and a 1d array with one weight per individual. Returns the
+            weighted sum of the log likelihood contributions and its gradient. The
+            weights are not static, i.e. changing them does not trigger a compilation.
+        free_jacobian_products (function): Takes a 1d numpy array of free parameters
+            and a 2d array of shape (n_free_params, n_vectors). Returns the product
+            of the jacobian of the log likelihood contributions and the vectors,
+            calculated with forward mode derivatives without building the jacobian.
+        free_fisher_products (function): Like free_jacobian_products but returns
+            the products of the outer product of the jacobian, i.e. J'J, with the
+            vectors. Uses forward and transposed derivatives without building the
+            jacobian, so memory does not grow with the number of observations.
+        free_hessian_products (function): Like free_jacobian_products but for the
+            hessian of the log likelihood. Uses forward-over-reverse derivatives.
+        params_from_free_params_jacobian (function): Takes a 1d numpy array of free
+            parameters and returns the jacobian of all parameters with respect to the
+            free parameters, i.e. an array of shape (n_params, n_free_params).
+        free_params_template (pd.DataFrame): DataFrame with one row per free
+            parameter and bounds. See
+            :func:`skillmodels.free_params.get_free_params_info`.
+        free_params_from_params (function): Convert a params DataFrame that satisfies
+            the constraints to a 1d numpy array of free parameters.
+        params_from_free_params (function): Convert a 1d array of free parameters to a
+            params DataFrame.
 
     """
     model = process_model(model_dict)
@@ -60,10 +147,203 @@ def get_maximization_inputs(model_dict, data, jacobian_type="jacrev"):
     parsing_info = create_parsing_info(
         p_index, model["update_info"], model["labels"], model["anchoring"]
     )
-    measurements, controls, observed_factors = process_data(
-        data, model["labels"], model["update_info"], model["anchoring"]
+    data_arrays, segments = _get_data_arrays(data, model)
+
+    update_info = model["update_info"]
+    _base_loglike = get_base_loglike(model, parsing_info)
+
+    # The data arrays are arguments and not constants of the compiled functions, such
+    # that the compiled functions can be reused for other datasets of the same shape.
+    def _loglike(params_vec, data_arrays, debug=False, **kwargs):
+        return _base_loglike(
+            params_vec,
+            measurements=data_arrays["measurements"],
+            controls=data_arrays["controls"],
+            observed_factors=data_arrays["observed_factors"],
+            attrition_info={
+                "segments": segments,
+                "inverse_order": data_arrays["inverse_order"],
+            },
+            debug=debug,
+            **kwargs,
+        )
+
+    partialed_process_debug_data = functools.partial(process_debug_data, model=model)
+
+    partialed_get_jnp_params_vec = functools.partial(
+        get_jnp_params_vec, target_index=p_index
+    )
+
+    _jitted_loglike = jax.jit(_loglike)
+    _jitted_debug_loglike = jax.jit(functools.partial(_loglike, debug=True))
+    _gradient = jax.jit(jax.grad(_loglike, has_aux=True))
+    _jacobian = jax.jit(
+        getattr(jax, jacobian_type)(
+            functools.partial(_contributions_and_aux, loglike=_loglike), has_aux=True
+        )
     )
 
+    def _value(params_vec, data_arrays):
+        return _loglike(params_vec, data_arrays)[0]
+
+    def _contributions(params_vec, data_arrays):
+        return _loglike(params_vec, data_arrays)[1]["contributions"]
+
+    def _hessian_vector_product(params_vec, vector, data_arrays):
+        return jax.jvp(
+            jax.grad(functools.partial(_value, data_arrays=data_arrays)),
+            (params_vec,),
+            (vector,),
+        )[1]
+
+    def _fisher_vector_product(params_vec, vector, data_arrays):
+        # linearizing once shares the forward pass between J v and J^T (J v)
+        _, jacobian_product = jax.linearize(
+            functools.partial(_contributions, data_arrays=data_arrays), params_vec
+        )
+        transposed_jacobian_product = jax.linear_transpose(jacobian_product, vector)
+        return transposed_jacobian_product(jacobian_product(vector))[0]
+
+    _jitted_hessian_vector_product = jax.jit(_hessian_vector_product)
+    _jitted_fisher_vector_product = jax.jit(_fisher_vector_product)
+    _jitted_incremental_loglikes = {}
+
+    constr = get_constraints(
+        dimensions=model["dimensions"],
+        labels=model["labels"],
+        anchoring_info=model["anchoring"],
+        update_info=model["update_info"],
+        normalizations=model["normalizations"],
+    )
+    if additional_constraints is not None:
+        constr = constr + list(additional_constraints)
+
+    params_template = pd.DataFrame(columns=["value"], index=p_index)
+    params_template = add_bounds(
+        params_template, model["estimation_options"]["bounds_distance"]
+    )
+
+    if free_params:
+        get_free_params_functions = _get_free_params_functions(
+            _loglike,
+            fp.get_free_params_info(params_template, constr),
+            params_template,
+            jacobian_type,
+        )
+
+    def _get_inputs(data_arrays):
+        def debug_loglike(params):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _loglike(params_vec, data_arrays, debug=True)[1]
+            if jax_output["contributions"].dtype != "float64":
+                raise TypeError()
+            numpy_output = _to_numpy(jax_output)
+            numpy_output["value"] = float(numpy_output["value"])
+            numpy_output = partialed_process_debug_data(numpy_output)
+            return numpy_output
+
+        def kalman_filter(params):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _jitted_debug_loglike(params_vec, data_arrays)[1]
+            keys = ["filtered_states", "filtered_upper_chols", "log_mixture_weights"]
+            return {key: np.array(jax_output[key]) for key in keys}
+
+        def loglike(params):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _jitted_loglike(params_vec, data_arrays)[1]
+            numpy_output = _to_numpy(jax_output)
+            numpy_output["value"] = float(numpy_output["value"])
+            return numpy_output
+
+        def gradient(params):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _gradient(params_vec, data_arrays)[0]
+            return _to_numpy(jax_output)
+
+        def jacobian(params):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _jacobian(params_vec, data_arrays)[0]
+            return _to_numpy(jax_output)
+
+        def loglike_and_gradient(params):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_grad, jax_crit = _gradient(params_vec, data_arrays)
+            numpy_grad = _to_numpy(jax_grad)
+            numpy_crit = _to_numpy(jax_crit)
+            numpy_crit["value"] = float(numpy_crit["value"])
+            return numpy_crit, numpy_grad
+
+        incremental_loglike = _get_incremental_loglike(
+            _loglike,
+            partialed_get_jnp_params_vec,
+            p_index,
+            update_info,
+            data_arrays,
+            _jitted_incremental_loglikes,
+        )
+
+        def hessian_vector_product(params, v):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _jitted_hessian_vector_product(
+                params_vec, jnp.array(v, dtype=float), data_arrays
+            )
+            return _to_numpy(jax_output)
+
+        def fisher_vector_product(params, v):
+            params_vec = partialed_get_jnp_params_vec(params)
+            jax_output = _jitted_fisher_vector_product(
+                params_vec, jnp.array(v, dtype=float), data_arrays
+            )
+            return _to_numpy(jax_output)
+
+        def with_data(new_data):
+            new_arrays, new_segments = _get_data_arrays(new_data, model)
+            if new_segments != segments:
+                return get_maximization_inputs(
+                    model_dict,
+                    new_data,
+                    jacobian_type=jacobian_type,
+                    free_params=free_params,
+                    additional_constraints=additional_constraints,
+                )
+            return _get_inputs(new_arrays)
+
+        out = {
+            "loglike": loglike,
+            "debug_loglike": debug_loglike,
+            "kalman_filter": kalman_filter,
+            "gradient": gradient,
+            "jacobian": jacobian,
+            "loglike_and_gradient": loglike_and_gradient,
+            "incremental_loglike": incremental_loglike,
+            "hessian_vector_product": hessian_vector_product,
+            "fisher_vector_product": fisher_vector_product,
+            "with_data": with_data,
+            "constraints": constr,
+            "params_template": params_template,
+            "n_obs": data_arrays["measurements"].shape[1],
+        }
+
+        if free_params:
+            out.update(get_free_params_functions(data_arrays))
+
+        return out
+
+    return _get_inputs(data_arrays)
+
+
+def get_base_loglike(model, parsing_info):
+    """Partial out everything but the parameters and data from the log likelihood.
+
+    Args:
+        model (dict): The processed model specification.
+        parsing_info (dict): Contains information how to parse parameter vector.
+
+    Returns:
+        function: :func:`_log_likelihood_jax` with all arguments that only depend on
+            the model specification partialled out.
+
+    """
     sigma_scaling_factor, sigma_weights = calculate_sigma_scaling_factor_and_weights(
         model["dimensions"]["n_latent_factors"],
         model["estimation_options"]["sigma_points_scale"],
@@ -80,11 +360,9 @@ def get_maximization_inputs(model_dict, data, jacobian_type="jacrev"):
     # To achieve that, we replace the last period by -1.
     iteration_to_period = _periods.replace(last_period, -1).to_numpy()
 
-    _base_loglike = functools.partial(
+    base_loglike = functools.partial(
         _log_likelihood_jax,
         parsing_info=parsing_info,
-        measurements=measurements,
-        controls=controls,
         transition_info=model["transition_info"],
         sigma_scaling_factor=sigma_scaling_factor,
         sigma_weights=sigma_weights,
@@ -94,82 +372,306 @@ def get_maximization_inputs(model_dict, data, jacobian_type="jacrev"):
         is_measurement_iteration=is_measurement_iteration,
         is_predict_iteration=is_predict_iteration,
         iteration_to_period=iteration_to_period,
-        observed_factors=observed_factors,
     )
 
-    partialed_process_debug_data = functools.partial(process_debug_data, model=model)
+    return base_loglike
 
-    partialed_get_jnp_params_vec = functools.partial(
-        _get_jnp_params_vec, target_index=p_index
+
+def _get_data_arrays(data, model):
+    """Process the data and sort the individuals by their last observed period.
+
+    Args:
+        data (DataFrame): dataset in long format.
+        model (dict): The processed model specification.
+
+    Returns:
+        dict: The data arrays that are passed to :func:`_log_likelihood_jax`, i.e.
+            "measurements", "controls" and "observed_factors", as well as
+            "inverse_order". See :func:`get_attrition_info`.
+        list: The "segments" entry of :func:`get_attrition_info`.
+
+    """
+    measurements, controls, observed_factors = process_data(
+        data, model["labels"], model["update_info"], model["anchoring"]
     )
 
-    _debug_loglike = functools.partial(_base_loglike, debug=True)
+    attrition_info = get_attrition_info(measurements, model["update_info"])
+    order = attrition_info["order"]
+    data_arrays = {
+        "measurements": measurements[:, order],
+        "controls": controls[:, order],
+        "observed_factors": observed_factors[:, order],
+        "inverse_order": jnp.array(attrition_info["inverse_order"]),
+    }
+    return data_arrays, attrition_info["segments"]
 
-    _loglike = functools.partial(_base_loglike, debug=False)
 
-    _jitted_loglike = jax.jit(_loglike)
-    _gradient = jax.jit(jax.grad(_loglike, has_aux=True))
-    _jacobian = jax.jit(getattr(jax, jacobian_type)(_loglike, has_aux=True))
+def _get_free_params_functions(
+    loglike, free_params_info, params_template, jacobian_type
+):
+    """Create versions of the likelihood functions that take free parameters.
 
-    def debug_loglike(params):
-        params_vec = partialed_get_jnp_params_vec(params)
-        jax_output = _debug_loglike(params_vec)[1]
-        if jax_output["contributions"].dtype != "float64":
-            raise TypeError()
-        numpy_output = _to_numpy(jax_output)
-        numpy_output["value"] = float(numpy_output["value"])
-        numpy_output = partialed_process_debug_data(numpy_output)
-        return numpy_output
+    Args:
+        loglike (function): The not jitted log likelihood function that takes a 1d
+            jax array with all parameters and a dict with the data arrays.
+        free_params_info (dict): See
+            :func:`skillmodels.free_params.get_free_params_info`.
+        params_template (pd.DataFrame): See :func:`get_maximization_inputs`.
+        jacobian_type (str): "jacrev" or "jacfwd".
 
-    def loglike(params):
-        params_vec = partialed_get_jnp_params_vec(params)
-        jax_output = _jitted_loglike(params_vec)[1]
-        numpy_output = _to_numpy(jax_output)
-        numpy_output["value"] = float(numpy_output["value"])
-        return numpy_output
-
-    def gradient(params):
-        params_vec = partialed_get_jnp_params_vec(params)
-        jax_output = _gradient(params_vec)[0]
-        return _to_numpy(jax_output)
-
-    def jacobian(params):
-        params_vec = partialed_get_jnp_params_vec(params)
-        jax_output = _jacobian(params_vec)[0]
-        return _to_numpy(jax_output)
-
-    def loglike_and_gradient(params):
-        params_vec = partialed_get_jnp_params_vec(params)
-        jax_grad, jax_crit = _gradient(params_vec)
-        numpy_grad = _to_numpy(jax_grad)
-        numpy_crit = _to_numpy(jax_crit)
-        numpy_crit["value"] = float(numpy_crit["value"])
-        return numpy_crit, numpy_grad
+    Returns:
+        function: Takes a dict with the data arrays and returns the free_* entries
+            described in :func:`get_maximization_inputs`. The compiled functions are
+            shared between all datasets.
 
-    constr = get_constraints(
-        dimensions=model["dimensions"],
-        labels=model["labels"],
-        anchoring_info=model["anchoring"],
-        update_info=model["update_info"],
-        normalizations=model["normalizations"],
+    """
+    to_params = functools.partial(
+        fp.params_from_free_params, free_params_info=free_params_info
     )
 
-    params_template = pd.DataFrame(columns=["value"], index=p_index)
-    params_template = add_bounds(
-        params_template, model["estimation_options"]["bounds_distance"]
+    def _free_loglike(free_vec, data_arrays):
+        return loglike(to_params(free_vec), data_arrays)
+
+    _jitted_loglike = jax.jit(_free_loglike)
+    _gradient = jax.jit(jax.grad(_free_loglike, has_aux=True))
+    _jacobian = jax.jit(
+        getattr(jax, jacobian_type)(
+            functools.partial(_contributions_and_aux, loglike=_free_loglike),
+            has_aux=True,
+        )
     )
 
-    out = {
-        "loglike": loglike,
-        "debug_loglike": debug_loglike,
-        "gradient": gradient,
-        "jacobian": jacobian,
-        "loglike_and_gradient": loglike_and_gradient,
-        "constraints": constr,
-        "params_template": params_template,
-    }
+    def _weighted_free_loglike(free_vec, weights, data_arrays):
+        _, additional_data = _free_loglike(free_vec, data_arrays)
+        return weights @ additional_data["contributions"]
 
-    return out
+    _weighted_loglike_and_gradient = jax.jit(jax.value_and_grad(_weighted_free_loglike))
+
+    def _free_contributions(free_vec, data_arrays):
+        return _free_loglike(free_vec, data_arrays)[1]["contributions"]
+
+    def _free_value(free_vec, data_arrays):
+        return _free_loglike(free_vec, data_arrays)[0]
+
+    def _jacobian_product(free_vec, vector, data_arrays):
+        return jax.jvp(
+            functools.partial(_free_contributions, data_arrays=data_arrays),
+            (free_vec,),
+            (vector,),
+        )[1]
+
+    def _hessian_product(free_vec, vector, data_arrays):
+        return jax.jvp(
+            jax.grad(functools.partial(_free_value, data_arrays=data_arrays)),
+            (free_vec,),
+            (vector,),
+        )[1]
+
+    def _fisher_product(free_vec, vector, data_arrays):
+        _, linearized = jax.linearize(
+            functools.partial(_free_contributions, data_arrays=data_arrays), free_vec
+        )
+        transposed = jax.linear_transpose(linearized, free_vec)
+        return transposed(linearized(vector))[0]
+
+    _jacobian_products = jax.jit(
+        jax.vmap(_jacobian_product, in_axes=(None, 1, None), out_axes=1)
+    )
+    _fisher_products = jax.jit(
+        jax.vmap(_fisher_product, in_axes=(None, 1, None), out_axes=1)
+    )
+    _hessian_products = jax.jit(
+        jax.vmap(_hessian_product, in_axes=(None, 1, None), out_axes=1)
+    )
+    _to_params_jacobian = jax.jit(jax.jacfwd(to_params))
+
+    def get_free_params_functions(data_arrays):
+        def free_loglike(free_vec):
+            jax_output = _jitted_loglike(jnp.array(free_vec, dtype=float), data_arrays)[
+                1
+            ]
+            numpy_output = _to_numpy(jax_output)
+            numpy_output["value"] = float(numpy_output["value"])
+            return numpy_output
+
+        def free_gradient(free_vec):
+            jax_output = _gradient(jnp.array(free_vec, dtype=float), data_arrays)[0]
+            return _to_numpy(jax_output)
+
+        def free_jacobian(free_vec):
+            jax_output = _jacobian(jnp.array(free_vec, dtype=float), data_arrays)[0]
+            return _to_numpy(jax_output)
+
+        def free_loglike_and_gradient(free_vec):
+            jax_grad, jax_crit = _gradient(
+                jnp.array(free_vec, dtype=float), data_arrays
+            )
+            numpy_grad = _to_numpy(jax_grad)
+            numpy_crit = _to_numpy(jax_crit)
+            numpy_crit["value"] = float(numpy_crit["value"])
+            return numpy_crit, numpy_grad
+
+        def free_weighted_loglike_and_gradient(free_vec, weights):
+            value, grad = _weighted_loglike_and_gradient(
+                jnp.array(free_vec, dtype=float),
+                jnp.array(weights, dtype=float),
+                data_arrays,
+            )
+            return float(value), _to_numpy(grad)
+
+        def free_jacobian_products(free_vec, vectors):
+            jax_output = _jacobian_products(
+                jnp.array(free_vec, dtype=float),
+                jnp.array(vectors, dtype=float),
+                data_arrays,
+            )
+            return _to_numpy(jax_output)
+
+        def free_fisher_products(free_vec, vectors):
+            jax_output = _fisher_products(
+                jnp.array(free_vec, dtype=float),
+                jnp.array(vectors, dtype=float),
+                data_arrays,
+            )
+            return _to_numpy(jax_output)
+
+        def free_hessian_products(free_vec, vectors):
+            jax_output = _hessian_products(
+                jnp.array(free_vec, dtype=float),
+                jnp.array(vectors, dtype=float),
+                data_arrays,
+            )
+            return _to_numpy(jax_output)
+
+        def params_from_free_params_jacobian(free_vec):
+            jax_output = _to_params_jacobian(jnp.array(free_vec, dtype=float))
+            return _to_numpy(jax_output)
+
+        def free_params_from_params(params):
+            params_vec = get_jnp_params_vec(params, target_index=params_template.index)
+            return fp.free_params_from_params(params_vec, free_params_info)
+
+        def params_from_free_params(free_vec):
+            params = params_template.copy()
+            params["value"] = np.array(to_params(jnp.array(free_vec, dtype=float)))
+            return params
+
+        out = {
+            "free_loglike": free_loglike,
+            "free_gradient": free_gradient,
+            "free_jacobian": free_jacobian,
+            "free_loglike_and_gradient": free_loglike_and_gradient,
+            "free_weighted_loglike_and_gradient": free_weighted_loglike_and_gradient,
+            "free_jacobian_products": free_jacobian_products,
+            "free_fisher_products": free_fisher_products,
+            "free_hessian_products": free_hessian_products,
+            "params_from_free_params_jacobian": params_from_free_params_jacobian,
+            "free_params_template": free_params_info["free_params_template"],
+            "free_params_from_params": free_params_from_params,
+            "params_from_free_params": params_from_free_params,
+        }
+        return out
+
+    return get_free_params_functions
+
+
+def _get_incremental_loglike(
+    loglike, get_params_vec, params_index, update_info, data_arrays, jitted
+):
+    """Create a log likelihood function that reuses the filtering of early periods.
+
+    Args:
+        loglike (function): The not jitted log likelihood function that takes a 1d
+            jax array with all parameters, a dict with the data arrays and the keyword
+            arguments of :func:`_log_likelihood_jax` that control where the filter
+            starts.
+        get_params_vec (function): Converts a params DataFrame to a 1d jax array.
+        params_index (pandas.MultiIndex): The params index.
+        update_info (pandas.DataFrame): DataFrame with one row per Kalman update.
+        data_arrays (dict): The data arrays that are passed to loglike.
+        jitted (dict): Maps start iterations to compiled versions of loglike. It is
+            filled on demand and can be shared between datasets.
+
+    Returns:
+        function: See "incremental_loglike" in :func:`get_maximization_inputs`.
+
+    """
+    update_periods = update_info.index.get_level_values("period").to_numpy()
+    periods, period_starts = np.unique(update_periods, return_index=True)
+    period_starts = pd.Series(period_starts, index=periods)
+    cache_iterations = tuple(int(start) for start in period_starts if start > 0)
+
+    first_affected_periods = _get_first_affected_periods(params_index, update_info)
+
+    cache = {}
+
+    def incremental_loglike(params):
+        params_vec = get_params_vec(params)
+        numpy_params_vec = np.array(params_vec)
+
+        if not cache:
+            start = 0
+        else:
+            changed = numpy_params_vec != cache["params_vec"]
+            if not changed.any():
+                return copy.deepcopy(cache["output"])
+            start = int(period_starts[first_affected_periods[changed].min()])
+
+        if start not in jitted:
+            jitted[start] = jax.jit(
+                functools.partial(
+                    loglike, start_iteration=start, cache_iterations=cache_iterations
+                )
+            )
+
+        if start == 0:
+            kwargs = {}
+        else:
+            kwargs = {
+                "initial_carry": cache["carries"].get(start),
+                "previous_loglikes": cache["loglikes"][:start],
+            }
+        jax_output = jitted[start](params_vec, data_arrays, **kwargs)[1]
+
+        new_cache = jax_output.pop("cache")
+        cache["params_vec"] = numpy_params_vec
+        cache["loglikes"] = new_cache["loglikes"]
+        cache["carries"] = {
+            **{k: v for k, v in cache.get("carries", {}).items() if k <= start},
+            **new_cache["carries"],
+        }
+
+        numpy_output = _to_numpy(jax_output)
+        numpy_output["value"] = float(numpy_output["value"])
+        cache["output"] = numpy_output
+        return copy.deepcopy(numpy_output)
+
+    return incremental_loglike
+
+
+def _get_first_affected_periods(params_index, update_info):
+    """Determine the first period whose Kalman updates depend on each parameter.
+
+    Measurement parameters affect the updates of their period. Parameters of
+    anchoring equations also affect the predict step of the previous period.
+    Transition parameters and shock standard deviations affect the predict step of
+    their period. All other parameters affect the initial states.
+
+    """
+    categories = params_index.get_level_values("category")
+    periods = params_index.get_level_values("period").to_numpy().copy()
+
+    anchoring = update_info.query("purpose == 'anchoring'").index
+    is_anchoring_param = pd.MultiIndex.from_arrays(
+        [periods, params_index.get_level_values("name1")]
+    ).isin(anchoring)
+
+    is_measurement_param = categories.isin(["controls", "loadings", "meas_sds"])
+    is_transition_param = categories.isin(["transition", "shock_sds"])
+
+    periods[is_anchoring_param & is_measurement_param] -= 1
+    periods[~(is_measurement_param | is_transition_param)] = 0
+    return np.clip(periods, 0, None)
 
 
 def _log_likelihood_jax(
@@ -188,6 +690,11 @@ def _log_likelihood_jax(
     iteration_to_period,
     debug,
     observed_factors,
+    attrition_info,
+    start_iteration=0,
+    initial_carry=None,
+    previous_loglikes=None,
+    cache_iterations=(),
 ):
     """Log likelihood of a skill formation model.
 
@@ -224,6 +731,20 @@ def _log_likelihood_jax(
         debug (bool): Boolean flag. If True, more intermediate results are returned
         observed_factors (jax.numpy.array): Array of shape (n_periods, n_obs,
             n_observed_factors) with data on the observed factors.
+        attrition_info (dict): Information on how the individuals in the data arrays
+            are sorted and which of them are still observed in each Kalman update.
+            See :func:`get_attrition_info`.
+        start_iteration (int): Kalman update at which the filter starts. If it is not
+            zero, the filter resumes from initial_carry and the log likelihoods of
+            earlier updates are taken from previous_loglikes.
+        initial_carry (dict): The states, upper_chols and log_mixture_weights before
+            start_iteration, as returned in the "cache" entry of an earlier call.
+        previous_loglikes (jax.numpy.array): Array of shape (start_iteration, n_obs)
+            with the log likelihoods of the updates before start_iteration.
+        cache_iterations (tuple): Kalman updates whose carry is returned. If not
+            empty, the additional data contain the entry "cache" with the entries
+            "carries" (dict mapping Kalman updates to carries) and "loglikes" (the
+            unclipped log likelihood of each update and individual).
 
     Returns:
         jnp.array: 1d array of length 1, the aggregated log likelihood.
@@ -234,14 +755,23 @@ def _log_likelihood_jax(
     """
     n_obs = measurements.shape[1]
     states, upper_chols, log_mixture_weights, pardict = parse_params(
-        params, parsing_info, dimensions, labels, n_obs
+        params, parsing_info, dimensions, labels
     )
 
-    carry = {
-        "states": states,
-        "upper_chols": upper_chols,
-        "log_mixture_weights": log_mixture_weights,
-    }
+    memory_layout = estimation_options["memory_layout"]
+    if memory_layout == "soa":
+        states, upper_chols, log_mixture_weights = to_soa_layout(
+            states, upper_chols, log_mixture_weights
+        )
+
+    if start_iteration == 0:
+        carry = {
+            "states": states,
+            "upper_chols": upper_chols,
+            "log_mixture_weights": log_mixture_weights,
+        }
+    else:
+        carry = initial_carry
 
     loop_args = {
         "period": iteration_to_period,
@@ -253,19 +783,73 @@ def _log_likelihood_jax(
         "is_predict_iteration": is_predict_iteration,
     }
 
-    _body = functools.partial(
-        _scan_body,
-        controls=controls,
-        pardict=pardict,
-        sigma_scaling_factor=sigma_scaling_factor,
-        sigma_weights=sigma_weights,
-        transition_info=transition_info,
-        observed_factors=observed_factors,
-        debug=debug,
-    )
+    # In debug mode all individuals are filtered through all periods such that the
+    # filtered states are available for everyone. Otherwise, each segment of Kalman
+    # updates only processes the individuals that are observed in or after it.
+    if debug:
+        segments = [(0, len(iteration_to_period), n_obs)]
+    else:
+        segments = attrition_info["segments"]
+    segments = [
+        (max(start, start_iteration), stop, n_active)
+        for start, stop, n_active in segments
+        if stop > start_iteration
+    ]
+
+    loglikes = [] if previous_loglikes is None else [previous_loglikes]
+    carries = {}
+    for start, stop, n_active in segments:
+        if n_active == 0:
+            loglikes.append(jnp.zeros((stop - start, n_obs)))
+            continue
+
+        carry = {
+            key: _select_individuals(arr, n_active, memory_layout)
+            for key, arr in carry.items()
+        }
+        segment_args = {key: arr[start:stop] for key, arr in loop_args.items()}
+        segment_args["measurements"] = segment_args["measurements"][:, :n_active]
+
+        _body = functools.partial(
+            _scan_body,
+            controls=controls[:, :n_active],
+            pardict=pardict,
+            sigma_scaling_factor=sigma_scaling_factor,
+            sigma_weights=sigma_weights,
+            transition_info=transition_info,
+            observed_factors=observed_factors[:, :n_active],
+            debug=debug,
+            memory_layout=memory_layout,
+        )
+
+        if start == 0:
+            # The initial states, cholesky factors and mixture weights are the same
+            # for all individuals and are only broadcast to the number of individuals
+            # by the first Kalman update. Since lax.scan needs a carry with constant
+            # shape, the first iteration is done outside of the scan.
+            first_args = {key: arr[0] for key, arr in segment_args.items()}
+            carry, first_out = _body(carry, first_args)
+            static_out = jax.tree_util.tree_map(lambda arr: arr[None], first_out)
+            segment_args = {key: arr[1:] for key, arr in segment_args.items()}
+        else:
+            static_out = None
+
+        if len(segment_args["period"]) > 0:
+            carry, scan_out, segment_carries = _scan_with_cached_carries(
+                body=_body,
+                carry=carry,
+                loop_args=segment_args,
+                first_iteration=stop - len(segment_args["period"]),
+                cache_iterations=cache_iterations,
+            )
+            carries.update(segment_carries)
+            static_out = _concatenate_static_out(static_out, scan_out)
+
+        loglikes.append(
+            jnp.pad(static_out["loglikes"], ((0, 0), (0, n_obs - n_active)))
+        )
 
-    carry, static_out = lax.scan(_body, carry, loop_args)
-    loglikes = static_out["loglikes"]
+    loglikes = jnp.concatenate(loglikes, axis=0)
 
     # clip contributions before aggregation to preserve as much information as
     # possible.
@@ -283,26 +867,95 @@ def _log_likelihood_jax(
         # used for scalar optimization, thus has to be clipped
         "value": value,
         # can be used for sum-structure optimizers, thus has to be clipped
-        "contributions": clipped.sum(axis=0),
+        "contributions": clipped.sum(axis=0)[attrition_info["inverse_order"]],
     }
 
+    if cache_iterations:
+        additional_data["cache"] = {"carries": carries, "loglikes": loglikes}
+
     if debug:
-        additional_data["all_contributions"] = loglikes
-        additional_data["residuals"] = static_out["residuals"]
-        additional_data["residual_sds"] = static_out["residual_sds"]
+        if memory_layout == "soa":
+            static_out = {
+                key: jnp.moveaxis(arr, -1, 1) for key, arr in static_out.items()
+            }
+        inverse_order = attrition_info["inverse_order"]
+        additional_data["all_contributions"] = loglikes[:, inverse_order]
+        additional_data["residuals"] = static_out["residuals"][:, inverse_order]
+        additional_data["residual_sds"] = static_out["residual_sds"][:, inverse_order]
 
         initial_states, _, initial_log_mixture_weights, _ = parse_params(
-            params, parsing_info, dimensions, labels, n_obs
+            params, parsing_info, dimensions, labels
+        )
+        additional_data["initial_states"] = jnp.broadcast_to(
+            initial_states, (n_obs, *initial_states.shape[1:])
+        )
+        additional_data["initial_log_mixture_weights"] = jnp.broadcast_to(
+            initial_log_mixture_weights, (n_obs, *initial_log_mixture_weights.shape[1:])
         )
-        additional_data["initial_states"] = initial_states
-        additional_data["initial_log_mixture_weights"] = initial_log_mixture_weights
 
-        additional_data["filtered_states"] = static_out["states"]
-        additional_data["log_mixture_weights"] = static_out["log_mixture_weights"]
+        additional_data["filtered_states"] = static_out["states"][:, inverse_order]
+        additional_data["filtered_upper_chols"] = static_out["upper_chols"][
+            :, inverse_order
+        ]
+        additional_data["log_mixture_weights"] = static_out["log_mixture_weights"][
+            :, inverse_order
+        ]
 
     return value, additional_data
 
 
+def get_attrition_info(measurements, update_info):
+    """Collect information needed to stop filtering individuals after they drop out.
+
+    The panel is balanced during data processing, such that individuals who drop out
+    early still have all-NaN measurements in later periods. Filtering them through
+    those periods does not change their likelihood contribution.
+
+    Individuals are sorted by the last period in which they have at least one
+    observed measurement, such that individuals who are still observed form a prefix
+    of the data arrays. The Kalman updates are grouped into segments of consecutive
+    updates that have the same number of still observed individuals.
+
+    Args:
+        measurements (jax.numpy.array): Array of shape (n_updates, n_obs) with data on
+            observed measurements. NaN if the measurement was not observed.
+        update_info (pandas.DataFrame): DataFrame with one row per Kalman update needed
+            in the likelihood function. See :ref:`update_info`.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "order" (numpy.ndarray): Permutation of the individuals that sorts
+              them by their last observed period in descending order.
+            - "inverse_order" (numpy.ndarray): Permutation that restores the original
+              order of the individuals.
+            - "segments" (list): List of tuples (start, stop, n_active). start and
+              stop are positions of Kalman updates, n_active is the number of
+              individuals that have to be processed in those updates.
+
+    """
+    iteration_periods = update_info.index.get_level_values("period").to_numpy()
+    is_observed = np.isfinite(np.array(measurements))
+    observed_periods = np.where(is_observed, iteration_periods.reshape(-1, 1), -1)
+    last_observed_period = observed_periods.max(axis=0, initial=-1)
+
+    order = np.argsort(-last_observed_period, kind="stable")
+    inverse_order = np.argsort(order)
+
+    n_active = (
+        last_observed_period.reshape(1, -1) >= iteration_periods.reshape(-1, 1)
+    ).sum(axis=1)
+
+    segments = []
+    start = 0
+    for stop in range(1, len(n_active) + 1):
+        if stop == len(n_active) or n_active[stop] != n_active[start]:
+            segments.append((start, stop, int(n_active[start])))
+            start = stop
+
+    out = {"order": order, "inverse_order": inverse_order, "segments": segments}
+    return out
+
+
 def _scan_body(
     carry,
     loop_args,
@@ -313,10 +966,13 @@ def _scan_body(
     transition_info,
     observed_factors,
     debug,
+    memory_layout,
 ):
     # ==================================================================================
     # create arguments needed for update
     # ==================================================================================
+    kernels = KERNELS[memory_layout]
+    n_obs = loop_args["measurements"].shape[-1]
     t = loop_args["period"]
     states = carry["states"]
     upper_chols = carry["upper_chols"]
@@ -336,13 +992,31 @@ def _scan_body(
     # ==================================================================================
     # do a measurement or anchoring update
     # ==================================================================================
-    states, upper_chols, log_mixture_weights, loglikes, info = lax.cond(
+    states, upper_chols, log_mixture_weights, loglikes, info = _cond(
         loop_args["is_measurement_iteration"],
-        functools.partial(_one_arg_measurement_update, debug=debug),
-        functools.partial(_one_arg_anchoring_update, debug=debug),
+        functools.partial(
+            _one_arg_measurement_update, debug=debug, update_func=kernels["update"]
+        ),
+        functools.partial(
+            _one_arg_anchoring_update, debug=debug, update_func=kernels["update"]
+        ),
         update_kwargs,
     )
 
+    # the anchoring update does not broadcast initial states to all individuals
+    states, upper_chols, log_mixture_weights = (
+        _broadcast_individuals(arr, n_obs, memory_layout)
+        for arr in (states, upper_chols, log_mixture_weights)
+    )
+
+    if len(pardict["shock_sds"]) == 0:
+        # models with only one period have no transition equations
+        if debug:
+            info = {**info, "upper_chols": upper_chols}
+        return _get_scan_body_output(
+            states, upper_chols, log_mixture_weights, loglikes, info, states
+        )
+
     # ==================================================================================
     # create arguments needed for predict step
     # ==================================================================================
@@ -360,18 +1034,32 @@ def _scan_body(
         "observed_factors": observed_factors[t],
     }
 
-    fixed_kwargs = {"transition_info": transition_info}
+    fixed_kwargs = {
+        "transition_info": transition_info,
+        "predict_func": kernels["predict"],
+    }
 
     # ==================================================================================
     # Do a predict step or a do-nothing fake predict step
     # ==================================================================================
-    states, upper_chols, filtered_states = lax.cond(
+    states, upper_chols, filtered_states, filtered_upper_chols = _cond(
         loop_args["is_predict_iteration"],
         functools.partial(_one_arg_predict, **fixed_kwargs),
         functools.partial(_one_arg_no_predict, **fixed_kwargs),
         predict_kwargs,
     )
 
+    if debug:
+        info = {**info, "upper_chols": filtered_upper_chols}
+
+    return _get_scan_body_output(
+        states, upper_chols, log_mixture_weights, loglikes, info, filtered_states
+    )
+
+
+def _get_scan_body_output(
+    states, upper_chols, log_mixture_weights, loglikes, info, filtered_states
+):
     new_state = {
         "states": states,
         "upper_chols": upper_chols,
@@ -382,13 +1070,68 @@ def _scan_body(
     return new_state, static_out
 
 
-def _one_arg_measurement_update(kwargs, debug):
-    out = kalman_update(**kwargs, debug=debug)
+def _scan_with_cached_carries(
+    body, carry, loop_args, first_iteration, cache_iterations
+):
+    """Run lax.scan over Kalman updates and keep the carry before cache_iterations.
+
+    The scan is split at the cached Kalman updates, such that the carry is only kept
+    at these boundaries instead of being returned as output of every update.
+
+    Args:
+        body (function): The scan body.
+        carry (dict): The carry before the first Kalman update.
+        loop_args (dict): The loop arguments with the Kalman updates as first axis.
+        first_iteration (int): The Kalman update of the first entry of loop_args.
+        cache_iterations (tuple): Kalman updates whose carry is returned.
+
+    Returns:
+        dict: The carry after the last Kalman update.
+        dict: The stacked outputs of body.
+        dict: Maps the cached Kalman updates in the scanned range to the carry
+            before them.
+
+    """
+    stop = first_iteration + len(loop_args["period"])
+    boundaries = sorted(
+        {first_iteration, stop}
+        | {it for it in cache_iterations if first_iteration < it < stop}
+    )
+    carries = {}
+    static_out = None
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        if start in cache_iterations:
+            carries[start] = carry
+        args = {
+            key: arr[start - first_iteration : end - first_iteration]
+            for key, arr in loop_args.items()
+        }
+        carry, scan_out = lax.scan(body, carry, args)
+        static_out = _concatenate_static_out(static_out, scan_out)
+    return carry, static_out, carries
+
+
+def _cond(pred, true_fun, false_fun, operand):
+    """Like lax.cond but only evaluates one branch if pred is a python or numpy bool.
+
+    This is used for the first Kalman update which is done outside of lax.scan and
+    where the outputs of the branches can have different shapes.
+
+    """
+    if isinstance(pred, (bool, np.bool_)):
+        out = true_fun(operand) if pred else false_fun(operand)
+    else:
+        out = lax.cond(pred, true_fun, false_fun, operand)
+    return out
+
+
+def _one_arg_measurement_update(kwargs, debug, update_func):
+    out = update_func(**kwargs, debug=debug)
     return out
 
 
-def _one_arg_anchoring_update(kwargs, debug):
-    _, _, new_log_mixture_weights, new_loglikes, debug_info = kalman_update(
+def _one_arg_anchoring_update(kwargs, debug, update_func):
+    _, _, new_log_mixture_weights, new_loglikes, debug_info = update_func(
         **kwargs, debug=debug
     )
     out = (
@@ -401,17 +1144,53 @@ def _one_arg_anchoring_update(kwargs, debug):
     return out
 
 
-def _one_arg_no_predict(kwargs, transition_info):
+def _one_arg_no_predict(kwargs, transition_info, predict_func):
     """Just return the states cond chols without any changes."""
-    return kwargs["states"], kwargs["upper_chols"], kwargs["states"]
+    states, upper_chols = kwargs["states"], kwargs["upper_chols"]
+    return states, upper_chols, states, upper_chols
 
 
-def _one_arg_predict(kwargs, transition_info):
-    """Do a predict step but also return the input states as filtered states."""
-    new_states, new_upper_chols = kalman_predict(
+def _one_arg_predict(kwargs, transition_info, predict_func):
+    """Do a predict step but also return the input states and chols as filtered."""
+    new_states, new_upper_chols = predict_func(
         **kwargs, transition_info=transition_info
     )
-    return new_states, new_upper_chols, kwargs["states"]
+    return new_states, new_upper_chols, kwargs["states"], kwargs["upper_chols"]
+
+
+def _select_individuals(arr, n_obs, memory_layout):
+    """Select the first n_obs individuals of an array in the given memory layout."""
+    if memory_layout == "soa":
+        out = arr[..., :n_obs]
+    else:
+        out = arr[:n_obs]
+    return out
+
+
+def _concatenate_static_out(first, second):
+    """Concatenate two dicts of arrays along the first axis; first can be None."""
+    if first is None:
+        out = second
+    else:
+        out = jax.tree_util.tree_map(
+            lambda a, b: jnp.concatenate([a, b], axis=0), first, second
+        )
+    return out
+
+
+def _broadcast_individuals(arr, n_obs, memory_layout):
+    """Broadcast an array in the given memory layout to n_obs individuals."""
+    if memory_layout == "soa":
+        out = jnp.broadcast_to(arr, (*arr.shape[:-1], n_obs))
+    else:
+        out = jnp.broadcast_to(arr, (n_obs, *arr.shape[1:]))
+    return out
+
+
+def _contributions_and_aux(params, data_arrays, loglike):
+    """Make the contributions the main output of loglike, e.g. to get a jacobian."""
+    _, additional_data = loglike(params, data_arrays)
+    return additional_data["contributions"], additional_data
 
 
 def _to_numpy(obj):
@@ -431,7 +1210,14 @@ def _to_numpy(obj):
     return res
 
 
-def _get_jnp_params_vec(params, target_index):
+def get_jnp_params_vec(params, target_index):
+    """Convert the "value" column of params to a jax array in the order of target_index.
+
+    Raises:
+        ValueError: If the index of params does not contain exactly the entries of
+            target_index.
+
+    """
     if set(params.index) != set(target_index):
         additional_entries = params.index.difference(target_index).tolist()
         missing_entries = target_index.difference(params.index).tolist()
@@ -0,0 +1,336 @@
+"""Monte Carlo studies of the estimator: simulate, estimate and aggregate.
+
+Each replication simulates a dataset from the true parameters with
+:func:`skillmodels.simulate_data.simulate_dataset` and estimates the model on it with
+:func:`skillmodels.fit.fit`. Simulated datasets with the same number of individuals
+have the same shape and no missing measurements. Each process therefore compiles the
+likelihood once and evaluates it on the data of all its replications (see "with_data"
+in :func:`skillmodels.likelihood_function.get_maximization_inputs`).
+
+"""
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from skillmodels.fit import fit
+from skillmodels.fit import get_jacobian_type
+from skillmodels.inference import standard_errors
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.params_index import get_params_index
+from skillmodels.process_data import pre_process_data
+from skillmodels.process_model import process_model
+from skillmodels.simulate_data import simulate_dataset
+from skillmodels.utilities import save_atomically
+
+# state of a worker process. The maximization inputs are created by the first
+# replication of a worker and reused by all later replications.
+_WORKER_INPUTS = {}
+
+
+def run_monte_carlo(
+    model_dict,
+    params,
+    n_obs=None,
+    n_replications=100,
+    data=None,
+    start_params=None,
+    algorithm="lbfgs",
+    algo_options=None,
+    standard_error_type="sandwich",
+    confidence_level=0.95,
+    seed=0,
+    n_cores=1,
+    output_dir=None,
+):
+    """Run a Monte Carlo study of the maximum likelihood estimator.
+
+    The replications are run in a pool of processes. Each process compiles the
+    likelihood and the derivatives for the standard errors once and reuses them for
+    all replications that are assigned to it.
+
+    If output_dir is given, the result of each replication is saved there as soon as
+    it is available. Replications whose results are already saved in output_dir are
+    loaded instead of being run again, such that an interrupted study can be resumed.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        params (pandas.DataFrame): The true parameters.
+        n_obs (int): Number of simulated individuals. Ignored if data is given.
+        n_replications (int): Number of simulated datasets.
+        data (pd.DataFrame): Dataset in the same format as for estimation. It
+            provides the control variables and observed factors of all replications.
+        start_params (pandas.DataFrame): Start values of the estimation. Default are
+            the true parameters.
+        algorithm (str): "lbfgs" or "bhhh".
+        algo_options (dict): Keyword arguments for the optimizer.
+        standard_error_type (str or None): "sandwich", "opg" or "hessian". Standard
+            errors of this type (see :func:`skillmodels.inference.standard_errors`)
+            are used to calculate the coverage of confidence intervals. If None, no
+            standard errors are calculated.
+        confidence_level (float): Confidence level of the intervals whose coverage
+            is reported.
+        seed (int): Seed from which the seeds of the simulations are drawn.
+        n_cores (int): Number of processes. If 1, the replications run in the current
+            process. The processes are started with the "spawn" method, which means
+            that model_dict, params and data have to be picklable.
+        output_dir (str or pathlib.Path): Directory for the results of the
+            replications.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "estimates" (pandas.DataFrame): The estimated parameters of each
+              replication. It has one row per replication and the params index as
+              columns.
+            - "standard_errors" (pandas.DataFrame or None): The standard errors of
+              each replication in the same format.
+            - "summary" (pandas.DataFrame): The seed of the simulation, the log
+              likelihood, convergence status and number of iterations of each
+              replication.
+            - "statistics" (pandas.DataFrame): Table with the params index and the
+              columns "true_value", "mean", "bias", "std" and "rmse" as well as
+              "coverage" if standard errors were calculated. All replications are
+              used, irrespective of their convergence status.
+
+    """
+    jacobian_type = get_jacobian_type(algorithm)
+    true_params = _get_true_params(model_dict, params)
+    if start_params is None:
+        start_params = true_params
+
+    seeds = np.random.default_rng(seed).integers(2**31 - 1, size=n_replications)
+
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    settings = {
+        "model_dict": model_dict,
+        "params": true_params,
+        "n_obs": n_obs,
+        "data": data,
+        "start_params": start_params,
+        "fit_kwargs": {"algorithm": algorithm, "algo_options": algo_options},
+        "jacobian_type": jacobian_type,
+        "standard_error_type": standard_error_type,
+        "output_dir": output_dir,
+    }
+    replications = range(n_replications)
+
+    if n_cores == 1:
+        worker = dict(settings)
+        results = [
+            _run_replication(replication, int(seeds[replication]), worker)
+            for replication in replications
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_cores,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker,
+            initargs=(settings,),
+        ) as executor:
+            results = list(
+                executor.map(_run_replication_in_worker, replications, seeds.tolist())
+            )
+
+    index = true_params.index
+    estimates = pd.DataFrame([res["params"] for res in results], columns=index)
+    estimates.index.name = "replication"
+
+    if standard_error_type is None:
+        ses = None
+    else:
+        ses = pd.DataFrame([res["standard_errors"] for res in results], columns=index)
+        ses.index.name = "replication"
+
+    summary = pd.DataFrame(
+        {
+            "seed": [res["seed"] for res in results],
+            "value": [res["value"] for res in results],
+            "converged": [res["converged"] for res in results],
+            "n_iterations": [res["n_iterations"] for res in results],
+        }
+    )
+    summary.index.name = "replication"
+
+    out = {
+        "estimates": estimates,
+        "standard_errors": ses,
+        "summary": summary,
+        "statistics": get_monte_carlo_statistics(
+            estimates, true_params, ses, confidence_level
+        ),
+    }
+    return out
+
+
+def get_monte_carlo_statistics(
+    estimates, true_params, standard_errors=None, confidence_level=0.95
+):
+    """Calculate the bias, RMSE and coverage of the estimates of a Monte Carlo study.
+
+    Args:
+        estimates (pandas.DataFrame): One row per replication and one column per
+            parameter.
+        true_params (pandas.DataFrame): The true parameters in the "value" column.
+        standard_errors (pandas.DataFrame): Standard errors in the format of
+            estimates. If None, the coverage is not calculated.
+        confidence_level (float): Confidence level of the normal approximation
+            confidence intervals whose coverage is calculated.
+
+    Returns:
+        pandas.DataFrame: See "statistics" in :func:`run_monte_carlo`.
+
+    """
+    true_values = true_params["value"].reindex(estimates.columns)
+    errors = estimates - true_values
+
+    statistics = pd.DataFrame(
+        {
+            "true_value": true_values,
+            "mean": estimates.mean(),
+            "bias": errors.mean(),
+            "std": estimates.std(),
+            "rmse": np.sqrt((errors**2).mean()),
+        }
+    )
+
+    if standard_errors is not None:
+        critical_value = norm.ppf((1 + confidence_level) / 2)
+        covered = errors.abs() <= critical_value * standard_errors
+        statistics["coverage"] = covered.mean()
+
+    return statistics
+
+
+def get_simulated_estimation_data(model_dict, simulated, data=None):
+    """Combine simulated measurements with the controls and observed factors of data.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        simulated (pandas.DataFrame): The "measurements" entry of
+            :func:`skillmodels.simulate_data.simulate_dataset`.
+        data (pandas.DataFrame): The dataset with which the measurements were
+            simulated.
+
+    Returns:
+        pandas.DataFrame: Dataset in the format that is needed for estimation. The
+            simulated anchoring outcome of the first anchored factor is used as the
+            anchoring outcome.
+
+    """
+    model = process_model(model_dict)
+    labels = model["labels"]
+    anchoring = model["anchoring"]
+
+    estimation_data = simulated.set_index(["id", "period"])
+    for factor in anchoring["factors"]:
+        outcome = anchoring["outcomes"][factor]
+        copy = estimation_data.pop(f"{outcome}_{factor}")
+        if outcome not in estimation_data:
+            estimation_data[outcome] = copy
+
+    if data is not None:
+        processed = pre_process_data(data, labels["periods"])
+        variables = [c for c in labels["controls"] if c != "constant"]
+        variables += labels["observed_factors"]
+        for var in variables:
+            estimation_data[var] = processed[var].to_numpy()
+
+    return estimation_data
+
+
+def _run_replication(replication, seed, worker):
+    """Simulate a dataset and estimate the model on it.
+
+    Args:
+        replication (int): Number of the replication.
+        seed (int): Seed of the simulation.
+        worker (dict): The settings of :func:`run_monte_carlo`. The maximization
+            inputs are added to it by the first replication.
+
+    Returns:
+        dict: The estimates and standard errors as 1d arrays as well as the seed, the
+            log likelihood, convergence status and number of iterations.
+
+    """
+    name = f"replication_{replication}.pickle"
+    path = None if worker["output_dir"] is None else worker["output_dir"] / name
+    if path is not None and path.exists():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    model_dict = worker["model_dict"]
+    simulated = simulate_dataset(
+        model_dict,
+        worker["params"],
+        n_obs=worker["n_obs"],
+        data=worker["data"],
+        seed=seed,
+    )["measurements"]
+    data = get_simulated_estimation_data(model_dict, simulated, worker["data"])
+
+    if "maximization_inputs" in worker:
+        inputs = worker["maximization_inputs"]["with_data"](data)
+    else:
+        inputs = get_maximization_inputs(
+            model_dict, data, jacobian_type=worker["jacobian_type"], free_params=True
+        )
+        worker["maximization_inputs"] = inputs
+
+    res = fit(
+        model_dict,
+        data,
+        worker["start_params"],
+        maximization_inputs=inputs,
+        **worker["fit_kwargs"],
+    )
+
+    out = {
+        "replication": replication,
+        "seed": seed,
+        "params": res["params"]["value"].to_numpy(),
+        "value": res["value"],
+        "converged": res["converged"],
+        "n_iterations": res["n_iterations"],
+    }
+
+    if worker["standard_error_type"] is not None:
+        se_type = worker["standard_error_type"]
+        ses = standard_errors(
+            model_dict,
+            data,
+            res["params"],
+            maximization_inputs=inputs,
+            types=(se_type,),
+        )["standard_errors"]
+        out["standard_errors"] = ses[se_type].to_numpy()
+
+    if path is not None:
+        save_atomically(out, path)
+    return out
+
+
+def _initialize_worker(settings):
+    _WORKER_INPUTS.update(settings)
+
+
+def _run_replication_in_worker(replication, seed):
+    return _run_replication(replication, seed, _WORKER_INPUTS)
+
+
+def _get_true_params(model_dict, params):
+    """Select the parameters of the model in the order of the params index."""
+    model = process_model(model_dict)
+    params_index = get_params_index(
+        model["update_info"],
+        model["labels"],
+        model["dimensions"],
+        model["transition_info"],
+    )
+    return params.loc[params_index]
@@ -0,0 +1,196 @@
+"""Run several local optimizations from different start values in parallel."""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from skillmodels.fit import fit
+from skillmodels.fit import get_jacobian_type
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.utilities import initialize_compilation_cache
+
+# maximization inputs of a worker process. They are created once per worker such that
+# the likelihood is only compiled once per worker and not once per start.
+_WORKER_INPUTS = {}
+
+
+def fit_multistart(
+    model_dict,
+    data,
+    start_params,
+    n_starts=20,
+    algorithm="lbfgs",
+    algo_options=None,
+    perturbation_scale=0.1,
+    seed=0,
+    n_cores=None,
+    compilation_cache_dir=None,
+):
+    """Estimate a model with several local optimizations from perturbed start values.
+
+    The start values are generated by :func:`get_multistart_params`. The local
+    optimizations are run with :func:`skillmodels.fit.fit` in a pool of processes.
+    Each process compiles the likelihood once and reuses it for all starts that are
+    assigned to it. If compilation_cache_dir is given, the processes load the
+    compiled functions from a persistent cache instead of compiling them.
+
+    The processes are started with the "spawn" method, which means that model_dict
+    and data have to be picklable. In particular, custom transition functions have to
+    be defined at the top level of an importable module.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        start_params (pandas.DataFrame): Parameter DataFrame with the start values in
+            the "value" column. It has to satisfy the constraints of the model.
+        n_starts (int): Number of local optimizations.
+        algorithm (str): "lbfgs" or "bhhh".
+        algo_options (dict): Keyword arguments for the optimizer.
+        perturbation_scale (float): See :func:`get_multistart_params`.
+        seed (int): Seed for the perturbations.
+        n_cores (int): Number of processes. Default is the number of cores, but not
+            more than n_starts. If 1, the optimizations run in the current process.
+        compilation_cache_dir (str or pathlib.Path): Directory of the persistent jax
+            compilation cache.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "best" (dict): The result of :func:`skillmodels.fit.fit` with the
+              highest log likelihood.
+            - "results" (list): The results of all local optimizations, sorted by the
+              log likelihood in descending order. Each result has the additional entry
+              "start", which is the position of its start values.
+            - "summary" (pandas.DataFrame): The log likelihood, convergence status and
+              number of iterations of each local optimization, sorted like results.
+
+    """
+    jacobian_type = get_jacobian_type(algorithm)
+    inputs = get_maximization_inputs(
+        model_dict, data, jacobian_type=jacobian_type, free_params=True
+    )
+    starts = get_multistart_params(
+        start_params, inputs, n_starts, perturbation_scale=perturbation_scale, seed=seed
+    )
+
+    fit_kwargs = {"algorithm": algorithm, "algo_options": algo_options}
+    n_cores = os.cpu_count() if n_cores is None else n_cores
+    n_cores = min(n_cores, n_starts)
+
+    if n_cores == 1:
+        if compilation_cache_dir is not None:
+            initialize_compilation_cache(compilation_cache_dir)
+        results = [
+            fit(model_dict, data, start, maximization_inputs=inputs, **fit_kwargs)
+            for start in starts
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_cores,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker,
+            initargs=(model_dict, data, jacobian_type, compilation_cache_dir),
+        ) as executor:
+            results = list(
+                executor.map(
+                    _fit_in_worker,
+                    starts,
+                    [fit_kwargs] * n_starts,
+                )
+            )
+
+    for i, res in enumerate(results):
+        res["start"] = i
+    results = sorted(results, key=_get_sort_key, reverse=True)
+
+    summary = pd.DataFrame(
+        {
+            "start": [res["start"] for res in results],
+            "value": [res["value"] for res in results],
+            "converged": [res["converged"] for res in results],
+            "n_iterations": [res["n_iterations"] for res in results],
+        }
+    )
+
+    return {"best": results[0], "results": results, "summary": summary}
+
+
+def get_multistart_params(
+    start_params, maximization_inputs, n_starts, perturbation_scale=0.1, seed=0
+):
+    """Generate start values by perturbing start_params.
+
+    The perturbations are drawn for the free parameters (see
+    :func:`skillmodels.free_params.get_free_params_info`), such that all generated
+    start values satisfy the constraints of the model. Free parameters without bounds
+    are perturbed additively with a standard deviation of perturbation_scale times
+    their absolute value (but at least perturbation_scale). Free parameters with a
+    finite lower or upper bound (e.g. standard deviations, see
+    :func:`skillmodels.constraints.add_bounds`) are perturbed multiplicatively in
+    their distance to the bound, such that they stay strictly within the bounds.
+
+    Args:
+        start_params (pandas.DataFrame): Parameter DataFrame with the start values in
+            the "value" column.
+        maximization_inputs (dict): Output of
+            :func:`skillmodels.likelihood_function.get_maximization_inputs` with
+            free_params=True.
+        n_starts (int): Number of start values. The first one is start_params.
+        perturbation_scale (float): Scale of the perturbations.
+        seed (int): Seed for the perturbations.
+
+    Returns:
+        list: List of parameter DataFrames.
+
+    """
+    rng = np.random.default_rng(seed)
+    bounds = maximization_inputs["free_params_template"]
+    lower = bounds["lower_bound"].to_numpy()
+    upper = bounds["upper_bound"].to_numpy()
+    x = maximization_inputs["free_params_from_params"](start_params)
+
+    has_lower, has_upper = np.isfinite(lower), np.isfinite(upper)
+    only_lower, only_upper = has_lower & ~has_upper, has_upper & ~has_lower
+    both = has_lower & has_upper
+
+    starts = [maximization_inputs["params_from_free_params"](x)]
+    for _ in range(n_starts - 1):
+        shocks = rng.normal(scale=perturbation_scale, size=len(x))
+        scaling = np.exp(shocks)
+        perturbed = x + shocks * np.maximum(np.abs(x), 1)
+        perturbed[only_lower] = lower[only_lower] + scaling[only_lower] * (
+            x[only_lower] - lower[only_lower]
+        )
+        perturbed[only_upper] = upper[only_upper] - scaling[only_upper] * (
+            upper[only_upper] - x[only_upper]
+        )
+        perturbed[both] = np.clip(perturbed[both], lower[both], upper[both])
+        starts.append(maximization_inputs["params_from_free_params"](perturbed))
+
+    return starts
+
+
+def _initialize_worker(model_dict, data, jacobian_type, compilation_cache_dir):
+    if compilation_cache_dir is not None:
+        initialize_compilation_cache(compilation_cache_dir)
+    _WORKER_INPUTS["model_dict"] = model_dict
+    _WORKER_INPUTS["data"] = data
+    _WORKER_INPUTS["maximization_inputs"] = get_maximization_inputs(
+        model_dict, data, jacobian_type=jacobian_type, free_params=True
+    )
+
+
+def _fit_in_worker(start_params, fit_kwargs):
+    return fit(
+        _WORKER_INPUTS["model_dict"],
+        _WORKER_INPUTS["data"],
+        start_params,
+        maximization_inputs=_WORKER_INPUTS["maximization_inputs"],
+        **fit_kwargs,
+    )
+
+
+def _get_sort_key(result):
+    value = result["value"]
+    return value if np.isfinite(value) else -np.inf
@@ -0,0 +1,345 @@
+"""Optimizers that can be interrupted and resumed.
+
+The optimizers maximize a function subject to bounds. All information that is
+needed to continue an optimization is kept in a state dictionary that only contains
+numpy arrays, lists and scalars. The state is passed to a callback after each
+iteration, which can for example save it to disk. Passing a saved state to the same
+optimizer resumes the optimization where it stopped.
+
+"""
+import numpy as np
+
+MAX_ITERATIONS_MESSAGE = "The maximum number of iterations was reached."
+
+
+def maximize_lbfgs(
+    loglike_and_gradient,
+    x,
+    lower_bounds,
+    upper_bounds,
+    state=None,
+    callback=None,
+    max_iterations=1000,
+    n_corrections=10,
+    convergence_gtol=1e-6,
+    convergence_ftol=1e-12,
+):
+    """Maximize a function with a projected limited memory BFGS algorithm.
+
+    Parameters at their bounds are excluded from the search direction if the
+    gradient points outside of the bounds. Steps are projected onto the bounds.
+
+    Args:
+        loglike_and_gradient (function): Function that maps a 1d numpy array to the
+            scalar function value and the gradient.
+        x (numpy.ndarray): 1d array with start parameters.
+        lower_bounds (numpy.ndarray): 1d array with lower bounds. Can be -np.inf.
+        upper_bounds (numpy.ndarray): 1d array with upper bounds. Can be np.inf.
+        state (dict): State of an interrupted optimization. If given, x is ignored.
+        callback (function): Function that is called with the state after each
+            iteration.
+        max_iterations (int): Maximum number of iterations.
+        n_corrections (int): Number of stored pairs of steps and gradient changes.
+        convergence_gtol (float): Stop if the largest absolute entry of the
+            projected gradient is smaller than this.
+        convergence_ftol (float): Stop if the relative change of the function value
+            is smaller than this.
+
+    Returns:
+        dict: The final state. See :func:`_get_initial_state`.
+
+    """
+    if state is None:
+        x = _project(np.asarray(x, dtype=float), lower_bounds, upper_bounds)
+        value, gradient = loglike_and_gradient(x)
+        state = _get_initial_state(x, value, gradient)
+        state["steps"], state["gradient_changes"] = [], []
+
+    _allow_more_iterations(state)
+    while state["message"] is None and state["iteration"] < max_iterations:
+        x, value, gradient = state["x"], state["value"], state["gradient"]
+        direction = _get_lbfgs_direction(
+            gradient, state["steps"], state["gradient_changes"]
+        )
+        direction = _exclude_active_bounds(direction, x, lower_bounds, upper_bounds)
+        if gradient @ direction <= 0:
+            state["steps"], state["gradient_changes"] = [], []
+            direction = _exclude_active_bounds(gradient, x, lower_bounds, upper_bounds)
+
+        if state["steps"]:
+            step_length = 1.0
+        else:
+            step_length = min(1.0, 1 / max(np.abs(direction).max(), 1e-12))
+
+        candidate, out, n_evaluations = _backtracking_line_search(
+            loglike_and_gradient,
+            x,
+            value,
+            gradient,
+            direction,
+            lower_bounds,
+            upper_bounds,
+            step_length,
+        )
+        state["n_evaluations"] += n_evaluations
+        if candidate is None:
+            state["message"] = "The line search did not find a better point."
+            break
+
+        new_value, new_gradient = out
+        step, gradient_change = candidate - x, gradient - new_gradient
+        if step @ gradient_change > 1e-10 * np.linalg.norm(step) ** 2:
+            state["steps"] = (state["steps"] + [step])[-n_corrections:]
+            state["gradient_changes"] = (state["gradient_changes"] + [gradient_change])[
+                -n_corrections:
+            ]
+
+        _update_state(
+            state,
+            candidate,
+            new_value,
+            new_gradient,
+            lower_bounds,
+            upper_bounds,
+            convergence_gtol,
+            convergence_ftol,
+        )
+        if callback is not None:
+            callback(state)
+
+    if state["message"] is None:
+        state["message"] = MAX_ITERATIONS_MESSAGE
+
+    return state
+
+
+def maximize_bhhh(
+    loglike,
+    jacobian,
+    x,
+    lower_bounds,
+    upper_bounds,
+    state=None,
+    callback=None,
+    max_iterations=200,
+    convergence_gtol=1e-6,
+    convergence_ftol=1e-12,
+):
+    """Maximize a log likelihood with the BHHH algorithm.
+
+    The Hessian is approximated by the outer product of the per-observation scores.
+    Parameters at their bounds are excluded from the search direction if the
+    gradient points outside of the bounds. Steps are projected onto the bounds.
+
+    Args:
+        loglike (function): Function that maps a 1d numpy array to the scalar log
+            likelihood.
+        jacobian (function): Function that maps a 1d numpy array to the 2d array of
+            shape (n_obs, n_params) with the derivatives of the log likelihood
+            contributions.
+        x (numpy.ndarray): 1d array with start parameters.
+        lower_bounds (numpy.ndarray): 1d array with lower bounds. Can be -np.inf.
+        upper_bounds (numpy.ndarray): 1d array with upper bounds. Can be np.inf.
+        state (dict): State of an interrupted optimization. If given, x is ignored.
+        callback (function): Function that is called with the state after each
+            iteration.
+        max_iterations (int): Maximum number of iterations.
+        convergence_gtol (float): Stop if the largest absolute entry of the
+            projected gradient is smaller than this.
+        convergence_ftol (float): Stop if the relative change of the function value
+            is smaller than this.
+
+    Returns:
+        dict: The final state. See :func:`_get_initial_state`.
+
+    """
+    if state is None:
+        x = _project(np.asarray(x, dtype=float), lower_bounds, upper_bounds)
+        scores = jacobian(x)
+        state = _get_initial_state(x, loglike(x), scores.sum(axis=0))
+        state["outer_product"] = scores.T @ scores
+
+    _allow_more_iterations(state)
+    while state["message"] is None and state["iteration"] < max_iterations:
+        x, value, gradient = state["x"], state["value"], state["gradient"]
+        direction = _get_bhhh_direction(
+            gradient, state["outer_product"], x, lower_bounds, upper_bounds
+        )
+
+        candidate, new_value, n_evaluations = _backtracking_line_search(
+            loglike,
+            x,
+            value,
+            gradient,
+            direction,
+            lower_bounds,
+            upper_bounds,
+            step_length=1.0,
+        )
+        state["n_evaluations"] += n_evaluations
+        if candidate is None:
+            state["message"] = "The line search did not find a better point."
+            break
+
+        scores = jacobian(candidate)
+        state["outer_product"] = scores.T @ scores
+
+        _update_state(
+            state,
+            candidate,
+            new_value,
+            scores.sum(axis=0),
+            lower_bounds,
+            upper_bounds,
+            convergence_gtol,
+            convergence_ftol,
+        )
+        if callback is not None:
+            callback(state)
+
+    if state["message"] is None:
+        state["message"] = MAX_ITERATIONS_MESSAGE
+
+    return state
+
+
+def _get_initial_state(x, value, gradient):
+    """Create the state of an optimization.
+
+    Returns:
+        dict: Dictionary with the entries "x", "value", "gradient", "iteration",
+        "n_evaluations", "converged", "message" and "history". The history is a list
+        with one dictionary per iteration. The algorithms add entries that are
+        specific to them.
+
+    """
+    state = {
+        "x": x,
+        "value": float(value),
+        "gradient": np.asarray(gradient),
+        "iteration": 0,
+        "n_evaluations": 1,
+        "converged": False,
+        "message": None,
+        "history": [{"iteration": 0, "value": float(value), "n_evaluations": 1}],
+    }
+    return state
+
+
+def _update_state(
+    state,
+    x,
+    value,
+    gradient,
+    lower_bounds,
+    upper_bounds,
+    convergence_gtol,
+    convergence_ftol,
+):
+    old_value = state["value"]
+    state["x"], state["value"], state["gradient"] = x, float(value), gradient
+    state["iteration"] += 1
+    state["history"].append(
+        {
+            "iteration": state["iteration"],
+            "value": state["value"],
+            "n_evaluations": state["n_evaluations"],
+        }
+    )
+
+    projected_gradient = _project(x + gradient, lower_bounds, upper_bounds) - x
+    if np.abs(projected_gradient).max(initial=0) < convergence_gtol:
+        state["converged"] = True
+        state["message"] = "The projected gradient is close to zero."
+    elif abs(value - old_value) <= convergence_ftol * max(abs(old_value), 1):
+        state["converged"] = True
+        state["message"] = "The relative change of the function value is tiny."
+
+
+def _allow_more_iterations(state):
+    """Continue optimizations that were stopped by the maximum number of iterations."""
+    if state["message"] == MAX_ITERATIONS_MESSAGE:
+        state["message"] = None
+
+
+def _get_lbfgs_direction(gradient, steps, gradient_changes):
+    """Two loop recursion for the product of the inverse Hessian and the gradient.
+
+    The gradient changes are stored with a flipped sign, such that the standard
+    formulas for minimization apply to the negative function.
+
+    """
+    direction = gradient.copy()
+    rhos = [1 / (s @ y) for s, y in zip(steps, gradient_changes)]
+    alphas = []
+    for s, y, rho in reversed(list(zip(steps, gradient_changes, rhos))):
+        alpha = rho * (s @ direction)
+        direction -= alpha * y
+        alphas.append(alpha)
+
+    if steps:
+        s, y = steps[-1], gradient_changes[-1]
+        direction *= (s @ y) / (y @ y)
+
+    for s, y, rho, alpha in zip(steps, gradient_changes, rhos, reversed(alphas)):
+        beta = rho * (y @ direction)
+        direction += (alpha - beta) * s
+
+    return direction
+
+
+def _get_bhhh_direction(gradient, outer_product, x, lower_bounds, upper_bounds):
+    is_active = ((x <= lower_bounds) & (gradient < 0)) | (
+        (x >= upper_bounds) & (gradient > 0)
+    )
+    free = ~is_active
+
+    direction = np.zeros_like(x)
+    sub_matrix = outer_product[np.ix_(free, free)]
+    try:
+        direction[free] = np.linalg.solve(sub_matrix, gradient[free])
+    except np.linalg.LinAlgError:
+        direction[free] = np.linalg.lstsq(sub_matrix, gradient[free], rcond=None)[0]
+    return direction
+
+
+def _backtracking_line_search(
+    func,
+    x,
+    value,
+    gradient,
+    direction,
+    lower_bounds,
+    upper_bounds,
+    step_length,
+    max_halvings=30,
+    sufficient_increase=1e-4,
+):
+    """Find a step that increases func sufficiently by halving the step length.
+
+    Returns:
+        numpy.ndarray: The accepted parameters or None if no step was accepted.
+        object: The output of func at the accepted parameters.
+        int: The number of function evaluations.
+
+    """
+    for n_evaluations in range(1, max_halvings + 1):
+        candidate = _project(x + step_length * direction, lower_bounds, upper_bounds)
+        out = func(candidate)
+        new_value = out[0] if isinstance(out, tuple) else out
+        required = value + sufficient_increase * gradient @ (candidate - x)
+        if np.isfinite(new_value) and new_value >= required:
+            return candidate, out, n_evaluations
+        step_length /= 2
+    return None, None, max_halvings
+
+
+def _exclude_active_bounds(direction, x, lower_bounds, upper_bounds):
+    """Set entries of direction to zero that would leave the bounds."""
+    leaves_lower = (x <= lower_bounds) & (direction < 0)
+    leaves_upper = (x >= upper_bounds) & (direction > 0)
+    return np.where(leaves_lower | leaves_upper, 0, direction)
+
+
+def _project(x, lower_bounds, upper_bounds):
+    return np.clip(x, lower_bounds, upper_bounds)
@@ -90,9 +90,12 @@ def _get_positional_selector_from_loc(range_sr, loc):
     return ilocs
 
 
-def parse_params(params, parsing_info, dimensions, labels, n_obs):
+def parse_params(params, parsing_info, dimensions, labels):
     """Parse params into the quantities that depend on it.
 
+    The initial states, cholesky factors and mixture weights are the same for all
+    individuals. They are returned with length 1 in the first dimension and only
+    broadcast to the number of individuals by the first Kalman update.
 
     Args:
         params (jax.numpy.array): 1d array with model parameters.
@@ -100,15 +103,14 @@ def parse_params(params, parsing_info, dimensions, labels, n_obs):
             have to be parsed.
         dimensions (dict): Dimensional information like n_states, n_periods, n_controls,
             n_mixtures. See :ref:`dimensions`.
-        n_obs (int): Number of observations.
 
     Returns:
-        jax.numpy.array: Array of shape (n_obs, n_mixtures, n_states) with initial
+        jax.numpy.array: Array of shape (1, n_mixtures, n_states) with initial
             state estimates.
-        jax.numpy.array: Array of shape (n_obs, n_mixtures, n_states, n_states) with the
+        jax.numpy.array: Array of shape (1, n_mixtures, n_states, n_states) with the
             transpose of the lower triangular cholesky factors of the initial covariance
             matrices.
-        jax.numpy.array: Array of shape (n_obs, n_mixtures) with the log of the initial
+        jax.numpy.array: Array of shape (1, n_mixtures) with the log of the initial
             weight for each element in the finite mixture of normals.
         dict: Dictionary with other parameters. It has the following key-value pairs:
             - "control_params":
@@ -120,9 +122,9 @@ def parse_params(params, parsing_info, dimensions, labels, n_obs):
             - "anchoring_constants":
 
     """
-    states = _get_initial_states(params, parsing_info, dimensions, n_obs)
-    upper_chols = _get_initial_upper_chols(params, parsing_info, dimensions, n_obs)
-    log_weights = _get_initial_log_mixture_weights(params, parsing_info, n_obs)
+    states = _get_initial_states(params, parsing_info, dimensions)
+    upper_chols = _get_initial_upper_chols(params, parsing_info, dimensions)
+    log_weights = _get_initial_log_mixture_weights(params, parsing_info)
     pardict = {
         "controls": _get_control_params(params, parsing_info, dimensions),
         "loadings": _get_loadings(params, parsing_info),
@@ -142,15 +144,15 @@ def parse_params(params, parsing_info, dimensions, labels, n_obs):
     return states, upper_chols, log_weights, pardict
 
 
-def _get_initial_states(params, info, dimensions, n_obs):
+def _get_initial_states(params, info, dimensions):
     """Create the array of initial states."""
-    state = params[info["initial_states"]].reshape(
+    states = params[info["initial_states"]].reshape(
         1, dimensions["n_mixtures"], dimensions["n_latent_factors"]
     )
-    return jnp.repeat(state, n_obs, axis=0)
+    return states
 
 
-def _get_initial_upper_chols(params, info, dimensions, n_obs):
+def _get_initial_upper_chols(params, info, dimensions):
     """Create the array with cholesky factors of the initial states covariance matrix.
 
     Note: The matrices contain the transpose of the lower triangular cholesky factors.
@@ -158,18 +160,18 @@ def _get_initial_upper_chols(params, info, dimensions, n_obs):
     """
     n_states, n_mixtures = dimensions["n_latent_factors"], dimensions["n_mixtures"]
     chol_params = params[info["initial_cholcovs"]].reshape(n_mixtures, -1)
-    upper_chols = jnp.zeros((n_obs, n_mixtures, n_states, n_states))
-    for i in range(n_mixtures):
-        filler = jnp.zeros((n_states, n_states))
-        filler = filler.at[jnp.tril_indices(n_states)].set(chol_params[i])
-        upper_chols = upper_chols.at[:, i].set(filler.T)
-    return upper_chols
+    rows, cols = jnp.tril_indices(n_states)
+    # swapping rows and cols fills the transpose of the lower triangular factors
+    upper_chols = (
+        jnp.zeros((n_mixtures, n_states, n_states)).at[:, cols, rows].set(chol_params)
+    )
+    return upper_chols.reshape(1, n_mixtures, n_states, n_states)
 
 
-def _get_initial_log_mixture_weights(params, info, n_obs):
+def _get_initial_log_mixture_weights(params, info):
     """Create the array with the log of initial mixture weights."""
     log_weights = jnp.log(params[info["mixture_weights"]]).reshape(1, -1)
-    return jnp.repeat(log_weights, n_obs, axis=0)
+    return log_weights
 
 
 def _get_control_params(params, info, dimensions):
@@ -203,7 +205,9 @@ def _get_transition_params(params, info, labels):
     n_periods = len(labels["periods"])
     for factor in labels["latent_factors"]:
         ilocs = t_info[factor]
-        trans_params[factor] = params[ilocs].reshape(n_periods - 1, -1)
+        trans_params[factor] = params[ilocs].reshape(
+            n_periods - 1, len(ilocs) // max(n_periods - 1, 1)
+        )
     return trans_params
 
 
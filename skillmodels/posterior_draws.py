@@ -0,0 +1,160 @@
+"""Draws from the posterior distribution of the latent factors of each individual."""
+import functools
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pandas as pd
+
+from skillmodels.process_model import process_model
+from skillmodels.smoothed_states import get_posterior_distributions
+from skillmodels.utilities import anchor_states
+from skillmodels.utilities import get_padded_chunk
+
+
+def draw_posterior_states(
+    model_dict,
+    data,
+    params,
+    n_draws=10,
+    smoothed=False,
+    seed=0,
+    chunk_size=10_000,
+):
+    """Draw latent factors from their posterior distribution, e.g. for imputations.
+
+    See :func:`draw_posterior_states_chunks` for details.
+
+    Returns:
+        dict: Dictionary with the DataFrames "anchored_states" and
+            "unanchored_states". They have the factor names, "period", "id" and
+            "draw" as columns.
+
+    """
+    chunks = list(
+        draw_posterior_states_chunks(
+            model_dict,
+            data,
+            params,
+            n_draws=n_draws,
+            smoothed=smoothed,
+            seed=seed,
+            chunk_size=chunk_size,
+        )
+    )
+    out = {
+        key: pd.concat([chunk[key] for chunk in chunks], ignore_index=True)
+        for key in ["anchored_states", "unanchored_states"]
+    }
+    return out
+
+
+def draw_posterior_states_chunks(
+    model_dict,
+    data,
+    params,
+    n_draws=10,
+    smoothed=False,
+    seed=0,
+    chunk_size=10_000,
+):
+    """Draw latent factors from their posterior distribution in chunks of individuals.
+
+    The posterior distribution of an individual in a period is the mixture of normals
+    after the last Kalman update of that period (filtered) or its smoothed version
+    (see :func:`skillmodels.smoothed_states.get_smoothed_states`). The draws of
+    different periods are independent draws from these marginal distributions.
+
+    All draws of a chunk are generated by one jitted function that is compiled once.
+    The last chunk is padded to chunk_size individuals for this. Each chunk has its
+    own random stream, which is derived from seed and the position of the chunk. The
+    memory usage of the draws only depends on chunk_size and n_draws.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        params (pandas.DataFrame): DataFrame with model parameters.
+        n_draws (int): Number of draws per individual and period.
+        smoothed (bool): Whether the draws are from the smoothed or filtered
+            distributions.
+        seed (int): Seed for the jax.random keys of all chunks.
+        chunk_size (int): Number of individuals per chunk.
+
+    Yields:
+        dict: Dictionary with the DataFrames "anchored_states" and
+            "unanchored_states" of one chunk. See :func:`draw_posterior_states`. The
+            ids continue across chunks.
+
+    """
+    distributions = get_posterior_distributions(
+        model_dict, data, params, smoothed=smoothed, chunk_size=chunk_size
+    )
+    factors = process_model(model_dict)["labels"]["latent_factors"]
+    n_obs = distributions["states"].shape[1]
+    chunk_size = min(chunk_size, n_obs)
+
+    draw = jax.jit(functools.partial(_draw_states, n_draws=n_draws))
+    base_key = jax.random.PRNGKey(seed)
+
+    for chunk, start in enumerate(range(0, n_obs, chunk_size)):
+        draws = draw(
+            jax.random.fold_in(base_key, chunk),
+            *[
+                get_padded_chunk(distributions[key], start, chunk_size)
+                for key in ["states", "upper_chols", "log_mixture_weights"]
+            ],
+        )
+        draws = np.array(draws)[:, :, : min(chunk_size, n_obs - start)]
+        anchored = anchor_states(draws, distributions["pardict"])
+        yield {
+            "anchored_states": _draws_to_df(anchored, factors, first_id=start),
+            "unanchored_states": _draws_to_df(draws, factors, first_id=start),
+        }
+
+
+def _draw_states(key, states, upper_chols, log_weights, n_draws):
+    """Draw from mixtures of normals.
+
+    Args:
+        key (jax.random.PRNGKey): Key for all random draws.
+        states (jax.numpy.array): Array of shape (n_periods, n_obs, n_mixtures,
+            n_states) with the means of the mixture elements.
+        upper_chols (jax.numpy.array): Array of shape (n_periods, n_obs, n_mixtures,
+            n_states, n_states) with the upper cholesky factors of the covariances of
+            the mixture elements.
+        log_weights (jax.numpy.array): Array of shape (n_periods, n_obs, n_mixtures).
+        n_draws (int): Number of draws per period and individual.
+
+    Returns:
+        jax.numpy.array: Array of shape (n_draws, n_periods, n_obs, n_states).
+
+    """
+    component_key, draw_key = jax.random.split(key)
+    n_periods, n_obs, _, n_states = states.shape
+    components = jax.random.categorical(
+        component_key, log_weights, shape=(n_draws, n_periods, n_obs)
+    )
+    means = jnp.take_along_axis(states[None], components[..., None, None], axis=3)
+    chols = jnp.take_along_axis(
+        upper_chols[None], components[..., None, None, None], axis=3
+    )
+    errors = jax.random.normal(draw_key, (n_draws, n_periods, n_obs, n_states))
+    return means[..., 0, :] + jnp.einsum(
+        "dpoi,dpoij->dpoj", errors, chols[..., 0, :, :]
+    )
+
+
+def _draws_to_df(draws, factors, first_id=0):
+    """Convert an array of shape (n_draws, n_periods, n_obs, n_states) to a DataFrame.
+
+    The DataFrame has the factor names, "period", "id" and "draw" as columns.
+
+    """
+    n_draws, n_periods, n_obs, n_states = draws.shape
+    df = pd.DataFrame(
+        np.transpose(draws, (2, 1, 0, 3)).reshape(-1, n_states), columns=factors
+    )
+    df["period"] = np.tile(np.repeat(np.arange(n_periods), n_draws), n_obs)
+    df["id"] = np.repeat(np.arange(first_id, first_id + n_obs), n_periods * n_draws)
+    df["draw"] = np.tile(np.arange(n_draws), n_obs * n_periods)
+    return df
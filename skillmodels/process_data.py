@@ -19,6 +19,10 @@ def process_data(df, labels, update_info, anchoring_info, purpose="estimation"):
         update_info (pandas.DataFrame): DataFrame with one row per Kalman update needed
             in the likelihood function. See :ref:`update_info`.
         anchoring_info (dict): Information about anchoring. See :ref:`anchoring`
+        purpose (str): "estimation", "scoring" or "simulation". For "scoring", the
+            measurements are processed as for "estimation" but they are allowed to
+            have no variance, e.g. because there is only one individual. For
+            "simulation", no measurements are processed.
 
     Returns:
         meas_data (jax.numpy.array): Array of shape (n_updates, n_obs) with data on
@@ -31,16 +35,16 @@ def process_data(df, labels, update_info, anchoring_info, purpose="estimation"):
     """
     df = pre_process_data(df, labels["periods"])
     df["constant"] = 1
-    df = _add_copies_of_anchoring_outcome(df, anchoring_info)
+    df = add_copies_of_anchoring_outcome(df, anchoring_info)
     _check_data(df, update_info, labels, purpose=purpose)
     n_obs = int(len(df) / len(labels["periods"]))
     df = _handle_controls_with_missings(df, labels["controls"], update_info)
-    if purpose == "estimation":
+    if purpose in ["estimation", "scoring"]:
         meas_data = _generate_measurements_array(df, update_info, n_obs)
     control_data = _generate_controls_array(df, labels, n_obs)
     observed_data = _generate_observed_factor_array(df, labels, n_obs)
 
-    if purpose == "estimation":
+    if purpose in ["estimation", "scoring"]:
         out = (meas_data, control_data, observed_data)
     else:
         out = (control_data, observed_data)
@@ -79,7 +83,13 @@ def pre_process_data(df, periods):
     return df
 
 
-def _add_copies_of_anchoring_outcome(df, anchoring_info):
+def add_copies_of_anchoring_outcome(df, anchoring_info):
+    """Add a copy of the anchoring outcome for each anchored factor.
+
+    The copy of the outcome of factor is called "{outcome}_{factor}", which is the
+    name of the anchoring measurement in update_info.
+
+    """
     df = df.copy()
     for factor in anchoring_info["factors"]:
         outcome = anchoring_info["outcomes"][factor]
@@ -95,11 +105,14 @@ def _check_data(df, update_info, labels, purpose):
             if cont not in period_data.columns or period_data[cont].isnull().all():
                 var_report.loc[(period, cont), "problem"] = "Variable is missing"
 
-        if purpose == "estimation":
+        if purpose in ["estimation", "scoring"]:
             for meas in get_period_measurements(update_info, period):
                 if meas not in period_data.columns:
                     var_report.loc[(period, meas), "problem"] = "Variable is missing"
-                elif len(period_data[meas].dropna().unique()) == 1:
+                elif (
+                    purpose == "estimation"
+                    and len(period_data[meas].dropna().unique()) == 1
+                ):
                     var_report.loc[
                         (period, meas), "problem"
                     ] = "Variable has no variance"
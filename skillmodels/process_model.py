@@ -1,5 +1,7 @@
+import inspect
 from functools import partial
 
+import jax.numpy as jnp
 import numpy as np
 import pandas as pd
 from dags import concatenate_functions
@@ -128,6 +130,7 @@ def _process_estimation_options(model_dict):
         "clipping_upper_bound": None,
         "clipping_lower_hardness": 1,
         "clipping_upper_hardness": 1,
+        "memory_layout": "aos",
     }
     default_options.update(model_dict.get("estimation_options", {}))
 
@@ -209,13 +212,36 @@ def _get_transition_info(model_dict, labels):
     for i, factor in enumerate(labels["all_factors"]):
         functions[factor] = partial(_extract_factor, pos=i)
 
-    transition_function = concatenate_functions(
-        functions=functions, targets=[f"__next_{fac}__" for fac in latent_factors]
+    specs = {
+        factor: model_dict["factors"][factor]["transition_function"]
+        for factor in latent_factors
+    }
+    transition_function = _combine_transition_functions(
+        specs, functions, latent_factors, all_factors
     )
 
-    transition_function = jax_array_output(transition_function)
-
-    transition_function = vmap(transition_function, in_axes=(None, 0))
+    # constant factors are carried through the predict step analytically, such that
+    # only the dynamic factors have to be evaluated at sigma points that only spread
+    # in the directions of the factors their transition functions use.
+    constant_factors = [
+        i for i, factor in enumerate(latent_factors) if specs[factor] == "constant"
+    ]
+    dynamic_factors = [
+        i for i in range(len(latent_factors)) if i not in constant_factors
+    ]
+    if constant_factors and dynamic_factors:
+        dynamic_function = _combine_transition_functions(
+            specs,
+            functions,
+            [latent_factors[i] for i in dynamic_factors],
+            all_factors,
+        )
+        dynamic_inputs = _get_transition_inputs(
+            specs, [latent_factors[i] for i in dynamic_factors], latent_factors
+        )
+    else:
+        dynamic_function = None
+        dynamic_inputs = None
 
     individual_functions = {}
     for factor in latent_factors:
@@ -225,6 +251,9 @@ def _get_transition_info(model_dict, labels):
 
     out = {
         "func": transition_function,
+        "dynamic_func": dynamic_function,
+        "constant_factors": constant_factors,
+        "dynamic_inputs": dynamic_inputs,
         "param_names": dict(zip(latent_factors, param_names)),
         "individual_functions": individual_functions,
         "function_names": dict(zip(latent_factors, function_names)),
@@ -232,6 +261,140 @@ def _get_transition_info(model_dict, labels):
     return out
 
 
+def _get_transition_inputs(specs, factors, latent_factors):
+    """Get the positions of the latent factors that the transition functions use.
+
+    Built-in transition functions and custom transition functions with the argument
+    "states" use all latent factors. Other custom transition functions only use the
+    factors that are among their arguments.
+
+    Args:
+        specs (dict): Transition function specification of each latent factor.
+        factors (list): Names of the factors whose transition functions are checked.
+        latent_factors (list): Names of the latent factors.
+
+    Returns:
+        list: Sorted positions of the used latent factors.
+
+    """
+    used = set()
+    for factor in factors:
+        spec = specs[factor]
+        arguments = [] if isinstance(spec, str) else inspect.signature(spec).parameters
+        if isinstance(spec, str) or "states" in arguments:
+            used.update(latent_factors)
+        else:
+            used.update(fac for fac in latent_factors if fac in arguments)
+    return [i for i, factor in enumerate(latent_factors) if factor in used]
+
+
+def _combine_transition_functions(specs, functions, factors, all_factors):
+    """Combine the transition functions of several factors.
+
+    If all factors have built-in transition functions, their matrix versions are used.
+    Otherwise, the transition functions are combined with dags and vmapped.
+
+    Args:
+        specs (dict): Transition function specification of each latent factor.
+        functions (dict): Dict with transition functions and functions that extract
+            individual factors from the 1d states vector.
+        factors (list): Names of the factors whose transition functions are combined.
+        all_factors (list): Names of all latent and observed factors.
+
+    Returns:
+        function: See :func:`_get_vmapped_transition_function`.
+
+    """
+    if all(isinstance(specs[factor], str) for factor in factors):
+        func = _get_matrix_transition_function(specs, factors, all_factors)
+    else:
+        func = _get_vmapped_transition_function(
+            functions, targets=[f"__next_{factor}__" for factor in factors]
+        )
+    return func
+
+
+def _get_matrix_transition_function(specs, factors, all_factors):
+    """Combine built-in transition functions via their matrix versions.
+
+    Factors with the same transition function are evaluated together on the array of
+    latent states. Their params are stacked into a matrix once per call instead of
+    being processed separately for each sigma point. The part that only depends on
+    the observed factors is calculated once per individual and added to all sigma
+    points.
+
+    Args:
+        specs (dict): Name of the built-in transition function of each latent factor.
+        factors (list): Names of the factors whose transition functions are combined.
+        all_factors (list): Names of all latent and observed factors.
+
+    Returns:
+        function: See :func:`_get_vmapped_transition_function`.
+
+    """
+    groups = {}
+    for factor in factors:
+        groups.setdefault(specs[factor], []).append(factor)
+
+    grouped_factors = [factor for group in groups.values() for factor in group]
+    order = np.array([grouped_factors.index(factor) for factor in factors])
+    needs_reordering = grouped_factors != factors
+
+    constant_positions = np.array(
+        [all_factors.index(factor) for factor in groups.get("constant", [])]
+    )
+
+    def transition_function(params, states, observed_factors):
+        outputs = []
+        for name, group in groups.items():
+            if name == "constant":
+                outputs.append(states[..., constant_positions])
+            else:
+                coeffs = jnp.stack([params[factor] for factor in group], axis=-1)
+                matrix_func = getattr(tf, f"matrix_{name}")
+                outputs.append(matrix_func(states, coeffs, observed_factors))
+
+        out = jnp.concatenate(outputs, axis=-1)
+        if needs_reordering:
+            out = out[..., order]
+        return out
+
+    return transition_function
+
+
+def _get_vmapped_transition_function(functions, targets):
+    """Combine transition functions and vectorize them over sigma points.
+
+    Args:
+        functions (dict): Dict with transition functions and functions that extract
+            individual factors from the 1d states vector.
+        targets (list): Names of the functions whose outputs are returned.
+
+    Returns:
+        function: Function with arguments params, states and observed_factors. states
+        is an array of shape (n_obs, n_points, n_latent_factors), observed_factors is
+        an array of shape (n_obs, n_observed_factors). The result has shape
+        (n_obs, n_points, len(targets)).
+
+    """
+    all_factors_function = jax_array_output(
+        concatenate_functions(functions=functions, targets=targets)
+    )
+
+    def transition_function(params, states, observed_factors):
+        # observed factors are constant across sigma points. They are only appended
+        # here, such that the vmap below broadcasts them inside the function instead
+        # of materializing a copy for each sigma point.
+        all_states = jnp.concatenate([states, observed_factors])
+        return all_factors_function(params=params, states=all_states)
+
+    # map over sigma points (and mixtures) and then over individuals
+    transition_function = vmap(
+        vmap(transition_function, in_axes=(None, 0, None)), in_axes=(None, 0, 0)
+    )
+    return transition_function
+
+
 def _get_update_info(model_dict, dimensions, labels, anchoring_info):
     """Construct a DataFrame with information on each Kalman update.
 
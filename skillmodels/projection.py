@@ -0,0 +1,201 @@
+"""Project the distribution of the latent factors into future periods."""
+import functools
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax import lax
+
+from skillmodels.kalman_filters import array_qr_jax
+from skillmodels.kalman_filters import calculate_sigma_scaling_factor_and_weights
+from skillmodels.kalman_filters import kalman_predict
+from skillmodels.process_data import process_data
+from skillmodels.process_model import process_model
+from skillmodels.simulate_data import get_policy_arrays
+from skillmodels.smoothed_states import aggregate_mixtures
+from skillmodels.smoothed_states import get_posterior_distributions
+from skillmodels.smoothed_states import get_states_outputs
+
+
+def project_states(
+    model_dict, data, params, start_period, n_periods=None, policies=None
+):
+    """Project the filtered states of start_period into later periods.
+
+    The projection starts from the filtered distribution of each individual after the
+    last Kalman update of start_period, i.e. it only uses the measurements up to
+    start_period. It then runs the unscented predict step of
+    :func:`skillmodels.kalman_filters.kalman_predict` without any updates for all
+    individuals and periods in one compiled lax.scan.
+
+    The projection can go beyond the last period of the model. The transitions after
+    the last period reuse the transition parameters and shock standard deviations of
+    the last transition of the model. The anchoring parameters and observed factors
+    of these periods are those of the last period.
+
+    Policies shift the mean and increase the variance of the states at the end of
+    their period, before the transition to the next period. Their effect on the
+    projected distribution is deterministic, i.e. no policy shocks are drawn.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format. The observed factors of the
+            projected periods are taken from it.
+        params (pandas.DataFrame): DataFrame with model parameters.
+        start_period (int): The period whose filtered states are projected.
+        n_periods (int): Number of projected periods. Default is the number of
+            periods of the model after start_period. Larger values project beyond
+            the last period of the model.
+        policies (list): See :func:`skillmodels.simulate_data.simulate_dataset`.
+
+    Returns:
+        dict: Dictionary with the entries "anchored_states" and "unanchored_states"
+            in the format of :func:`skillmodels.smoothed_states.get_smoothed_states`.
+            They contain the means and covariances of start_period and the projected
+            periods.
+
+    """
+    model = process_model(model_dict)
+    labels = model["labels"]
+    last_period = labels["periods"][-1]
+    if n_periods is None:
+        n_periods = last_period - start_period
+    if not 0 <= start_period <= last_period:
+        raise ValueError(
+            "start_period has to be a period of the model, i.e. between 0 and "
+            f"{last_period}."
+        )
+    if n_periods < 0:
+        raise ValueError("n_periods must not be negative.")
+    if n_periods > 0 and last_period == 0:
+        raise ValueError("A model with only one period has no transition to project.")
+
+    distributions = get_posterior_distributions(model_dict, data, params)
+    pardict = distributions["pardict"]
+    _, observed_factors = process_data(
+        data, labels, model["update_info"], model["anchoring"], purpose="simulation"
+    )
+    end_period = start_period + n_periods
+    policy_means, policy_sds = get_policy_arrays(
+        policies, labels["latent_factors"], end_period + 1
+    )
+
+    # periods and transitions after the end of the model reuse the last ones
+    model_periods = np.minimum(np.arange(end_period + 1), last_period)
+    model_transitions = np.minimum(model_periods, last_period - 1)
+    pardict = {
+        **pardict,
+        "anchoring_scaling_factors": pardict["anchoring_scaling_factors"][
+            model_periods
+        ],
+        "anchoring_constants": pardict["anchoring_constants"][model_periods],
+    }
+
+    transitions = slice(start_period, end_period)
+    anchoring_scaling_factors = pardict["anchoring_scaling_factors"]
+    anchoring_constants = pardict["anchoring_constants"]
+    loop_args = {
+        "trans_coeffs": jax.tree_util.tree_map(
+            lambda arr: arr[model_transitions[transitions]], pardict["transition"]
+        ),
+        "shock_sds": pardict["shock_sds"][model_transitions[transitions]],
+        "anchoring_scaling_factors": jnp.stack(
+            [anchoring_scaling_factors[:-1], anchoring_scaling_factors[1:]], axis=1
+        )[transitions],
+        "anchoring_constants": jnp.stack(
+            [anchoring_constants[:-1], anchoring_constants[1:]], axis=1
+        )[transitions],
+        "observed_factors": jnp.asarray(observed_factors, dtype=float)[
+            model_periods[transitions]
+        ],
+        "policy_means": policy_means[transitions],
+        "policy_sds": policy_sds[transitions],
+    }
+
+    sigma_scaling_factor, sigma_weights = calculate_sigma_scaling_factor_and_weights(
+        model["dimensions"]["n_latent_factors"],
+        model["estimation_options"]["sigma_points_scale"],
+    )
+    project = jax.jit(
+        functools.partial(
+            _project,
+            sigma_scaling_factor=sigma_scaling_factor,
+            sigma_weights=sigma_weights,
+            transition_info=model["transition_info"],
+        )
+    )
+    states, upper_chols = project(
+        distributions["states"][start_period],
+        distributions["upper_chols"][start_period],
+        loop_args,
+    )
+
+    log_weights = distributions["log_mixture_weights"][start_period]
+    means, covs = aggregate_mixtures(
+        np.array(states),
+        np.array(upper_chols),
+        np.exp(np.broadcast_to(log_weights, (n_periods + 1, *log_weights.shape))),
+    )
+
+    periods = range(start_period, end_period + 1)
+    return get_states_outputs(means, covs, pardict, labels["latent_factors"], periods)
+
+
+def _project(
+    states,
+    upper_chols,
+    loop_args,
+    sigma_scaling_factor,
+    sigma_weights,
+    transition_info,
+):
+    """Run the predict step of the Kalman filter over several periods.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states) with
+            the states in the first period.
+        upper_chols (jax.numpy.array): Array of shape (n_obs, n_mixtures, n_states,
+            n_states) with the upper cholesky factors of the covariances in the first
+            period.
+        loop_args (dict): The arguments of :func:`kalman_predict` that change between
+            periods as well as "policy_means" and "policy_sds", each with the
+            transitions as first axis.
+
+        See :func:`skillmodels.kalman_filters.kalman_predict` for the other arguments.
+
+    Returns:
+        jax.numpy.array: The states of the first and all projected periods, i.e. an
+            array of shape (n_transitions + 1, n_obs, n_mixtures, n_states).
+        jax.numpy.array: The corresponding upper cholesky factors.
+
+    """
+
+    def _body(carry, loop_args):
+        states, upper_chols = carry
+        # policies affect the states at the end of the period
+        states = states + loop_args["policy_means"]
+        policy_chols = jnp.broadcast_to(
+            jnp.diag(loop_args["policy_sds"]), upper_chols.shape
+        )
+        stacked = jnp.concatenate([upper_chols, policy_chols], axis=-2)
+        upper_chols = array_qr_jax(stacked)[1]
+        new_carry = kalman_predict(
+            states,
+            upper_chols,
+            sigma_scaling_factor=sigma_scaling_factor,
+            sigma_weights=sigma_weights,
+            transition_info=transition_info,
+            trans_coeffs=loop_args["trans_coeffs"],
+            shock_sds=loop_args["shock_sds"],
+            anchoring_scaling_factors=loop_args["anchoring_scaling_factors"],
+            anchoring_constants=loop_args["anchoring_constants"],
+            observed_factors=loop_args["observed_factors"],
+        )
+        return new_carry, new_carry
+
+    _, (projected_states, projected_chols) = lax.scan(
+        _body, (states, upper_chols), loop_args
+    )
+    states = jnp.concatenate([states[None], projected_states])
+    upper_chols = jnp.concatenate([upper_chols[None], projected_chols])
+    return states, upper_chols
@@ -0,0 +1,145 @@
+"""Score new individuals with the parameters of an estimated model."""
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pandas as pd
+
+from skillmodels.likelihood_function import get_base_loglike
+from skillmodels.likelihood_function import get_jnp_params_vec
+from skillmodels.params_index import get_params_index
+from skillmodels.parse_params import create_parsing_info
+from skillmodels.parse_params import parse_params
+from skillmodels.process_data import process_data
+from skillmodels.process_model import process_model
+from skillmodels.utilities import get_padded_chunk
+
+
+def get_scorer(model_dict, params, batch_size=1_000):
+    """Create a function that calculates factor scores and log likelihoods.
+
+    The model is processed and the Kalman filter is compiled for batches of exactly
+    batch_size individuals when the scorer is created. Scoring a dataset only
+    processes the data, splits it into batches and pads the last batch. Datasets of
+    any size are scored without compiling anything again.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        params (pandas.DataFrame): DataFrame with model parameters.
+        batch_size (int): Number of individuals that are filtered at the same time.
+
+    Returns:
+        function: A function that takes a dataset in long format as for estimation
+            or a dictionary with the arrays "measurements", "controls" and
+            "observed_factors" in the format of
+            :func:`skillmodels.process_data.process_data`. It returns a dictionary
+            with the entries:
+            - "loglikes" (pandas.Series): The log likelihood contribution of each
+              individual.
+            - "anchored_states" and "unanchored_states" (pandas.DataFrame): The
+              filtered states in the format of
+              :func:`skillmodels.filtered_states.get_filtered_states`.
+            The "id" of an individual is its id in the dataset or its position in
+            the arrays.
+
+    """
+    model = process_model(model_dict)
+    labels = model["labels"]
+    update_info = model["update_info"]
+    params_index = get_params_index(
+        update_info, labels, model["dimensions"], model["transition_info"]
+    )
+    parsing_info = create_parsing_info(
+        params_index, update_info, labels, model["anchoring"]
+    )
+    params_vec = get_jnp_params_vec(params.loc[params_index], params_index)
+
+    base_loglike = get_base_loglike(model, parsing_info)
+    keep = _get_last_measurement_updates(update_info)
+
+    def _score_batch(params_vec, measurements, controls, observed_factors):
+        _, additional_data = base_loglike(
+            params_vec,
+            measurements=measurements,
+            controls=controls,
+            observed_factors=observed_factors,
+            attrition_info={"inverse_order": jnp.arange(batch_size)},
+            debug=True,
+        )
+        weights = jnp.exp(additional_data["log_mixture_weights"][keep])
+        states = (additional_data["filtered_states"][keep] * weights[..., None]).sum(
+            axis=-2
+        )
+        return additional_data["contributions"], states
+
+    n_updates = len(update_info)
+    n_periods = model["dimensions"]["n_periods"]
+    batch_shapes = [
+        (n_updates, batch_size),
+        (n_periods, batch_size, len(labels["controls"])),
+        (n_periods, batch_size, len(labels["observed_factors"])),
+    ]
+    batch_structs = [jax.ShapeDtypeStruct(shape, float) for shape in batch_shapes]
+    score_batch = jax.jit(_score_batch).lower(params_vec, *batch_structs).compile()
+
+    *_, pardict = parse_params(params_vec, parsing_info, model["dimensions"], labels)
+    n_latent = model["dimensions"]["n_latent_factors"]
+    scaling_factors = np.array(pardict["anchoring_scaling_factors"][:, :n_latent])
+    constants = np.array(pardict["anchoring_constants"][:, :n_latent])
+
+    def score(data):
+        if isinstance(data, pd.DataFrame):
+            arrays = process_data(
+                data, labels, update_info, model["anchoring"], purpose="scoring"
+            )
+            ids = np.array(sorted(data.index.get_level_values(0).unique()))
+        else:
+            arrays = [
+                data[key] for key in ["measurements", "controls", "observed_factors"]
+            ]
+            ids = np.arange(np.shape(arrays[0])[1])
+
+        n_obs = len(ids)
+        loglikes, states = [], []
+        for start in range(0, n_obs, batch_size):
+            batch_loglikes, batch_states = score_batch(
+                params_vec,
+                *[
+                    get_padded_chunk(np.asarray(arr, dtype=float), start, batch_size)
+                    for arr in arrays
+                ],
+            )
+            stop = min(batch_size, n_obs - start)
+            loglikes.append(np.array(batch_loglikes)[:stop])
+            states.append(np.array(batch_states)[:, :stop])
+
+        states = np.concatenate(states, axis=1)
+        anchored = states * scaling_factors[:, None] + constants[:, None]
+
+        out = {
+            "loglikes": pd.Series(
+                np.concatenate(loglikes), index=pd.Index(ids, name="id"), name="loglike"
+            ),
+            "anchored_states": _states_to_df(anchored, labels["latent_factors"], ids),
+            "unanchored_states": _states_to_df(states, labels["latent_factors"], ids),
+        }
+        return out
+
+    return score
+
+
+def _get_last_measurement_updates(update_info):
+    """Positions of the last Kalman update with a measurement in each period."""
+    is_measurement = (update_info["purpose"] == "measurement").to_numpy()
+    periods = update_info.index.get_level_values("period").to_numpy()
+    positions = np.arange(len(update_info))[is_measurement]
+    periods = periods[is_measurement]
+    return np.array([positions[periods == p][-1] for p in np.unique(periods)])
+
+
+def _states_to_df(states, factors, ids):
+    """Convert an array of shape (n_periods, n_obs, n_states) to long format."""
+    n_periods, n_obs, n_states = states.shape
+    df = pd.DataFrame(states.reshape(-1, n_states), columns=factors)
+    df["period"] = np.repeat(np.arange(n_periods), n_obs)
+    df["id"] = np.tile(ids, n_periods)
+    return df
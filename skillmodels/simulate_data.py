@@ -1,26 +1,37 @@
 """Functions to simulate a dataset generated by a latent factor model."""
+import functools
 import warnings
+from pathlib import Path
 
+import jax
 import jax.numpy as jnp
 import numpy as np
 import pandas as pd
-from numpy.random import choice
-from numpy.random import multivariate_normal
 
-from skillmodels.filtered_states import anchor_states_df
-from skillmodels.kalman_filters import transform_sigma_points
 from skillmodels.params_index import get_params_index
 from skillmodels.parse_params import create_parsing_info
 from skillmodels.parse_params import parse_params
 from skillmodels.process_data import process_data
-from skillmodels.process_debug_data import create_state_ranges
 from skillmodels.process_model import process_model
-
-
-def simulate_dataset(model_dict, params, n_obs=None, data=None, policies=None):
+from skillmodels.utilities import anchor_states
+from skillmodels.utilities import get_padded_chunk
+
+
+def simulate_dataset(
+    model_dict,
+    params,
+    n_obs=None,
+    data=None,
+    policies=None,
+    seed=None,
+    output_format="dataframe",
+):
 
     """Simulate datasets generated by a latent factor model.
 
+    The states and measurements of all periods are simulated in one compiled function
+    with explicit jax.random keys. Only the final result is converted to DataFrames.
+
     Args:
         model_dict (dict): The model specification. See: :ref:`model_specs`
         params (pandas.DataFrame): DataFrame with model parameters.
@@ -30,12 +41,400 @@ def simulate_dataset(model_dict, params, n_obs=None, data=None, policies=None):
         policies (list): list of dictionaries. Each dictionary specifies a
             a stochastic shock to a latent factor AT THE END of "period" for "factor"
             with mean "effect_size" and "standard deviation"
+        seed (int): Seed for the jax.random key. Simulations with the same seed are
+            identical. If None, the seed is drawn from the global numpy random state,
+            such that simulations are reproducible with np.random.seed.
+        output_format (str): "dataframe" or "arrays". See below.
+
+    Returns:
+        dict: If output_format is "dataframe", a dictionary with the entries:
+            - "measurements" (pandas.DataFrame): Simulated measurements in long
+              format.
+            - "unanchored_states" and "anchored_states" (dict): Dictionaries with the
+              entries "states" (pandas.DataFrame with the latent factors in long
+              format) and "state_ranges" (dict that maps the latent factors to
+              DataFrames with the minimum and maximum of the factor in each period).
+
+            If output_format is "arrays", a dictionary with the labelled arrays
+            "measurements", "unanchored_states" and "anchored_states". A labelled
+            array is a dictionary with the entries "values" (numpy.ndarray of shape
+            (n_periods, n_obs, n_variables)) and "variables" (list with the names of
+            the variables). Measurements that do not exist in a period are NaN. The
+            long DataFrames can be created with :func:`labelled_array_to_df`.
+
+    """
+    if output_format not in ["dataframe", "arrays"]:
+        raise ValueError("output_format has to be 'dataframe' or 'arrays'.")
+
+    inputs = _get_simulation_inputs(model_dict, params, n_obs, data)
+    model = inputs["model"]
+
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+
+    simulated = _simulate_dataset(
+        key=jax.random.PRNGKey(seed),
+        latent_states=inputs["states"],
+        covs=inputs["covs"],
+        log_weights=inputs["log_weights"],
+        pardict=inputs["pardict"],
+        labels=model["labels"],
+        dimensions=model["dimensions"],
+        update_info=model["update_info"],
+        control_data=inputs["control_data"],
+        observed_factor_data=inputs["observed_data"],
+        policies=policies,
+        transition_info=model["transition_info"],
+    )
+
+    if output_format == "arrays":
+        return simulated
+
+    out = {"measurements": labelled_array_to_df(simulated["measurements"])}
+    for name in ["unanchored_states", "anchored_states"]:
+        out[name] = {
+            "states": labelled_array_to_df(simulated[name]),
+            "state_ranges": _get_state_ranges(simulated[name]),
+        }
+
+    return out
+
+
+def labelled_array_to_df(labelled_array, first_id=0):
+    """Convert a labelled array with simulated data to a DataFrame in long format.
+
+    Args:
+        labelled_array (dict): Dictionary with the entries "values" (numpy.ndarray of
+            shape (n_periods, n_obs, n_variables)) and "variables" (list). See
+            :func:`simulate_dataset`.
+        first_id (int): id of the first individual.
+
+    Returns:
+        pandas.DataFrame: One row per individual and period, sorted by "id" and
+            "period", with one column per variable and the columns "period" and "id".
+            The index is the id.
+
+    """
+    values = np.swapaxes(labelled_array["values"], 0, 1)
+    return _to_long_df(values, labelled_array["variables"], first_id)
+
+
+def simulate_dataset_chunks(
+    model_dict,
+    params,
+    n_obs=None,
+    data=None,
+    policies=None,
+    seed=0,
+    chunk_size=100_000,
+):
+    """Simulate a dataset in chunks of individuals.
+
+    Each chunk is simulated with its own random stream, which is derived from seed and
+    the position of the chunk. The memory usage only depends on chunk_size and not on
+    the total number of individuals. All chunks are simulated with the same compiled
+    function. The last chunk is padded to chunk_size for this.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        params (pandas.DataFrame): DataFrame with model parameters.
+        n_obs (int): Number of simulated individuals.
+        data (pd.DataFrame): Dataset in the same format as for estimation, containing
+            information about observed factors and control variables. If given, the
+            individuals in data are simulated and n_obs is ignored.
+        policies (list): See :func:`simulate_dataset`.
+        seed (int): Seed for the jax.random keys of all chunks.
+        chunk_size (int): Number of individuals per chunk.
+
+    Yields:
+        dict: Dictionary with the DataFrames "measurements", "unanchored_states" and
+            "anchored_states" of one chunk in the format of
+            :func:`simulate_dataset`. The ids continue across chunks.
+
+    """
+    # without data, the control and observed factor data are the same for all chunks
+    inputs = _get_simulation_inputs(
+        model_dict, params, chunk_size if data is None else n_obs, data
+    )
+    model = inputs["model"]
+    labels, update_info = model["labels"], model["update_info"]
+    total_n_obs = n_obs if data is None else inputs["n_obs"]
+
+    simulate = _get_simulate_function(model["transition_info"], update_info)
+    policy_means, policy_sds = get_policy_arrays(
+        policies, labels["latent_factors"], model["dimensions"]["n_periods"]
+    )
+    base_key = jax.random.PRNGKey(seed)
+
+    for chunk, start in enumerate(range(0, total_n_obs, chunk_size)):
+        chunk_n_obs = min(chunk_size, total_n_obs - start)
+        if data is None:
+            control_data = inputs["control_data"]
+            observed_data = inputs["observed_data"]
+        else:
+            control_data = get_padded_chunk(inputs["control_data"], start, chunk_size)
+            observed_data = get_padded_chunk(inputs["observed_data"], start, chunk_size)
+
+        simulated = simulate(
+            jax.random.fold_in(base_key, chunk),
+            initial_states=inputs["states"][0],
+            initial_upper_chols=inputs["covs"][0],
+            log_weights=inputs["log_weights"][0],
+            pardict=inputs["pardict"],
+            control_data=jnp.asarray(control_data, dtype=float),
+            observed_factors=jnp.asarray(observed_data, dtype=float),
+            policy_means=policy_means,
+            policy_sds=policy_sds,
+        )
+        states = np.array(simulated["states"])[:, :chunk_n_obs]
+        measurements = np.array(simulated["measurements"])[:, :chunk_n_obs]
+        anchored = anchor_states(states, inputs["pardict"])
+
+        yield {
+            "measurements": _measurements_to_df(
+                measurements, update_info, first_id=start
+            ),
+            "unanchored_states": _states_to_df(
+                states, labels["latent_factors"], first_id=start
+            ),
+            "anchored_states": _states_to_df(
+                anchored, labels["latent_factors"], first_id=start
+            ),
+        }
+
+
+def simulate_dataset_to_parquet(
+    model_dict,
+    params,
+    path,
+    n_obs=None,
+    data=None,
+    policies=None,
+    seed=0,
+    chunk_size=100_000,
+):
+    """Simulate a dataset in chunks and write each chunk to Parquet files.
+
+    The chunks are simulated with :func:`simulate_dataset_chunks`. Each chunk is
+    written to the directories "measurements", "unanchored_states" and
+    "anchored_states" in path as soon as it is simulated. Each directory can be read
+    with ``pandas.read_parquet``. Writing Parquet files requires pyarrow or
+    fastparquet.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        params (pandas.DataFrame): DataFrame with model parameters.
+        path (str or pathlib.Path): Directory for the Parquet files.
+        n_obs (int): Number of simulated individuals.
+        data (pd.DataFrame): See :func:`simulate_dataset_chunks`.
+        policies (list): See :func:`simulate_dataset`.
+        seed (int): Seed for the jax.random keys of all chunks.
+        chunk_size (int): Number of individuals per chunk.
+
+    """
+    path = Path(path)
+    chunks = simulate_dataset_chunks(
+        model_dict,
+        params,
+        n_obs=n_obs,
+        data=data,
+        policies=policies,
+        seed=seed,
+        chunk_size=chunk_size,
+    )
+    for chunk, simulated in enumerate(chunks):
+        for name, df in simulated.items():
+            directory = path / name
+            directory.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(directory / f"part-{chunk:05d}.parquet")
+
+
+def simulate_policy_scenarios(
+    model_dict, params, scenarios, n_obs=None, data=None, seed=None
+):
+    """Simulate the effect of several policy scenarios with common random numbers.
+
+    The initial states, transition shocks and draws of the policy effects are the
+    same in all scenarios. Only the policies differ. All scenarios, including a
+    baseline without policies, are simulated in one vectorized pass. Differences
+    between scenarios are therefore not affected by simulation noise in the
+    baseline.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        params (pandas.DataFrame): DataFrame with model parameters.
+        scenarios (dict): Maps the names of scenarios to lists of policies in the
+            format of :func:`simulate_dataset`.
+        n_obs (int): Number of simulated individuals
+        data (pd.DataFrame): Dataset in the same format as for estimation, containing
+            information about observed factors and control variables.
+        seed (int): Seed for the jax.random key. See :func:`simulate_dataset`.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "states" (pandas.DataFrame): Anchored states of all scenarios in long
+              format with the additional column "scenario". The scenario without
+              policies is called "baseline".
+            - "summary" (pandas.DataFrame): Mean and standard deviation of the
+              anchored states by scenario and period.
+            - "differences" (pandas.DataFrame): Mean difference of the anchored
+              states to the baseline and its standard error by scenario and period.
+
+    """
+    if "baseline" in scenarios:
+        raise ValueError("'baseline' is reserved for the scenario without policies.")
+
+    inputs = _get_simulation_inputs(model_dict, params, n_obs, data)
+    model = inputs["model"]
+    latent_factors = model["labels"]["latent_factors"]
+    n_periods = model["dimensions"]["n_periods"]
+
+    names = ["baseline", *scenarios]
+    policy_arrays = [
+        get_policy_arrays(policies, latent_factors, n_periods)
+        for policies in [[], *scenarios.values()]
+    ]
+    policy_means, policy_sds = (jnp.stack(arrays) for arrays in zip(*policy_arrays))
+
+    simulate_states = functools.partial(
+        _simulate_states,
+        transition_function=model["transition_info"]["func"],
+        update_slices=_get_update_slices(model["update_info"]),
+    )
+    simulate_scenarios = jax.jit(
+        jax.vmap(simulate_states, in_axes=(None,) * 7 + (0, 0))
+    )
+
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+
+    states = simulate_scenarios(
+        jax.random.PRNGKey(seed),
+        inputs["states"][0],
+        inputs["covs"][0],
+        inputs["log_weights"][0],
+        inputs["pardict"],
+        jnp.asarray(inputs["control_data"], dtype=float),
+        jnp.asarray(inputs["observed_data"], dtype=float),
+        policy_means,
+        policy_sds,
+    )
+    states = np.stack([anchor_states(arr, inputs["pardict"]) for arr in states])
+
+    n_obs = inputs["n_obs"]
+    differences = states - states[0]
+    index = pd.MultiIndex.from_product(
+        [names, range(n_periods)], names=["scenario", "period"]
+    )
+
+    def _to_frame(arr):
+        return pd.DataFrame(
+            arr.reshape(-1, len(latent_factors)), index=index, columns=latent_factors
+        )
+
+    summary = pd.concat(
+        {"mean": _to_frame(states.mean(axis=2)), "std": _to_frame(states.std(axis=2))},
+        axis=1,
+    )
+    differences = pd.concat(
+        {
+            "mean_difference": _to_frame(differences.mean(axis=2)),
+            "std_error": _to_frame(differences.std(axis=2) / np.sqrt(n_obs)),
+        },
+        axis=1,
+    )
+
+    states_df = pd.concat(
+        [_states_to_df(arr, latent_factors) for arr in states],
+        keys=names,
+        names=["scenario", None],
+    ).reset_index(level="scenario")
+
+    return {"states": states_df, "summary": summary, "differences": differences}
+
+
+def generate_start_states(n_obs, dimensions, dist_args, weights, seed=None):
+    """Draw initial states from a (mixture of) normals.
+
+    The mixture components of all observations and the standard normal draws are
+    generated at once and transformed with the mean and cholesky factor of the
+    assigned component.
+
+    Args:
+        n_obs (int): number of observations
+        dimensions (dict): Dimensional information like n_states, n_periods, n_controls,
+            n_mixtures. See :ref:`dimensions`.
+        dist_args (list): list of dicts of length nmixtures of dictionaries with the
+            entries "mean" and "cov" for each mixture distribution.
+        weights (np.ndarray): the weights of the mixture components.
+        seed (int): Seed for the jax.random key. See :func:`simulate_dataset`.
+
+    Returns:
+        start_states (np.ndarray): shape (n_obs, n_states),
+
+    """
+    n_states = dimensions["n_latent_factors"]
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+
+    means = np.array([args["mean"] for args in dist_args], dtype=float)
+    upper_chols = np.array([_get_cov_root(args["cov"]).T for args in dist_args])
+    with np.errstate(divide="ignore"):
+        log_weights = np.log(np.atleast_1d(weights).astype(float))
+
+    states = _draw_start_states(
+        jax.random.PRNGKey(seed),
+        jnp.asarray(means.reshape(-1, n_states)),
+        jnp.asarray(upper_chols),
+        jnp.asarray(log_weights),
+        n_obs,
+    )
+    return np.array(states)
+
+
+def measurements_from_states(
+    states, controls, loadings, control_params, sds, seed=None
+):
+    """Generate the variables that would be observed in practice.
+
+    This generates the data for only one period. Let n_meas be the number
+    of measurements in that period.
+
+    Args:
+        states (pd.DataFrame or np.ndarray): DataFrame of shape (n_obs, n_states)
+        controls (pd.DataFrame or np.ndarray): DataFrame of shape
+            (n_obs, n_controls)
+        loadings (np.ndarray): numpy array of size (n_meas, n_states)
+        control_params (np.ndarray): numpy array of size (n_meas, n_controls)
+        sds (np.ndarray): numpy array of size (n_meas) with the standard deviations
+            of the measurements. Measurement error is assumed to be independent
+            across measurements.
+        seed (int): Seed for the jax.random key. See :func:`simulate_dataset`.
 
     Returns:
-        observed_data (pd.DataFrame): Dataset with measurements and control variables
-            in long format
+        measurements (np.ndarray): array of shape (n_obs, n_meas) with measurements.
+
+    """
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+
+    measurements = _draw_measurements(
+        jax.random.PRNGKey(seed),
+        *[
+            jnp.asarray(arr, dtype=float)
+            for arr in [states, controls, loadings, control_params, sds]
+        ],
+    )
+    return np.array(measurements)
 
-        latent_data (pd.DataFrame): Dataset with latent factors in long format
+
+def _get_simulation_inputs(model_dict, params, n_obs, data):
+    """Process the model, params and data for a simulation.
+
+    Returns:
+        dict: Dictionary with the processed model, the reindexed params, the number
+            of individuals, the control and observed factor data and the outputs of
+            :func:`skillmodels.parse_params.parse_params`.
 
     """
     if data is None and n_obs is None:
@@ -69,8 +468,8 @@ def simulate_dataset(model_dict, params, n_obs=None, data=None, policies=None):
         n_obs = data_n_obs
 
     else:
-        control_data = jnp.ones((n_obs, 1))
         n_periods = model["dimensions"]["n_periods"]
+        control_data = jnp.ones((n_periods, n_obs, 1))
         observed_data = jnp.zeros((n_periods, n_obs, 0))
 
     params_index = get_params_index(
@@ -94,55 +493,30 @@ def simulate_dataset(model_dict, params, n_obs=None, data=None, policies=None):
         parsing_info=parsing_info,
         dimensions=model["dimensions"],
         labels=model["labels"],
-        n_obs=n_obs,
-    )
-
-    observed_data, latent_data = _simulate_dataset(
-        latent_states=states,
-        covs=covs,
-        log_weights=log_weights,
-        pardict=pardict,
-        labels=model["labels"],
-        dimensions=model["dimensions"],
-        n_obs=n_obs,
-        update_info=model["update_info"],
-        control_data=control_data,
-        observed_factor_data=observed_data,
-        policies=policies,
-        transition_info=model["transition_info"],
-    )
-
-    anchored_latent_data = anchor_states_df(
-        states_df=latent_data, model_dict=model_dict, params=params
     )
 
     out = {
-        "unanchored_states": {
-            "states": latent_data,
-            "state_ranges": create_state_ranges(
-                latent_data, model["labels"]["latent_factors"]
-            ),
-        },
-        "anchored_states": {
-            "states": anchored_latent_data,
-            "state_ranges": create_state_ranges(
-                anchored_latent_data, model["labels"]["latent_factors"]
-            ),
-        },
-        "measurements": observed_data,
+        "model": model,
+        "params": params,
+        "n_obs": n_obs,
+        "control_data": control_data,
+        "observed_data": observed_data,
+        "states": states,
+        "covs": covs,
+        "log_weights": log_weights,
+        "pardict": pardict,
     }
-
     return out
 
 
 def _simulate_dataset(
+    key,
     latent_states,
     covs,
     log_weights,
     pardict,
     labels,
     dimensions,
-    n_obs,
     update_info,
     control_data,
     observed_factor_data,
@@ -152,193 +526,332 @@ def _simulate_dataset(
     """Simulate datasets generated by a latent factor model.
 
     Args:
-        See simulate_data
+        key (jax.random.PRNGKey): Key for all random draws of the simulation.
+        See simulate_data for the other arguments.
 
     Returns:
-        See simulate_data
+        dict: The labelled arrays "measurements", "unanchored_states" and
+            "anchored_states". See :func:`simulate_dataset`.
 
     """
-    policies = policies if policies is not None else []
-
-    n_states = dimensions["n_latent_factors"]
-    n_periods = dimensions["n_periods"]
+    policy_means, policy_sds = get_policy_arrays(
+        policies, labels["latent_factors"], dimensions["n_periods"]
+    )
 
-    weights = np.exp(log_weights)[0]
-    loadings_df = pd.DataFrame(
-        data=pardict["loadings"],
-        index=update_info.index,
-        columns=labels["latent_factors"],
+    simulate = _get_simulate_function(transition_info, update_info)
+    simulated = simulate(
+        key,
+        initial_states=latent_states[0],
+        initial_upper_chols=covs[0],
+        log_weights=log_weights[0],
+        pardict=pardict,
+        control_data=jnp.asarray(control_data, dtype=float),
+        observed_factors=jnp.asarray(observed_factor_data, dtype=float),
+        policy_means=policy_means,
+        policy_sds=policy_sds,
     )
 
-    control_params_df = pd.DataFrame(
-        data=pardict["controls"], index=update_info.index, columns=labels["controls"]
+    states = np.array(simulated["states"])
+    measurements, variables = _measurements_to_array(
+        np.array(simulated["measurements"]), update_info
     )
-    meas_sds = pd.DataFrame(
-        data=pardict["meas_sds"].reshape(-1, 1), index=update_info.index
+
+    out = {
+        "measurements": {"values": measurements, "variables": variables},
+        "unanchored_states": {
+            "values": states,
+            "variables": labels["latent_factors"],
+        },
+        "anchored_states": {
+            "values": anchor_states(states, pardict),
+            "variables": labels["latent_factors"],
+        },
+    }
+    return out
+
+
+def _get_simulate_function(transition_info, update_info):
+    """Get the jitted version of :func:`_simulate_arrays` for a model."""
+    return jax.jit(
+        functools.partial(
+            _simulate_arrays,
+            transition_function=transition_info["func"],
+            update_slices=_get_update_slices(update_info),
+        )
     )
 
-    transition_params = pardict["transition"]
-    shock_sds = pardict["shock_sds"]
 
-    dist_args = []
-    for mixture in range(dimensions["n_mixtures"]):
-        args = {
-            "mean": latent_states[0][mixture],
-            "cov": covs[0][mixture].T @ covs[0][mixture],
-        }
-        dist_args.append(args)
-
-    latent_states = np.zeros((n_periods, n_obs, n_states))
-    latent_states[0] = generate_start_states(n_obs, dimensions, dist_args, weights)
-
-    for t in range(n_periods - 1):
-        # if there is a shock in period t, add it here
-        policies_t = [p for p in policies if p["period"] == t]
-        for policy in policies_t:
-            position = labels["latent_factors"].index(policy["factor"])
-            latent_states[t, :, position] += _get_shock(
-                mean=policy["effect_size"], sd=policy["standard_deviation"], size=n_obs
-            )
+def _simulate_arrays(
+    key,
+    initial_states,
+    initial_upper_chols,
+    log_weights,
+    pardict,
+    control_data,
+    observed_factors,
+    policy_means,
+    policy_sds,
+    transition_function,
+    update_slices,
+):
+    """Simulate the states and measurements of all periods.
 
-        # get combined states and observed factors as jax array
-        to_concat = [latent_states[t], observed_factor_data[t]]
-        states = jnp.array(np.concatenate(to_concat, axis=-1))
-        # reshaping is just needed for transform sigma points
-        states = states.reshape(1, 1, *states.shape)
+    The state evolution is a lax.scan over periods. The measurements are generated
+    from the states of all periods at once.
 
-        # extract trans coeffs for the period
-        trans_coeffs = {k: arr[t] for k, arr in transition_params.items()}
+    Args:
+        key (jax.random.PRNGKey): Key for all random draws of the simulation.
+        initial_states (jax.numpy.array): Array of shape (n_mixtures, n_states) with
+            the means of the mixture components.
+        initial_upper_chols (jax.numpy.array): Array of shape (n_mixtures, n_states,
+            n_states) with the transpose of the cholesky factors of the covariance
+            matrices of the mixture components.
+        log_weights (jax.numpy.array): Array of shape (n_mixtures,) with the log of
+            the mixture weights.
+        pardict (dict): See :func:`skillmodels.parse_params.parse_params`.
+        control_data (jax.numpy.array): Array of shape (n_periods, n_obs, n_controls).
+        observed_factors (jax.numpy.array): Array of shape (n_periods, n_obs,
+            n_observed_factors).
+        policy_means (jax.numpy.array): Array of shape (n_periods - 1, n_states) with
+            the mean effects of policies at the end of each period.
+        policy_sds (jax.numpy.array): Array of the same shape with the standard
+            deviations of the policy effects.
+        transition_function (function): The "func" entry of transition_info.
+        update_slices (tuple): Start and stop position of the measurements of each
+            period in update_info.
 
-        # get anchoring_scaling_factors for the period
-        anchoring_scaling_factors = pardict["anchoring_scaling_factors"][
-            jnp.array([t, t + 1])
-        ]
-        # get anchoring constants for the period
-        anchoring_constants = pardict["anchoring_constants"][jnp.array([t, t + 1])]
-
-        # call transform_sigma_points and convert result to numpy
-        next_states = np.array(
-            transform_sigma_points(
-                sigma_points=states,
-                transition_info=transition_info,
-                trans_coeffs=trans_coeffs,
-                anchoring_scaling_factors=anchoring_scaling_factors,
-                anchoring_constants=anchoring_constants,
-            )
-        ).reshape(n_obs, -1)
+    Returns:
+        dict: Dictionary with the entries:
+            - "states" (jax.numpy.array): Array of shape (n_periods, n_obs, n_states).
+            - "measurements" (jax.numpy.array): Array of shape (n_updates, n_obs) in
+              the order of update_info.
+
+    """
+    n_periods, n_obs, _ = control_data.shape
+    n_states = initial_states.shape[-1]
+    start_key, transition_key, measurement_key = jax.random.split(key, 3)
 
-        errors = multivariate_normal(
-            mean=np.zeros(n_states), cov=np.diag(shock_sds[t] ** 2), size=n_obs
+    start_states = _draw_start_states(
+        start_key, initial_states, initial_upper_chols, log_weights, n_obs
+    )
+
+    scaling_factors = pardict["anchoring_scaling_factors"][:, :n_states]
+    constants = pardict["anchoring_constants"][:, :n_states]
+
+    def _transition_period(states, inputs):
+        period_key, trans_coeffs, shock_sds, policy_mean, policy_sd, period = inputs
+        policy_key, shock_key = jax.random.split(period_key)
+        # policies affect the states at the end of the period
+        states = (
+            states
+            + policy_mean
+            + policy_sd * jax.random.normal(policy_key, states.shape)
+        )
+        anchored = states * scaling_factors[period] + constants[period]
+        transformed = transition_function(
+            trans_coeffs, anchored.reshape(n_obs, 1, n_states), observed_factors[period]
+        ).reshape(n_obs, n_states)
+        next_states = (transformed - constants[period + 1]) / scaling_factors[
+            period + 1
+        ]
+        next_states = next_states + shock_sds * jax.random.normal(
+            shock_key, states.shape
         )
-        next_states = next_states + errors
+        return next_states, states
+
+    scan_inputs = (
+        jax.random.split(transition_key, n_periods - 1),
+        pardict["transition"],
+        pardict["shock_sds"],
+        policy_means,
+        policy_sds,
+        jnp.arange(n_periods - 1),
+    )
+    last_states, states = jax.lax.scan(_transition_period, start_states, scan_inputs)
+    states = jnp.concatenate([states, last_states[None]])
+
+    measurement_keys = jax.random.split(measurement_key, n_periods)
+    measurements = []
+    for period, (start, stop) in enumerate(update_slices):
+        period_measurements = _draw_measurements(
+            measurement_keys[period],
+            states[period],
+            control_data[period],
+            pardict["loadings"][start:stop],
+            pardict["controls"][start:stop],
+            pardict["meas_sds"][start:stop],
+        )
+        measurements.append(period_measurements.T)
 
-        latent_states[t + 1] = next_states
+    return {"states": states, "measurements": jnp.concatenate(measurements)}
 
-    observed_data_by_period = []
 
-    for t in range(n_periods):
-        meas = pd.DataFrame(
-            data=measurements_from_states(
-                latent_states[t],
-                control_data[t],
-                loadings_df.loc[t].to_numpy(),
-                control_params_df.loc[t].to_numpy(),
-                meas_sds.loc[t].to_numpy().flatten(),
-            ),
-            columns=loadings_df.loc[t].index,
-        )
-        meas["period"] = t
-        observed_data_by_period.append(meas)
+def _simulate_states(
+    key,
+    initial_states,
+    initial_upper_chols,
+    log_weights,
+    pardict,
+    control_data,
+    observed_factors,
+    policy_means,
+    policy_sds,
+    transition_function,
+    update_slices,
+):
+    """Simulate only the states. See :func:`_simulate_arrays` for the arguments."""
+    return _simulate_arrays(
+        key,
+        initial_states,
+        initial_upper_chols,
+        log_weights,
+        pardict,
+        control_data,
+        observed_factors,
+        policy_means,
+        policy_sds,
+        transition_function=transition_function,
+        update_slices=update_slices,
+    )["states"]
+
+
+def _draw_start_states(key, means, upper_chols, log_weights, n_obs):
+    """Draw initial states from a mixture of normals."""
+    component_key, draw_key = jax.random.split(key)
+    components = jax.random.categorical(component_key, log_weights, shape=(n_obs,))
+    draws = jax.random.normal(draw_key, (n_obs, means.shape[-1]))
+    states = jnp.zeros((n_obs, means.shape[-1]))
+    for component in range(len(means)):
+        is_assigned = (components == component).reshape(-1, 1)
+        component_states = means[component] + draws @ upper_chols[component]
+        states = jnp.where(is_assigned, component_states, states)
+    return states
+
+
+def _draw_measurements(key, states, controls, loadings, control_params, sds):
+    """Draw the measurements of one period.
+
+    Returns:
+        jax.numpy.array: Array of shape (n_obs, n_meas).
 
-    observed_data = pd.concat(observed_data_by_period, axis=0, sort=True)
-    observed_data["id"] = observed_data.index
-    observed_data.sort_values(["id", "period"], inplace=True)
+    """
+    errors = sds * jax.random.normal(key, (len(states), len(loadings)))
+    return states @ loadings.T + controls @ control_params.T + errors
 
-    latent_data_by_period = []
-    for t in range(n_periods):
-        lat = pd.DataFrame(data=latent_states[t], columns=labels["latent_factors"])
-        lat["period"] = t
-        latent_data_by_period.append(lat)
 
-    latent_data = pd.concat(latent_data_by_period, axis=0, sort=True)
-    latent_data["id"] = latent_data.index
-    latent_data.sort_values(["id", "period"], inplace=True)
+def _get_cov_root(cov):
+    """Cholesky factor of cov that also works for singular covariance matrices."""
+    cov = np.asarray(cov, dtype=float)
+    try:
+        root = np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        root = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+    return root
 
-    return observed_data, latent_data
 
+def get_policy_arrays(policies, latent_factors, n_periods):
+    """Combine the policies of each period and factor into arrays.
 
-def _get_shock(mean, sd, size):
-    """Add stochastic effect to a  factor of length n_obs.
+    Effects of several policies on the same factor and period are added up. Policies
+    in the last period have no effect because there is no transition after them.
 
     Args:
-        mean (float): mean of the stochastic effect
-        sd (float): standard deviation of the effect
-        size (int): length of resulting array
+        policies (list): See :func:`simulate_dataset`.
+        latent_factors (list): Names of the latent factors.
+        n_periods (int): Number of periods of the model.
 
     Returns:
-        shock (np.array): 1d array of length n_obs with the stochastic shock
+        policy_means (jax.numpy.array): Array of shape (n_periods - 1, n_states).
+        policy_sds (jax.numpy.array): Array of shape (n_periods - 1, n_states).
 
     """
-    if sd == 0:
-        shock = np.full(size, mean)
-    elif sd > 0:
-        shock = np.random.normal(mean, sd, size)
-    else:
-        raise ValueError("No negative standard deviation allowed.")
-    return shock
+    policies = policies if policies is not None else []
+    shape = (n_periods - 1, len(latent_factors))
+    means, variances = np.zeros(shape), np.zeros(shape)
+    for policy in policies:
+        if policy["standard_deviation"] < 0:
+            raise ValueError("No negative standard deviation allowed.")
+        if policy["period"] < n_periods - 1:
+            position = (policy["period"], latent_factors.index(policy["factor"]))
+            means[position] += policy["effect_size"]
+            variances[position] += policy["standard_deviation"] ** 2
+    return jnp.array(means), jnp.array(np.sqrt(variances))
+
 
+def _get_update_slices(update_info):
+    """Start and stop position of the updates of each period in update_info."""
+    periods = update_info.index.get_level_values("period").to_numpy()
+    stops = np.cumsum(np.bincount(periods))
+    starts = np.concatenate([[0], stops[:-1]])
+    return tuple(zip(starts.tolist(), stops.tolist()))
 
-def generate_start_states(n_obs, dimensions, dist_args, weights):
-    """Draw initial states and control variables from a (mixture of) normals.
+
+def _measurements_to_df(measurements, update_info, first_id=0):
+    """Convert simulated measurements to a DataFrame in long format.
 
     Args:
-        n_obs (int): number of observations
-        dimensions (dict): Dimensional information like n_states, n_periods, n_controls,
-            n_mixtures. See :ref:`dimensions`.
-        dist_args (list): list of dicts of length nmixtures of dictionaries with the
-            entries "mean" and "cov" for each mixture distribution.
+        measurements (numpy.ndarray): Array of shape (n_updates, n_obs).
+        update_info (pandas.DataFrame): See :ref:`update_info`.
+        first_id (int): id of the first individual.
 
     Returns:
-        start_states (np.ndarray): shape (n_obs, n_states),
-        controls (np.ndarray): shape (n_obs, n_controls),
+        pandas.DataFrame: One row per individual and period, sorted by "id" and
+            "period", and one column per measurement. Measurements that do not exist
+            in a period are NaN.
 
     """
-    n_states = dimensions["n_latent_factors"]
-    if np.size(weights) == 1:
-        out = multivariate_normal(size=n_obs, **dist_args[0])
-    else:
-        helper_array = choice(np.arange(len(weights)), p=weights, size=n_obs)
-        out = np.zeros((n_obs, n_states))
-        for i in range(n_obs):
-            out[i] = multivariate_normal(**dist_args[helper_array[i]])
+    values, variables = _measurements_to_array(measurements, update_info)
+    return labelled_array_to_df({"values": values, "variables": variables}, first_id)
 
-    return out
 
-
-def measurements_from_states(states, controls, loadings, control_params, sds):
-    """Generate the variables that would be observed in practice.
-
-    This generates the data for only one period. Let n_meas be the number
-    of measurements in that period.
+def _measurements_to_array(measurements, update_info):
+    """Arrange simulated measurements in an array with one column per measurement.
 
     Args:
-        states (pd.DataFrame or np.ndarray): DataFrame of shape (n_obs, n_states)
-        controls (pd.DataFrame or np.ndarray): DataFrame of shape
-            (n_obs, n_controlsrols)
-        loadings (np.ndarray): numpy array of size (n_meas, n_states)
-        control_coeffs (np.ndarray): numpy array of size (n_meas, n_states)
-        sds (np.ndarray): numpy array of size (n_meas) with the standard deviations
-            of the measurements. Measurement error is assumed to be independent
-            across measurements.
+        measurements (numpy.ndarray): Array of shape (n_updates, n_obs).
+        update_info (pandas.DataFrame): See :ref:`update_info`.
 
     Returns:
-        measurements (np.ndarray): array of shape (n_obs, n_meas) with measurements.
+        numpy.ndarray: Array of shape (n_periods, n_obs, n_measurements). Measurements
+            that do not exist in a period are NaN.
+        list: The sorted names of the measurements.
 
     """
-    n_meas = loadings.shape[0]
-    n_obs = len(states)
-    epsilon = multivariate_normal([0] * n_meas, np.diag(sds**2), n_obs)
-    states_part = np.dot(states, loadings.T)
-    control_part = np.dot(controls, control_params.T)
-    meas = states_part + control_part + epsilon
-    return meas
+    periods = update_info.index.get_level_values("period").to_numpy()
+    variables = update_info.index.get_level_values("variable")
+    columns = sorted(set(variables))
+    n_periods = periods.max() + 1
+
+    data = np.full((n_periods, measurements.shape[1], len(columns)), np.nan)
+    data[periods, :, [columns.index(var) for var in variables]] = measurements
+    return data, columns
+
+
+def _get_state_ranges(labelled_array):
+    """Minimum and maximum of each variable of a labelled array in each period."""
+    values = labelled_array["values"]
+    index = pd.RangeIndex(len(values), name="period")
+    minima, maxima = values.min(axis=1), values.max(axis=1)
+    ranges = {}
+    for pos, var in enumerate(labelled_array["variables"]):
+        ranges[var] = pd.DataFrame(
+            {"minimum": minima[:, pos], "maximum": maxima[:, pos]}, index=index
+        )
+    return ranges
+
+
+def _states_to_df(states, latent_factors, first_id=0):
+    """Convert an array of shape (n_periods, n_obs, n_states) to long format."""
+    return _to_long_df(np.swapaxes(states, 0, 1), latent_factors, first_id)
+
+
+def _to_long_df(data, columns, first_id=0):
+    """Convert an array of shape (n_obs, n_periods, n_columns) to long format."""
+    n_obs, n_periods, _ = data.shape
+    ids = np.repeat(np.arange(first_id, first_id + n_obs), n_periods)
+    df = pd.DataFrame(data.reshape(n_obs * n_periods, -1), columns=columns, index=ids)
+    df["period"] = np.tile(np.arange(n_periods), n_obs)
+    df = df[sorted(df.columns)]
+    df["id"] = ids
+    return df
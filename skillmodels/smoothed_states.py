@@ -0,0 +1,331 @@
+"""Smoothed distributions of the latent factors given all measurements."""
+import functools
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pandas as pd
+from jax import lax
+
+from skillmodels.kalman_filters import calculate_sigma_scaling_factor_and_weights
+from skillmodels.kalman_filters import kalman_smooth
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.parse_params import create_parsing_info
+from skillmodels.parse_params import parse_params
+from skillmodels.process_data import process_data
+from skillmodels.process_debug_data import create_state_ranges
+from skillmodels.process_model import process_model
+from skillmodels.utilities import get_padded_chunk
+
+
+def get_smoothed_states(model_dict, data, params, chunk_size=10_000):
+    """Calculate the distribution of the latent factors given all measurements.
+
+    The filtered states (see :func:`skillmodels.filtered_states.get_filtered_states`)
+    of a period only use the measurements up to that period. The smoothed states
+    also use the measurements of later periods. They are calculated with a
+    square-root unscented Rauch-Tung-Striebel smoother (see
+    :func:`skillmodels.kalman_filters.kalman_smooth`) that runs backwards over the
+    filtered states and covariances of the last Kalman update of each period.
+
+    Each element of a mixture of normals is smoothed separately. The mixture
+    elements are not allowed to change over time, so the mixture weights after the
+    last Kalman update are the weights of the smoothed distributions in all periods.
+
+    The backward pass is compiled once and run for chunks of chunk_size individuals.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        params (pandas.DataFrame): DataFrame with model parameters.
+        chunk_size (int): Number of individuals that are smoothed at the same time.
+
+    Returns:
+        dict: Dictionary with the entries "anchored_states" and "unanchored_states".
+            Both are dictionaries with the entries:
+            - "states" (pandas.DataFrame): The means of the smoothed states in the
+              format of the filtered states, i.e. with the factor names, "period"
+              and "id" as columns.
+            - "covariances" (pandas.DataFrame): The covariances of the smoothed
+              states. It has the columns of "states" and the column "factor". Each
+              row is the row of "factor" in the covariance matrix of an individual
+              and period.
+            - "state_ranges" (dict): The keys are the names of the latent factors.
+              The values are DataFrames with the minimum and maximum of the means.
+
+    """
+    distributions = get_posterior_distributions(
+        model_dict, data, params, smoothed=True, chunk_size=chunk_size
+    )
+    pardict = distributions["pardict"]
+    factors = process_model(model_dict)["labels"]["latent_factors"]
+
+    means, covs = aggregate_mixtures(
+        distributions["states"],
+        distributions["upper_chols"],
+        np.exp(distributions["log_mixture_weights"]),
+    )
+
+    return get_states_outputs(means, covs, pardict, factors)
+
+
+def get_posterior_distributions(
+    model_dict, data, params, smoothed=False, chunk_size=10_000
+):
+    """Calculate the mixture of normals posterior of the latent factors in each period.
+
+    The filtered distribution of a period is the one after its last Kalman update. Its
+    mixture weights can differ between periods. The smoothed distributions of all
+    periods have the mixture weights after the last Kalman update.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        params (pandas.DataFrame): DataFrame with model parameters.
+        smoothed (bool): Whether the smoothed or filtered distributions are returned.
+        chunk_size (int): Number of individuals that are smoothed at the same time.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "states" (numpy.ndarray): Array of shape (n_periods, n_obs, n_mixtures,
+              n_states) with the means of the mixture elements.
+            - "upper_chols" (numpy.ndarray): Array of shape (n_periods, n_obs,
+              n_mixtures, n_states, n_states) with the upper cholesky factors of the
+              covariances of the mixture elements.
+            - "log_mixture_weights" (numpy.ndarray): Array of shape (n_periods, n_obs,
+              n_mixtures).
+            - "pardict" (dict): The parsed parameters.
+
+    """
+    inputs = get_maximization_inputs(model_dict, data)
+    params = params.loc[inputs["params_template"].index]
+    filtered = inputs["kalman_filter"](params)
+
+    model = process_model(model_dict)
+    labels = model["labels"]
+    parsing_info = create_parsing_info(
+        params.index, model["update_info"], labels, model["anchoring"]
+    )
+    *_, pardict = parse_params(
+        params=jnp.array(params["value"].to_numpy()),
+        parsing_info=parsing_info,
+        dimensions=model["dimensions"],
+        labels=labels,
+    )
+
+    periods = model["update_info"].index.get_level_values("period").to_numpy()
+    last_updates = len(periods) - 1 - np.unique(periods[::-1], return_index=True)[1]
+    states = filtered["filtered_states"][last_updates]
+    upper_chols = filtered["filtered_upper_chols"][last_updates]
+    log_weights = filtered["log_mixture_weights"][last_updates]
+
+    if smoothed:
+        *_, observed_factors = process_data(
+            data, labels, model["update_info"], model["anchoring"]
+        )
+        states, upper_chols = _smooth_in_chunks(
+            states,
+            upper_chols,
+            np.array(observed_factors),
+            pardict,
+            model,
+            chunk_size,
+        )
+        log_weights = np.broadcast_to(log_weights[-1], log_weights.shape)
+
+    out = {
+        "states": states,
+        "upper_chols": upper_chols,
+        "log_mixture_weights": log_weights,
+        "pardict": pardict,
+    }
+    return out
+
+
+def _smooth_in_chunks(
+    states, upper_chols, observed_factors, pardict, model, chunk_size
+):
+    """Run the jitted smoother for chunks of chunk_size individuals."""
+    sigma_scaling_factor, sigma_weights = calculate_sigma_scaling_factor_and_weights(
+        model["dimensions"]["n_latent_factors"],
+        model["estimation_options"]["sigma_points_scale"],
+    )
+    smooth = jax.jit(
+        functools.partial(
+            _smooth,
+            sigma_scaling_factor=sigma_scaling_factor,
+            sigma_weights=sigma_weights,
+            transition_info=model["transition_info"],
+        )
+    )
+
+    n_obs = states.shape[1]
+    chunk_size = min(chunk_size, n_obs)
+    smoothed_states, smoothed_chols = [], []
+    for start in range(0, n_obs, chunk_size):
+        chunk_states, chunk_chols = smooth(
+            get_padded_chunk(states, start, chunk_size),
+            get_padded_chunk(upper_chols, start, chunk_size),
+            get_padded_chunk(observed_factors, start, chunk_size),
+            pardict,
+        )
+        stop = min(chunk_size, n_obs - start)
+        smoothed_states.append(np.array(chunk_states)[:, :stop])
+        smoothed_chols.append(np.array(chunk_chols)[:, :stop])
+
+    return (
+        np.concatenate(smoothed_states, axis=1),
+        np.concatenate(smoothed_chols, axis=1),
+    )
+
+
+def _smooth(
+    states,
+    upper_chols,
+    observed_factors,
+    pardict,
+    sigma_scaling_factor,
+    sigma_weights,
+    transition_info,
+):
+    """Run the smoother backwards over all periods.
+
+    Args:
+        states (jax.numpy.array): Array of shape (n_periods, n_obs, n_mixtures,
+            n_states) with the filtered states of each period.
+        upper_chols (jax.numpy.array): Array of shape (n_periods, n_obs, n_mixtures,
+            n_states, n_states) with the upper cholesky factors of the filtered
+            covariances of each period.
+        observed_factors (jax.numpy.array): Array of shape (n_periods, n_obs,
+            n_observed_factors).
+        pardict (dict): The parsed parameters.
+
+        See :func:`skillmodels.kalman_filters.kalman_predict` for the other arguments.
+
+    Returns:
+        jax.numpy.array: Smoothed states, same shape as states.
+        jax.numpy.array: Smoothed upper_chols, same shape as upper_chols.
+
+    """
+    if len(states) == 1:
+        return states, upper_chols
+
+    anchoring_scaling_factors = pardict["anchoring_scaling_factors"]
+    anchoring_constants = pardict["anchoring_constants"]
+    loop_args = {
+        "states": states[:-1],
+        "upper_chols": upper_chols[:-1],
+        "trans_coeffs": pardict["transition"],
+        "shock_sds": pardict["shock_sds"],
+        "anchoring_scaling_factors": jnp.stack(
+            [anchoring_scaling_factors[:-1], anchoring_scaling_factors[1:]], axis=1
+        ),
+        "anchoring_constants": jnp.stack(
+            [anchoring_constants[:-1], anchoring_constants[1:]], axis=1
+        ),
+        "observed_factors": observed_factors[:-1],
+    }
+
+    def _body(carry, loop_args):
+        new_carry = kalman_smooth(
+            loop_args["states"],
+            loop_args["upper_chols"],
+            *carry,
+            sigma_scaling_factor=sigma_scaling_factor,
+            sigma_weights=sigma_weights,
+            transition_info=transition_info,
+            trans_coeffs=loop_args["trans_coeffs"],
+            shock_sds=loop_args["shock_sds"],
+            anchoring_scaling_factors=loop_args["anchoring_scaling_factors"],
+            anchoring_constants=loop_args["anchoring_constants"],
+            observed_factors=loop_args["observed_factors"],
+        )
+        return new_carry, new_carry
+
+    _, (smoothed_states, smoothed_chols) = lax.scan(
+        _body, (states[-1], upper_chols[-1]), loop_args, reverse=True
+    )
+
+    smoothed_states = jnp.concatenate([smoothed_states, states[-1:]])
+    smoothed_chols = jnp.concatenate([smoothed_chols, upper_chols[-1:]])
+    return smoothed_states, smoothed_chols
+
+
+def aggregate_mixtures(states, upper_chols, weights):
+    """Calculate the means and covariances of mixtures of normals.
+
+    Args:
+        states (numpy.ndarray): Array of shape (n_periods, n_obs, n_mixtures,
+            n_states).
+        upper_chols (numpy.ndarray): Array of shape (n_periods, n_obs, n_mixtures,
+            n_states, n_states).
+        weights (numpy.ndarray): Array of shape (n_periods, n_obs, n_mixtures).
+
+    Returns:
+        numpy.ndarray: Means of shape (n_periods, n_obs, n_states).
+        numpy.ndarray: Covariances of shape (n_periods, n_obs, n_states, n_states).
+
+    """
+    covs = np.swapaxes(upper_chols, -1, -2) @ upper_chols
+    second_moments = covs + states[..., :, None] * states[..., None, :]
+    means = (states * weights[..., None]).sum(axis=2)
+    second_moments = (second_moments * weights[..., None, None]).sum(axis=2)
+    return means, second_moments - means[..., :, None] * means[..., None, :]
+
+
+def get_states_outputs(means, covs, pardict, factors, periods=None):
+    """Anchor the means and covariances and convert them to DataFrames.
+
+    Args:
+        means (numpy.ndarray): Array of shape (n_periods, n_obs, n_states).
+        covs (numpy.ndarray): Array of shape (n_periods, n_obs, n_states, n_states).
+        pardict (dict): The parsed parameters.
+        factors (list): Names of the latent factors.
+        periods (list): The periods of the first axis. Default range(n_periods).
+
+    Returns:
+        dict: The entries "anchored_states" and "unanchored_states" of
+            :func:`get_smoothed_states`.
+
+    """
+    periods = list(range(len(means))) if periods is None else list(periods)
+    n_latent = len(factors)
+    scaling_factors = np.array(pardict["anchoring_scaling_factors"][:, :n_latent])
+    scaling_factors = scaling_factors[periods]
+    constants = np.array(pardict["anchoring_constants"][:, :n_latent])[periods]
+    anchored_means = means * scaling_factors[:, None] + constants[:, None]
+    anchored_covs = (
+        covs * scaling_factors[:, None, :, None] * scaling_factors[:, None, None, :]
+    )
+
+    out = {
+        "anchored_states": _get_states_output(
+            anchored_means, anchored_covs, factors, periods
+        ),
+        "unanchored_states": _get_states_output(means, covs, factors, periods),
+    }
+    return out
+
+
+def _get_states_output(means, covs, factors, periods):
+    _, n_obs, n_states = means.shape
+    states, covariances = [], []
+    for i, period in enumerate(periods):
+        df = pd.DataFrame(data=means[i], columns=factors)
+        df["period"] = period
+        df["id"] = np.arange(n_obs)
+        states.append(df)
+
+        df = pd.DataFrame(covs[i].reshape(-1, n_states), columns=factors)
+        df["factor"] = np.tile(factors, n_obs)
+        df["period"] = period
+        df["id"] = np.repeat(np.arange(n_obs), n_states)
+        covariances.append(df)
+
+    states = pd.concat(states)
+    out = {
+        "states": states,
+        "covariances": pd.concat(covariances),
+        "state_ranges": create_state_ranges(states, factors),
+    }
+    return out
@@ -0,0 +1,420 @@
+"""Start values for the estimation that are calculated from moments of the data."""
+import warnings
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+import skillmodels.transition_functions as tf
+from skillmodels.constraints import get_constraints
+from skillmodels.correlation_heatmap import (
+    _get_quasi_factor_scores_data_for_single_period,
+)
+from skillmodels.params_index import get_params_index
+from skillmodels.process_data import add_copies_of_anchoring_outcome
+from skillmodels.process_data import pre_process_data
+from skillmodels.process_model import process_model
+
+LINEAR_IN_PARAMS = ["linear", "translog", "robust_translog", "linear_and_squares"]
+
+# lower bound for the share of the variance of a measurement or factor that is noise
+MIN_NOISE_SHARE = 0.05
+
+
+def get_start_params(model_dict, data):
+    """Calculate start values from moments of the data.
+
+    The start values are calculated in closed form and do not require an evaluation of
+    the likelihood:
+
+    1. In each period, the measurements are regressed on the control variables.
+       Loadings and measurement standard deviations are calculated from the
+       covariances of the residuals of the measurements of each factor. The scale of
+       a factor is chosen such that a normalized loading takes its normalized value.
+       Without loading normalization, the factor has unit variance. Factor means are
+       zero, unless an intercept is normalized. The signs of the loadings are taken
+       from the covariances with the quasi factor scores (see
+       :func:`skillmodels.correlation_heatmap.get_quasi_scores_corr`).
+    2. Factor scores are calculated as weighted means of the measurements with the
+       weights of Bartlett scores. Measurements of several factors are regressed on
+       these scores.
+    3. The initial states and covariances are the means and covariances of the scores
+       of the first period, net of their measurement noise. Means of mixture elements
+       are spread around the mean of the first factor and the mixture weights are
+       equal.
+    4. Transition functions that are linear in parameters are estimated by regressing
+       the scores of a period on the transformed scores of the previous period. For
+       log_ces and log_ces_general, the share parameters are the normalized positive
+       coefficients of a linear regression. The shock standard deviations are the
+       standard deviations of the residuals, net of the noise in the scores. Factors
+       without measurements in a period keep the scores of the previous period.
+       Parameters of custom transition functions are set to 0.1.
+    5. The values are made consistent with the constraints of the model, e.g.
+       parameters that have to be equal within a development stage are averaged.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+
+    Returns:
+        pandas.DataFrame: Parameter DataFrame with the start values in the "value"
+            column.
+
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings(
+            "ignore", message="indexing past lexsort depth may impact performance."
+        )
+        params = _get_start_params(model_dict, data)
+    return params
+
+
+def _get_start_params(model_dict, data):
+    model = process_model(model_dict)
+    labels = model["labels"]
+    update_info = model["update_info"]
+    latent_factors = labels["latent_factors"]
+
+    p_index = get_params_index(
+        update_info, labels, model["dimensions"], model["transition_info"]
+    )
+    params = pd.DataFrame(index=p_index, columns=["value"], dtype=float)
+
+    df = pre_process_data(data, labels["periods"])
+    df["constant"] = 1.0
+    df = add_copies_of_anchoring_outcome(df, model["anchoring"])
+
+    scores, noise_vars = {}, {}
+    for period in labels["periods"]:
+        quasi_scores = _get_quasi_factor_scores_data_for_single_period(
+            df, update_info, period, latent_factors, []
+        )
+        scores[period], noise_vars[period] = _fill_measurement_params(
+            params,
+            df.query(f"period == {period}").reset_index(drop=True),
+            quasi_scores.reset_index(drop=True),
+            update_info.loc[period],
+            model["normalizations"],
+            labels,
+            period,
+        )
+        if period > 0:
+            # factors without measurements in a period, e.g. constant factors
+            missing = scores[period].columns[scores[period].isnull().all()]
+            scores[period][missing] = scores[period - 1][missing]
+            noise_vars[period][missing] = noise_vars[period - 1][missing]
+
+    _fill_initial_params(
+        params, scores[0], noise_vars[0], model["dimensions"]["n_mixtures"]
+    )
+
+    for period in labels["periods"][:-1]:
+        states = scores[period].copy()
+        for factor in labels["observed_factors"]:
+            states[factor] = df.query(f"period == {period}")[factor].to_numpy()
+        _fill_transition_params(
+            params,
+            states[labels["all_factors"]],
+            noise_vars[period],
+            scores[period + 1],
+            noise_vars[period + 1],
+            model["transition_info"],
+            labels,
+            period,
+        )
+
+    constraints = get_constraints(
+        dimensions=model["dimensions"],
+        labels=labels,
+        anchoring_info=model["anchoring"],
+        update_info=update_info,
+        normalizations=model["normalizations"],
+    )
+    return _impose_constraints(params, constraints)
+
+
+def _fill_measurement_params(
+    params, period_data, quasi_scores, period_info, normalizations, labels, period
+):
+    """Fill controls, loadings and meas_sds of one period.
+
+    Returns:
+        scores (pandas.DataFrame): Factor scores with one column per latent factor.
+        noise_vars (pandas.Series): Variance of the measurement noise in the scores.
+
+    """
+    controls = labels["controls"]
+    latent_factors = labels["latent_factors"]
+
+    control_coeffs, residuals = {}, {}
+    for meas in period_info.index:
+        y = period_data[meas].to_numpy()
+        x = period_data[controls].to_numpy()
+        control_coeffs[meas] = _ols(y, x)
+        residuals[meas] = y - x @ control_coeffs[meas]
+    residuals = pd.DataFrame(residuals)
+    cov = residuals.cov()
+
+    measured_factors = {
+        meas: [f for f in latent_factors if info[f]]
+        for meas, info in period_info.iterrows()
+    }
+    loadings = {meas: {} for meas in period_info.index}
+    meas_vars = {}
+    scores, noise_vars, means = {}, {}, {}
+    for factor in latent_factors:
+        single = [m for m, fs in measured_factors.items() if fs == [factor]]
+        single = [m for m in single if residuals[m].notnull().sum() > 1]
+        if not single:
+            quasi = quasi_scores[factor]
+            scores[factor] = (quasi - quasi.mean()) / quasi.std()
+            noise_vars[factor] = 0.0
+            means[factor] = 0.0
+            continue
+
+        sub_cov = cov.loc[single, single].to_numpy()
+        signs = np.sign(residuals[single].apply(lambda r: r.cov(quasi_scores[factor])))
+        signs = signs.replace(0, 1).to_numpy()
+        std_loadings = signs * _get_standardized_loadings(sub_cov)
+
+        loading_norm = normalizations[factor]["loadings"][period]
+        ref, ref_value = next(iter(loading_norm.items()), (None, None))
+        if ref in single and std_loadings[single.index(ref)] != 0:
+            factor_sd = std_loadings[single.index(ref)] / ref_value
+        else:
+            factor_sd = 1.0
+
+        for m, meas in enumerate(single):
+            loadings[meas][factor] = std_loadings[m] / factor_sd
+            meas_vars[meas] = sub_cov[m, m] - std_loadings[m] ** 2
+
+        scores[factor], noise_vars[factor] = _get_bartlett_scores(
+            residuals[single],
+            np.array([loadings[meas][factor] for meas in single]),
+            np.array([meas_vars[meas] for meas in single]),
+        )
+
+        intercept_norm = normalizations[factor]["intercepts"][period]
+        ref, ref_value = next(iter(intercept_norm.items()), (None, None))
+        if ref in single:
+            means[factor] = (control_coeffs[ref][0] - ref_value) / loadings[ref][factor]
+        else:
+            means[factor] = 0.0
+
+    scores = pd.DataFrame(scores)[latent_factors]
+    for meas, factors in measured_factors.items():
+        if meas in meas_vars:
+            continue
+        if residuals[meas].notnull().sum() <= 1:
+            # e.g. anchoring outcomes that are only observed in some periods
+            loadings[meas] = dict.fromkeys(factors, 1.0)
+            meas_vars[meas] = 1.0
+            continue
+        y = residuals[meas].to_numpy()
+        x = scores[factors].to_numpy()
+        score_noise_vars = np.array([noise_vars[f] for f in factors])
+        coeffs = _ols(y, x, score_noise_vars)
+        loadings[meas] = dict(zip(factors, coeffs))
+        meas_vars[meas] = _get_residual_variance(
+            y, x @ coeffs, coeffs**2 @ score_noise_vars
+        )
+
+    for meas in period_info.index:
+        coeffs = control_coeffs[meas].copy()
+        coeffs[0] -= sum(load * means[f] for f, load in loadings[meas].items())
+        for control, coeff in zip(controls, coeffs):
+            params.loc[("controls", period, meas, control), "value"] = coeff
+        for factor, loading in loadings[meas].items():
+            params.loc[("loadings", period, meas, factor), "value"] = loading
+        params.loc[("meas_sds", period, meas, "-"), "value"] = np.sqrt(meas_vars[meas])
+
+    return scores + pd.Series(means), pd.Series(noise_vars)
+
+
+def _get_standardized_loadings(cov):
+    """Calculate loadings of measurements of one factor with unit variance.
+
+    For three or more measurements, the squared loading of measurement j is the
+    median of cov(j, k) * cov(j, l) / cov(k, l) over all pairs of other measurements.
+
+    Args:
+        cov (numpy.ndarray): Covariance matrix of the measurements.
+
+    Returns:
+        numpy.ndarray: The absolute values of the loadings.
+
+    """
+    n_meas = len(cov)
+    variances = np.diag(cov)
+    if n_meas == 1:
+        squared = variances / 2
+    elif n_meas == 2:
+        squared = np.full(2, np.abs(cov[0, 1]))
+    else:
+        squared = np.zeros(n_meas)
+        for j in range(n_meas):
+            others = [k for k in range(n_meas) if k != j]
+            candidates = [
+                cov[j, k] * cov[j, l] / cov[k, l] for k, l in combinations(others, 2)
+            ]
+            squared[j] = np.nanmedian(candidates)
+    squared = np.clip(squared, 0, (1 - MIN_NOISE_SHARE) * variances)
+    return np.sqrt(squared)
+
+
+def _get_bartlett_scores(residuals, loadings, meas_vars):
+    """Calculate Bartlett factor scores from the available measurements.
+
+    Returns:
+        scores (pandas.Series): The scores of all individuals.
+        noise_var (float): Variance of the measurement noise of the scores if all
+            measurements are observed.
+
+    """
+    weights = loadings / meas_vars
+    observed = residuals.notnull().to_numpy()
+    numerator = (residuals.fillna(0).to_numpy() * weights).sum(axis=1)
+    denominator = (observed * weights * loadings).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(denominator > 0, numerator / denominator, np.nan)
+    noise_var = 1 / (weights * loadings).sum()
+    return pd.Series(scores, index=residuals.index), noise_var
+
+
+def _fill_initial_params(params, scores, noise_vars, n_mixtures):
+    """Fill initial_states, initial_cholcovs and mixture_weights."""
+    factors = scores.columns.tolist()
+    means = scores.mean().to_numpy()
+    cov = scores.cov().to_numpy()
+    variances = np.diag(cov) - noise_vars[factors].to_numpy()
+    cov[np.diag_indices_from(cov)] = np.maximum(
+        variances, MIN_NOISE_SHARE * np.diag(cov)
+    )
+    try:
+        chol = np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        chol = np.diag(np.sqrt(np.diag(cov)))
+
+    # spread the means of the first factor, such that they are increasing
+    offsets = (np.arange(n_mixtures) - (n_mixtures - 1) / 2) * 0.5 * chol[0, 0]
+    for emf in range(n_mixtures):
+        mixture = f"mixture_{emf}"
+        params.loc[("mixture_weights", 0, mixture, "-"), "value"] = 1 / n_mixtures
+        for f, factor in enumerate(factors):
+            offset = offsets[emf] if f == 0 else 0.0
+            params.loc[("initial_states", 0, mixture, factor), "value"] = (
+                means[f] + offset
+            )
+            for f2, factor2 in enumerate(factors[: f + 1]):
+                params.loc[
+                    ("initial_cholcovs", 0, mixture, f"{factor}-{factor2}"), "value"
+                ] = chol[f, f2]
+
+
+def _fill_transition_params(
+    params,
+    states,
+    noise_vars,
+    next_scores,
+    next_noise_vars,
+    transition_info,
+    labels,
+    period,
+):
+    """Fill transition and shock_sds parameters of one period."""
+    functions = dict(zip(labels["latent_factors"], labels["transition_names"]))
+    x = states.to_numpy()
+    state_noise_vars = {f: noise_vars.get(f, 0.0) for f in states.columns}
+    for factor, name in functions.items():
+        names = transition_info["param_names"][factor]
+        loc = [("transition", period, factor, n) for n in names]
+        sd_loc = ("shock_sds", period, factor, "-")
+        if name == "constant":
+            params.loc[sd_loc, "value"] = 0.0
+            continue
+
+        y = next_scores[factor].to_numpy()
+        if name in LINEAR_IN_PARAMS:
+            matrix_func = getattr(tf, f"matrix_{name}")
+            features = np.asarray(matrix_func(x, np.eye(len(names))))
+            feature_noise_vars = [state_noise_vars.get(n, 0.0) for n in names]
+            coeffs = _ols(y, features, feature_noise_vars)
+            predicted = features @ coeffs
+        elif name in ["log_ces", "log_ces_general"]:
+            slopes = _ols(
+                y,
+                np.column_stack([x, np.ones(len(x))]),
+                [*state_noise_vars.values(), 0.0],
+            )
+            gammas = np.clip(slopes[:-1], 0, None)
+            if gammas.sum() == 0:
+                gammas = np.ones(len(gammas))
+            gammas = gammas / gammas.sum()
+            if name == "log_ces":
+                coeffs = np.append(gammas, 0.5)
+            else:
+                coeffs = np.concatenate([gammas, np.ones(len(gammas)), [1.0]])
+            matrix_func = getattr(tf, f"matrix_{name}")
+            predicted = np.asarray(matrix_func(x, coeffs.reshape(-1, 1)))[:, 0]
+        else:
+            coeffs = np.full(len(names), 0.1)
+            predicted = np.full(len(y), np.nanmean(y))
+        params.loc[loc, "value"] = coeffs
+        resid_var = _get_residual_variance(y, predicted, next_noise_vars[factor])
+        params.loc[sd_loc, "value"] = np.sqrt(resid_var)
+
+
+def _ols(y, x, noise_vars=None):
+    """Regress y on x, using the observations without missing values.
+
+    If noise_vars is given, the regression is corrected for measurement noise with
+    these variances in the columns of x. If there are not enough observations, all
+    coefficients are zero.
+
+    """
+    keep = np.isfinite(y) & np.isfinite(x).all(axis=1)
+    if keep.sum() <= x.shape[1]:
+        return np.zeros(x.shape[1])
+    y, x = y[keep], x[keep]
+    if noise_vars is not None:
+        corrected = x.T @ x / len(y) - np.diag(noise_vars)
+        if np.all(np.linalg.eigvalsh(corrected) > 0):
+            return np.linalg.solve(corrected, x.T @ y / len(y))
+    return np.linalg.lstsq(x, y, rcond=None)[0]
+
+
+def _get_residual_variance(y, predicted, noise_var=0.0):
+    """Variance of the residuals net of noise_var, but at least a share of var(y)."""
+    residuals = y - predicted
+    keep = np.isfinite(residuals)
+    if keep.sum() < 2:
+        return 1.0
+    total_var = np.var(y[keep])
+    return max(np.var(residuals[keep]) - noise_var, MIN_NOISE_SHARE * total_var)
+
+
+def _impose_constraints(params, constraints):
+    """Make the start values consistent with the constraints of the model."""
+    params = params.copy()
+    by_type = {}
+    for constr in constraints:
+        by_type.setdefault(constr["type"], []).append(constr)
+
+    for constr in by_type.get("pairwise_equality", []):
+        blocks = [params.loc[loc, "value"].to_numpy() for loc in constr["locs"]]
+        mean = np.mean(blocks, axis=0)
+        for loc in constr["locs"]:
+            params.loc[loc, "value"] = mean
+
+    for constr in by_type.get("probability", []):
+        values = np.clip(params.loc[constr["loc"], "value"].to_numpy(), 0.01, None)
+        params.loc[constr["loc"], "value"] = values / values.sum()
+
+    for constr in by_type.get("increasing", []):
+        values = params.loc[constr["loc"], "value"].to_numpy()
+        params.loc[constr["loc"], "value"] = np.sort(values)
+
+    for constr in by_type.get("fixed", []):
+        params.loc[constr["loc"], "value"] = constr["value"]
+
+    return params
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.bootstrap import bootstrap
+from skillmodels.bootstrap import get_bootstrap_weights
+from skillmodels.bootstrap import get_weighted_maximization_inputs
+from skillmodels.likelihood_function import get_maximization_inputs
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    model_dict.pop("anchoring")
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage.csv").set_index(
+        ["category", "period", "name1", "name2"]
+    )
+    inputs = get_maximization_inputs(model_dict, data, free_params=True)
+    params = params.loc[inputs["params_template"].index]
+    return model_dict, data, params, inputs
+
+
+def test_bootstrap_weights():
+    weights = get_bootstrap_weights(n_obs=50, n_draws=3, seed=5)
+    assert weights.shape == (3, 50)
+    assert (weights.sum(axis=1) == 50).all()
+    assert (weights >= 0).all()
+
+
+def test_weighted_loglike_and_gradient(setup):
+    _, _, params, inputs = setup
+    x = inputs["free_params_from_params"](params)
+    loglike, gradient = inputs["free_loglike_and_gradient"](x)
+    n_obs = len(loglike["contributions"])
+    assert inputs["n_obs"] == n_obs
+
+    value, grad = inputs["free_weighted_loglike_and_gradient"](x, np.ones(n_obs))
+    assert value == pytest.approx(loglike["value"])
+    aaae(grad, gradient)
+
+    weights = get_bootstrap_weights(n_obs, n_draws=1, seed=1)[0]
+    weighted = get_weighted_maximization_inputs(inputs, weights)
+    value, _ = weighted["free_loglike_and_gradient"](x)
+    assert value["value"] == pytest.approx(weights @ loglike["contributions"])
+    assert weighted["free_loglike"](x)["value"] == pytest.approx(value["value"])
+
+
+def test_bootstrap_saves_and_loads_replications(setup, tmp_path):
+    model_dict, data, params, inputs = setup
+    kwargs = {
+        "n_draws": 2,
+        "algo_options": {"max_iterations": 1},
+        "output_dir": tmp_path,
+        "maximization_inputs": inputs,
+    }
+    res = bootstrap(model_dict, data, params, n_threads=2, **kwargs)
+    assert res["estimates"].shape == (2, len(params))
+    assert len(list(tmp_path.glob("draw_*.pickle"))) == 2
+    assert (res["standard_errors"] >= 0).all()
+
+    loaded = bootstrap(model_dict, data, params, **kwargs)
+    pd.testing.assert_frame_equal(res["estimates"], loaded["estimates"])
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.fit import fit
+from skillmodels.fit import get_jacobian_type
+from skillmodels.likelihood_function import get_maximization_inputs
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    model_dict.pop("anchoring")
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage.csv").set_index(
+        ["category", "period", "name1", "name2"]
+    )
+    inputs = get_maximization_inputs(model_dict, data, free_params=True)
+    params = params.loc[inputs["params_template"].index]
+    return model_dict, data, params, inputs
+
+
+def test_fit_increases_loglike_and_satisfies_constraints(setup):
+    model_dict, data, params, inputs = setup
+    res = fit(
+        model_dict,
+        data,
+        params,
+        algo_options={"max_iterations": 3},
+        maximization_inputs=inputs,
+    )
+    assert res["n_iterations"] == 3
+    assert res["value"] > inputs["loglike"](params)["value"]
+    assert res["value"] == pytest.approx(inputs["loglike"](res["params"])["value"])
+    assert np.isclose(res["params"].loc["mixture_weights", "value"].sum(), 1)
+    assert list(res["history"].index) == [0, 1, 2, 3]
+
+
+def test_fit_resumes_from_checkpoint(setup, tmp_path):
+    model_dict, data, params, inputs = setup
+    checkpoint_path = tmp_path / "checkpoint.pickle"
+    kwargs = {"maximization_inputs": inputs, "checkpoint_path": checkpoint_path}
+
+    fit(model_dict, data, params, algo_options={"max_iterations": 2}, **kwargs)
+    assert checkpoint_path.exists()
+    resumed = fit(model_dict, data, None, algo_options={"max_iterations": 4}, **kwargs)
+
+    uninterrupted = fit(
+        model_dict,
+        data,
+        params,
+        algo_options={"max_iterations": 4},
+        maximization_inputs=inputs,
+    )
+    assert resumed["n_iterations"] == 4
+    aaae(resumed["free_params"], uninterrupted["free_params"])
+
+    with pytest.raises(ValueError):
+        fit(model_dict, data, params, algorithm="bhhh", **kwargs)
+
+
+@pytest.mark.parametrize(
+    "algorithm, expected", [("bhhh", "jacfwd"), ("lbfgs", "jacrev")]
+)
+def test_get_jacobian_type(algorithm, expected):
+    assert get_jacobian_type(algorithm) == expected
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.free_params import free_params_from_params
+from skillmodels.free_params import get_free_params_info
+from skillmodels.free_params import params_from_free_params
+
+config.update("jax_enable_x64", True)
+
+
+@pytest.fixture
+def params_template():
+    ind_tups = [
+        ("controls", 0, "y1", "constant"),
+        ("loadings", 0, "y1", "fac1"),
+        ("loadings", 0, "y2", "fac1"),
+        ("meas_sds", 0, "y1", "-"),
+        ("shock_sds", 0, "fac1", "-"),
+        ("shock_sds", 1, "fac1", "-"),
+        ("initial_states", 0, "mixture_0", "fac1"),
+        ("initial_states", 0, "mixture_1", "fac1"),
+        ("mixture_weights", 0, "mixture_0", "-"),
+        ("mixture_weights", 0, "mixture_1", "-"),
+        ("transition", 0, "fac1", "fac1"),
+        ("transition", 0, "fac1", "fac2"),
+        ("transition", 1, "fac1", "fac1"),
+        ("transition", 1, "fac1", "fac2"),
+    ]
+    index = pd.MultiIndex.from_tuples(
+        ind_tups, names=["category", "period", "name1", "name2"]
+    )
+    df = pd.DataFrame(index=index)
+    df["lower_bound"] = -np.inf
+    df.loc[["meas_sds", "shock_sds"], "lower_bound"] = 0.001
+    return df
+
+
+@pytest.fixture
+def constraints():
+    constr = [
+        {
+            "loc": [("loadings", 0, "y1", "fac1"), ("controls", 0, "y1", "constant")],
+            "type": "fixed",
+            "value": [1, 0],
+        },
+        {"loc": "mixture_weights", "type": "probability"},
+        {"locs": [("transition", 0), ("transition", 1)], "type": "pairwise_equality"},
+        {"locs": [("shock_sds", 0), ("shock_sds", 1)], "type": "pairwise_equality"},
+        {"loc": ("transition", 0, "fac1"), "type": "probability"},
+        {"loc": ("transition", 1, "fac1"), "type": "probability"},
+        {"loc": ("initial_states", 0), "type": "increasing"},
+    ]
+    return constr
+
+
+def test_free_params_template(params_template, constraints):
+    info = get_free_params_info(params_template, constraints)
+    expected_index = [
+        ("loadings", 0, "y2", "fac1"),
+        ("meas_sds", 0, "y1", "-"),
+        ("shock_sds", 0, "fac1", "-"),
+        ("mixture_weights", 0, "mixture_1", "-"),
+        ("transition", 0, "fac1", "fac2"),
+        ("initial_states", 0, "mixture_0", "fac1"),
+        ("initial_states", 0, "mixture_1", "fac1"),
+    ]
+    calculated = info["free_params_template"]
+    assert calculated.index.tolist() == expected_index
+    aaae(calculated["lower_bound"], [-np.inf, 0.001, 0.001] + [-np.inf] * 4)
+
+
+def test_params_from_free_params_satisfies_constraints(params_template, constraints):
+    info = get_free_params_info(params_template, constraints)
+    free = np.random.default_rng(0).normal(size=len(info["free_params_template"]))
+    params = pd.Series(
+        np.array(params_from_free_params(free, info)), index=params_template.index
+    )
+
+    assert params[("loadings", 0, "y1", "fac1")] == 1
+    assert params[("controls", 0, "y1", "constant")] == 0
+    aaae(params.loc["mixture_weights"].sum(), 1)
+    aaae(params.loc[("transition", 0)], params.loc[("transition", 1)])
+    aaae(params.loc[("transition", 0)].sum(), 1)
+    aaae(params.loc[("shock_sds", 0)], params.loc[("shock_sds", 1)])
+    assert np.all(np.diff(params.loc["initial_states"]) > 0)
+
+
+def test_free_params_round_trip(params_template, constraints):
+    info = get_free_params_info(params_template, constraints)
+    free = np.random.default_rng(1).normal(size=len(info["free_params_template"]))
+    params = np.array(params_from_free_params(free, info))
+    aaae(free_params_from_params(params, info), free)
+
+
+def test_unsupported_constraint_type(params_template):
+    constr = [{"loc": "mixture_weights", "type": "covariance"}]
+    with pytest.raises(ValueError):
+        get_free_params_info(params_template, constr)
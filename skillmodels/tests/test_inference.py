@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.inference import _get_columns
+from skillmodels.inference import standard_errors
+from skillmodels.likelihood_function import get_maximization_inputs
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture(scope="module")
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    model_dict.pop("anchoring")
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    data = data.loc[data.index.get_level_values("caseid").unique()[:400]]
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage.csv").set_index(
+        ["category", "period", "name1", "name2"]
+    )
+    inputs = get_maximization_inputs(
+        model_dict, data, jacobian_type="jacfwd", free_params=True
+    )
+    params = params.loc[inputs["params_template"].index]
+    return model_dict, data, params, inputs
+
+
+def test_jacobian_fisher_and_hessian_products(setup):
+    _, _, params, inputs = setup
+    x = inputs["free_params_from_params"](params)
+
+    jacobian = _get_columns(inputs["free_jacobian_products"], x, chunk_size=7)
+    aaae(jacobian, inputs["free_jacobian"](x))
+
+    outer_product = _get_columns(inputs["free_fisher_products"], x, chunk_size=7)
+    aaae(outer_product, jacobian.T @ jacobian)
+
+    vector = np.random.default_rng(0).normal(size=len(x))
+    eps = 1e-6
+    expected = (
+        inputs["free_gradient"](x + eps * vector)
+        - inputs["free_gradient"](x - eps * vector)
+    ) / (2 * eps)
+    calculated = inputs["free_hessian_products"](x, vector.reshape(-1, 1))[:, 0]
+    aaae(calculated / np.abs(expected).max(), expected / np.abs(expected).max())
+
+
+def test_standard_errors(setup):
+    model_dict, data, params, inputs = setup
+    res = standard_errors(model_dict, data, params, maximization_inputs=inputs)
+
+    ses = res["standard_errors"]
+    assert list(ses.columns) == ["sandwich", "opg", "hessian"]
+    assert ses.index.equals(params.index)
+    assert np.isfinite(ses.to_numpy()).all()
+
+    x = inputs["free_params_from_params"](params)
+    jacobian = inputs["free_jacobian"](x)
+    to_params = inputs["params_from_free_params_jacobian"](x)
+    expected_cov_opg = to_params @ np.linalg.inv(jacobian.T @ jacobian) @ to_params.T
+    expected_opg = np.sqrt(np.clip(np.diag(expected_cov_opg), 0, None))
+    # the opg is close to singular for some poorly identified parameters of the
+    # small sample, so only the well identified parameters can be compared
+    opg = ses["opg"].to_numpy()
+    well_identified = (expected_opg < 10) & (opg < 10)
+    assert well_identified.mean() > 0.8
+    np.testing.assert_allclose(
+        opg[well_identified], expected_opg[well_identified], rtol=1e-4
+    )
+
+    # the first loadings are normalized to one
+    assert (ses.loc[("loadings", 0, "y1", "fac1")] == 0).all()
+    # parameters of periods in the same stage are equal
+    aaae(
+        ses.loc[("transition", 0, "fac1")].to_numpy(),
+        ses.loc[("transition", 1, "fac1")].to_numpy(),
+    )
+
+
+def test_standard_errors_of_requested_type(setup):
+    model_dict, data, params, inputs = setup
+    res = standard_errors(
+        model_dict, data, params, maximization_inputs=inputs, types=("hessian",)
+    )
+    assert list(res["standard_errors"].columns) == ["hessian"]
+    assert set(res) == {"standard_errors", "cov_hessian"}
+
+    x = inputs["free_params_from_params"](params)
+    hessian = _get_columns(inputs["free_hessian_products"], x, chunk_size=10)
+    to_params = inputs["params_from_free_params_jacobian"](x)
+    expected_cov = to_params @ np.linalg.inv(-(hessian + hessian.T) / 2) @ to_params.T
+    aaae(res["cov_hessian"].to_numpy(), expected_cov)
+
+
+def test_standard_errors_with_invalid_type(setup):
+    model_dict, data, params, inputs = setup
+    with pytest.raises(ValueError, match="Invalid standard error types"):
+        standard_errors(
+            model_dict, data, params, maximization_inputs=inputs, types=("robust",)
+        )
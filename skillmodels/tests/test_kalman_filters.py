@@ -12,6 +12,7 @@ from numpy.testing import assert_array_almost_equal as aaae
 from skillmodels.kalman_filters import _calculate_sigma_points
 from skillmodels.kalman_filters import calculate_sigma_scaling_factor_and_weights
 from skillmodels.kalman_filters import kalman_predict
+from skillmodels.kalman_filters import kalman_smooth
 from skillmodels.kalman_filters import kalman_update
 from skillmodels.kalman_filters import transform_sigma_points
 
@@ -126,6 +127,45 @@ def test_kalman_update_with_missing():
     assert calc_weights.shape == weights.shape
 
 
+# ======================================================================================
+# Test Kalman Update with states that are the same for all individuals
+# ======================================================================================
+
+
+def test_kalman_update_with_broadcast_states():
+    np.random.seed(0)
+    n_obs, n_mixtures, n_states = 4, 2, 3
+    state, cov = _random_state_and_covariance(dim=n_states)
+    states = jnp.array(np.full((1, n_mixtures, n_states), state))
+    chols = jnp.array(
+        np.full((1, n_mixtures, n_states, n_states), np.linalg.cholesky(cov).T)
+    )
+    weights = jnp.log(jnp.full((1, n_mixtures), 0.5))
+
+    kwargs = {
+        "loadings": jnp.array([1, 0.5, 0.2]),
+        "control_params": jnp.ones(2),
+        "meas_sd": 0.5,
+        "measurements": jnp.array([1, np.nan, 3, 4]),
+        "controls": jnp.ones((n_obs, 2)) * 0.5,
+        "debug": False,
+    }
+
+    calculated = kalman_update(
+        states=states, upper_chols=chols, log_mixture_weights=weights, **kwargs
+    )
+    expected = kalman_update(
+        states=jnp.repeat(states, n_obs, axis=0),
+        upper_chols=jnp.repeat(chols, n_obs, axis=0),
+        log_mixture_weights=jnp.repeat(weights, n_obs, axis=0),
+        **kwargs,
+    )
+
+    for calc, exp in zip(calculated[:4], expected[:4]):
+        assert calc.shape == exp.shape
+        aaae(calc, exp)
+
+
 # ======================================================================================
 # test generation of sigma points
 # ======================================================================================
@@ -135,15 +175,10 @@ def test_kalman_update_with_missing():
 def test_sigma_points(seed):
     np.random.seed(seed)
     state, cov = _random_state_and_covariance()
-    observed_factors = np.arange(2).reshape(1, 2)
     expected = JulierSigmaPoints(n=len(state), kappa=2).sigma_points(state, cov)
-    observed_part = np.tile(observed_factors, len(expected)).reshape(-1, 2)
-    expected = np.hstack([expected, observed_part])
     sm_state, sm_chol = _convert_predict_inputs_from_filterpy_to_skillmodels(state, cov)
     scaling_factor = np.sqrt(len(state) + 2)
-    calculated = _calculate_sigma_points(
-        sm_state, sm_chol, scaling_factor, observed_factors
-    )
+    calculated = _calculate_sigma_points(sm_state, sm_chol, scaling_factor)
     aaae(calculated.reshape(expected.shape), expected)
 
 
@@ -175,28 +210,31 @@ def test_sigma_scaling_factor_and_weights(seed):
 def test_transformation_of_sigma_points():
     sp = jnp.arange(10).reshape(1, 1, 5, 2) + 1
 
-    def f(params, states):
-        out = jnp.column_stack(
-            [(states * params["fac1"][0]).sum(axis=1), states[..., 1]]
+    def f(params, states, observed_factors):
+        out = jnp.stack(
+            [(states * params["fac1"][0]).sum(axis=-1), states[..., 1]], axis=-1
         )
-        return out
+        return out + observed_factors[:, None, :1]
 
-    transition_info = {
-        "func": f,
-        "columns": {"fac2": 1},
-        "order": ["states", "fac2", "params"],
-    }
+    transition_info = {"func": f}
 
     trans_coeffs = {"fac1": jnp.array([2]), "fac2": jnp.array([])}
 
-    anch_scaling = jnp.array([[1, 1], [2, 1]])
+    anch_scaling = jnp.array([[1, 1, 1], [2, 1, 1]])
+
+    anch_constants = np.array([[0, 0, 0], [0, 0, 0]])
 
-    anch_constants = np.array([[0, 0], [0, 0]])
+    observed_factors = jnp.array([[2]])
 
-    expected = jnp.array([[[[3, 2], [7, 4], [11, 6], [15, 8], [19, 10]]]])
+    expected = jnp.array([[[[4, 4], [8, 6], [12, 8], [16, 10], [20, 12]]]])
 
     calculated = transform_sigma_points(
-        sp, transition_info, trans_coeffs, anch_scaling, anch_constants
+        sp,
+        transition_info,
+        trans_coeffs,
+        anch_scaling,
+        anch_constants,
+        observed_factors,
     )
 
     aaae(calculated, expected)
@@ -232,17 +270,15 @@ def test_predict_against_linear_filterpy(seed):
     def linear(params, states):
         return np.dot(states, params)
 
-    def transition_function(params, states):
-        out = jnp.column_stack([linear(params[f"fac{i}"], states) for i in range(dim)])
+    def transition_function(params, states, observed_factors):
+        out = jnp.stack(
+            [linear(params[f"fac{i}"], states) for i in range(dim)], axis=-1
+        )
         return out
 
     sm_state, sm_chol = _convert_predict_inputs_from_filterpy_to_skillmodels(state, cov)
     scaling_factor, weights = calculate_sigma_scaling_factor_and_weights(dim, 2)
-    transition_info = {
-        "func": transition_function,
-        "columns": {},
-        "order": ["states", "params"],
-    }
+    transition_info = {"func": transition_function}
     trans_coeffs = {f"fac{i}": jnp.array(trans_mat[i]) for i in range(dim)}
     anch_scaling = jnp.ones((2, dim))
     anch_constants = jnp.zeros((2, dim))
@@ -265,6 +301,137 @@ def test_predict_against_linear_filterpy(seed):
     aaae(calc_chols[0, 0].T @ calc_chols[0, 0], expected_cov)
 
 
+# ======================================================================================
+# test predict with constant factors against predict that transforms all factors
+# ======================================================================================
+
+
+@pytest.mark.parametrize(
+    "seed, inputs_type", list(product(SEEDS, ["all", "leading", "random"]))
+)
+def test_predict_with_constant_factors(seed, inputs_type):
+    np.random.seed(seed)
+    n_obs, n_mixtures, dim = 3, 2, np.random.randint(low=1, high=6)
+    state, cov = _random_state_and_covariance(dim)
+    states = jnp.array(state + np.random.normal(size=(n_obs, n_mixtures, dim)))
+    upper_chols = jnp.array(
+        np.broadcast_to(scipy.linalg.cholesky(cov), (n_obs, n_mixtures, dim, dim))
+    )
+    constant = sorted(np.random.choice(dim, np.random.randint(1, dim + 1), False))
+    dynamic = [i for i in range(dim) if i not in constant]
+    trans_mat = np.random.uniform(low=-1, high=1, size=(dim, dim + 1))
+
+    # with inputs that are not the leading factors, the sigma points of the constant
+    # factor path differ from the ones of the generic path. Both only give the same
+    # result for linear transition functions.
+    if inputs_type == "all":
+        inputs, activation = list(range(dim)), jnp.tanh
+    elif inputs_type == "leading":
+        inputs, activation = list(range(np.random.randint(dim))), jnp.tanh
+    else:
+        inputs = sorted(np.random.choice(dim, np.random.randint(dim), False))
+        activation = jnp.positive
+
+    def _next_factor(params, states, observed_factors, i):
+        if i in constant:
+            return states[..., i]
+        return (
+            activation(states[..., inputs]) @ params[f"fac{i}"][: len(inputs)]
+            + observed_factors[:, None, 0] * params[f"fac{i}"][dim]
+        )
+
+    def transition_function(params, states, observed_factors):
+        out = [_next_factor(params, states, observed_factors, i) for i in range(dim)]
+        return jnp.stack(out, axis=-1)
+
+    def dynamic_function(params, states, observed_factors):
+        out = [_next_factor(params, states, observed_factors, i) for i in dynamic]
+        return jnp.stack(out, axis=-1)
+
+    scaling_factor, weights = calculate_sigma_scaling_factor_and_weights(dim, 2)
+    kwargs = {
+        "sigma_scaling_factor": scaling_factor,
+        "sigma_weights": weights,
+        "trans_coeffs": {f"fac{i}": jnp.array(trans_mat[i]) for i in range(dim)},
+        "shock_sds": jnp.array(np.random.uniform(size=dim)),
+        "anchoring_scaling_factors": jnp.array(
+            np.random.uniform(low=0.5, high=2, size=(2, dim + 1))
+        ),
+        "anchoring_constants": jnp.array(np.random.normal(size=(2, dim + 1))),
+        "observed_factors": jnp.array(np.random.normal(size=(n_obs, 1))),
+    }
+
+    expected_states, expected_chols = kalman_predict(
+        states, upper_chols, transition_info={"func": transition_function}, **kwargs
+    )
+    transition_info = {
+        "func": transition_function,
+        "dynamic_func": dynamic_function if dynamic else None,
+        "constant_factors": constant,
+        "dynamic_inputs": None if inputs_type == "all" else inputs,
+    }
+    calc_states, calc_chols = kalman_predict(
+        states, upper_chols, transition_info=transition_info, **kwargs
+    )
+
+    aaae(calc_states, expected_states)
+    aaae(
+        np.swapaxes(calc_chols, -1, -2) @ calc_chols,
+        np.swapaxes(expected_chols, -1, -2) @ expected_chols,
+    )
+    aaae(np.tril(calc_chols, k=-1), 0)
+
+
+# ======================================================================================
+# test smoothing step against linear rts smoother from filterpy
+# ======================================================================================
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_smooth_against_linear_filterpy(seed):
+    np.random.seed(seed)
+    state, cov = _random_state_and_covariance()
+    dim = len(state)
+    next_state, next_cov = _random_state_and_covariance(dim)
+    trans_mat = np.random.uniform(low=-1, high=1, size=(dim, dim))
+    shock_sds = 0.5 * np.arange(dim) / dim
+
+    fp_filter = KalmanFilter(dim_x=dim, dim_z=1)
+    expected_states, expected_covs, *_ = fp_filter.rts_smoother(
+        np.stack([state, next_state]),
+        np.stack([cov, next_cov]),
+        Fs=[trans_mat] * 2,
+        Qs=[np.diag(shock_sds**2)] * 2,
+    )
+
+    def transition_function(params, states, observed_factors):
+        return jnp.stack([states @ params[f"fac{i}"] for i in range(dim)], axis=-1)
+
+    sm_state, sm_chol = _convert_predict_inputs_from_filterpy_to_skillmodels(state, cov)
+    sm_next_state, sm_next_chol = _convert_predict_inputs_from_filterpy_to_skillmodels(
+        next_state, next_cov
+    )
+    scaling_factor, weights = calculate_sigma_scaling_factor_and_weights(dim, 2)
+
+    calc_states, calc_chols = kalman_smooth(
+        sm_state,
+        sm_chol,
+        sm_next_state,
+        sm_next_chol,
+        scaling_factor,
+        weights,
+        {"func": transition_function},
+        {f"fac{i}": jnp.array(trans_mat[i]) for i in range(dim)},
+        jnp.array(shock_sds),
+        jnp.ones((2, dim)),
+        jnp.zeros((2, dim)),
+        jnp.zeros((1, 0)),
+    )
+
+    aaae(calc_states.flatten(), expected_states[0])
+    aaae(calc_chols[0, 0].T @ calc_chols[0, 0], expected_covs[0])
+
+
 # ======================================================================================
 # Helper function to generate inputs and convert them between filterpy and skillmodels
 # ======================================================================================
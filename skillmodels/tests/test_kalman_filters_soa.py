@@ -0,0 +1,166 @@
+"""Test the soa Kalman filters against the standard Kalman filters."""
+from functools import partial
+from itertools import product
+
+import jax.numpy as jnp
+import numpy as np
+import pytest
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.kalman_filters import _calculate_sigma_points
+from skillmodels.kalman_filters import calculate_sigma_scaling_factor_and_weights
+from skillmodels.kalman_filters import kalman_predict
+from skillmodels.kalman_filters import kalman_update
+from skillmodels.kalman_filters_soa import _calculate_sigma_points_soa
+from skillmodels.kalman_filters_soa import kalman_predict_soa
+from skillmodels.kalman_filters_soa import kalman_update_soa
+from skillmodels.kalman_filters_soa import to_soa_layout
+from skillmodels.kalman_filters_soa import upper_triangular_factor_soa
+
+config.update("jax_enable_x64", True)
+
+SEEDS = range(10)
+
+
+def _random_states_and_upper_chols(n_obs, n_mixtures, n_states, rng):
+    states = rng.uniform(low=-5, high=5, size=(n_obs, n_mixtures, n_states))
+    factorized = rng.uniform(low=-1, high=3, size=(n_obs, n_mixtures, n_states, 10))
+    covs = factorized @ np.swapaxes(factorized, -1, -2) * 0.5 + np.eye(n_states)
+    upper_chols = np.swapaxes(np.linalg.cholesky(covs), -1, -2)
+    return jnp.array(states), jnp.array(upper_chols)
+
+
+def _to_covs(upper_chols):
+    return np.swapaxes(upper_chols, -1, -2) @ upper_chols
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_upper_triangular_factor_soa(seed):
+    rng = np.random.default_rng(seed)
+    arr = rng.normal(size=(7, 4, 3))
+    expected = np.stack([np.linalg.qr(arr[..., i])[1] for i in range(3)], axis=-1)
+    calculated = upper_triangular_factor_soa(jnp.array(arr))
+    aaae(np.abs(calculated), np.abs(expected))
+    aaae(np.tril(np.moveaxis(calculated, -1, 0), k=-1), 0)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_kalman_update_soa_against_kalman_update(seed):
+    rng = np.random.default_rng(seed)
+    n_obs, n_mixtures, n_states = 6, 2, rng.integers(low=1, high=6)
+    states, upper_chols = _random_states_and_upper_chols(
+        n_obs, n_mixtures, n_states, rng
+    )
+    measurements = rng.normal(size=n_obs)
+    measurements[1] = np.nan
+    log_weights = jnp.log(jnp.full((n_obs, n_mixtures), 0.5))
+
+    kwargs = {
+        "loadings": jnp.array(rng.uniform(size=n_states)),
+        "control_params": jnp.ones(2),
+        "meas_sd": 0.7,
+        "measurements": jnp.array(measurements),
+        "controls": jnp.ones((n_obs, 2)) * 0.5,
+        "debug": True,
+    }
+
+    expected = kalman_update(
+        states=states,
+        upper_chols=upper_chols,
+        log_mixture_weights=log_weights,
+        **kwargs,
+    )
+
+    soa_states, soa_chols, soa_weights = to_soa_layout(states, upper_chols, log_weights)
+    calculated = kalman_update_soa(
+        states=soa_states,
+        upper_chols=soa_chols,
+        log_mixture_weights=soa_weights,
+        **kwargs,
+    )
+
+    aaae(np.moveaxis(calculated[0], -1, 0), expected[0])
+    aaae(_to_covs(np.moveaxis(calculated[1], -1, 0)), _to_covs(expected[1]))
+    aaae(calculated[2].T, expected[2])
+    aaae(calculated[3], expected[3])
+    for key in ["residuals", "residual_sds"]:
+        aaae(calculated[4][key].T, expected[4][key])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_sigma_points_soa_against_sigma_points(seed):
+    rng = np.random.default_rng(seed)
+    n_obs, n_mixtures, n_states = 4, 2, rng.integers(low=1, high=6)
+    states, upper_chols = _random_states_and_upper_chols(
+        n_obs, n_mixtures, n_states, rng
+    )
+
+    expected = _calculate_sigma_points(states, upper_chols, 1.5)
+
+    soa_states, soa_chols, _ = to_soa_layout(
+        states, upper_chols, jnp.zeros((n_obs, n_mixtures))
+    )
+    calculated = _calculate_sigma_points_soa(soa_states, soa_chols, 1.5)
+
+    aaae(np.moveaxis(calculated, -1, 0), expected)
+
+
+@pytest.mark.parametrize(
+    "seed, constant_factors, dynamic_inputs",
+    product(SEEDS, [[], [0]], [None, [0]]),
+)
+def test_kalman_predict_soa_against_kalman_predict(
+    seed, constant_factors, dynamic_inputs
+):
+    rng = np.random.default_rng(seed)
+    n_obs, n_mixtures, n_states = 5, 2, rng.integers(low=1, high=6)
+    states, upper_chols = _random_states_and_upper_chols(
+        n_obs, n_mixtures, n_states, rng
+    )
+    trans_mat = rng.uniform(low=-1, high=1, size=(n_states, n_states + 1))
+
+    def transition_function(params, states, observed_factors, factors=None):
+        factors = range(n_states) if factors is None else factors
+        all_states = jnp.concatenate(
+            [
+                states,
+                jnp.broadcast_to(observed_factors[:, None], (*states.shape[:2], 1)),
+            ],
+            axis=-1,
+        )
+        out = jnp.stack(
+            [jnp.tanh(all_states) @ params[f"fac{i}"] for i in factors],
+            axis=-1,
+        )
+        return out
+
+    dynamic = [i for i in range(n_states) if i not in constant_factors]
+    scaling_factor, weights = calculate_sigma_scaling_factor_and_weights(n_states, 2)
+    kwargs = {
+        "sigma_scaling_factor": scaling_factor,
+        "sigma_weights": weights,
+        "transition_info": {
+            "func": transition_function,
+            "dynamic_func": partial(transition_function, factors=dynamic),
+            "constant_factors": constant_factors,
+            "dynamic_inputs": dynamic_inputs,
+        },
+        "trans_coeffs": {f"fac{i}": jnp.array(trans_mat[i]) for i in range(n_states)},
+        "shock_sds": jnp.array(0.5 * (1 + np.arange(n_states)) / n_states),
+        "anchoring_scaling_factors": jnp.array(
+            rng.uniform(low=0.5, high=2, size=(2, n_states + 1))
+        ),
+        "anchoring_constants": jnp.array(rng.normal(size=(2, n_states + 1))),
+        "observed_factors": jnp.array(rng.normal(size=(n_obs, 1))),
+    }
+
+    expected_states, expected_chols = kalman_predict(states, upper_chols, **kwargs)
+
+    soa_states, soa_chols, _ = to_soa_layout(
+        states, upper_chols, jnp.zeros((n_obs, n_mixtures))
+    )
+    calc_states, calc_chols = kalman_predict_soa(soa_states, soa_chols, **kwargs)
+
+    aaae(np.moveaxis(calc_states, -1, 0), expected_states)
+    aaae(_to_covs(np.moveaxis(calc_chols, -1, 0)), _to_covs(expected_chols))
@@ -1,7 +1,10 @@
 import jax.numpy as jnp
 import numpy as np
+import pandas as pd
+from numpy.testing import assert_array_equal as aae
 
 from skillmodels.likelihood_function import _to_numpy
+from skillmodels.likelihood_function import get_attrition_info
 
 
 def test_to_numpy_with_dict():
@@ -19,3 +22,25 @@ def test_to_numpy_one_array():
 def test_to_numpy_one_float():
     calculated = _to_numpy(3.5)
     assert isinstance(calculated, float)
+
+
+def test_get_attrition_info():
+    index = pd.MultiIndex.from_tuples(
+        [(0, "m1"), (0, "m2"), (1, "m1"), (2, "m1")], names=["period", "variable"]
+    )
+    update_info = pd.DataFrame(index=index)
+    nan = np.nan
+    measurements = jnp.array(
+        [
+            [1, nan, 1, nan],
+            [nan, nan, 1, 1],
+            [1, nan, nan, nan],
+            [nan, nan, nan, 1],
+        ]
+    )
+
+    calculated = get_attrition_info(measurements, update_info)
+
+    aae(calculated["order"], [3, 0, 2, 1])
+    aae(calculated["inverse_order"], [1, 3, 2, 0])
+    assert calculated["segments"] == [(0, 2, 3), (2, 3, 2), (3, 4, 1)]
@@ -1,4 +1,5 @@
 import json
+from itertools import product
 from pathlib import Path
 
 import numpy as np
@@ -22,6 +23,8 @@ model_names = [
     "one_stage_anchoring_custom_functions",
 ]
 
+LAYOUTS = ["aos", "soa"]
+
 # importing the TEST_DIR from config does not work for test run in conda build
 TEST_DIR = Path(__file__).parent.resolve()
 
@@ -69,10 +72,15 @@ def _convert_model(base_model, model_name):
     return model
 
 
-@pytest.mark.parametrize("model_name", model_names)
-def test_likelihood_contributions_have_not_changed(model2, model2_data, model_name):
+@pytest.mark.parametrize(
+    "model_name, memory_layout", list(product(model_names, LAYOUTS))
+)
+def test_likelihood_contributions_have_not_changed(
+    model2, model2_data, model_name, memory_layout
+):
     regvault = TEST_DIR / "regression_vault"
     model = _convert_model(model2, model_name)
+    model["estimation_options"]["memory_layout"] = memory_layout
     params = pd.read_csv(regvault / f"{model_name}.csv").set_index(
         ["category", "period", "name1", "name2"]
     )
@@ -119,8 +127,10 @@ def test_likelihood_runs_with_too_long_data(model2, model2_data):
     debug_loglike(params)
 
 
-def test_likelihood_runs_with_observed_factors(model2, model2_data):
+@pytest.mark.parametrize("n_mixtures", [1, 2])
+def test_likelihood_runs_with_observed_factors(model2, model2_data, n_mixtures):
     model2["observed_factors"] = ["ob1", "ob2"]
+    model2["estimation_options"]["n_mixtures"] = n_mixtures
     model2_data["ob1"] = np.arange(len(model2_data))
     model2_data["ob2"] = np.ones(len(model2_data))
     func_dict = get_maximization_inputs(model2, model2_data)
@@ -130,3 +140,112 @@ def test_likelihood_runs_with_observed_factors(model2, model2_data):
 
     debug_loglike = func_dict["debug_loglike"]
     debug_loglike(params)
+
+
+def test_likelihood_contributions_with_attrition(model2, model2_data):
+    model = _convert_model(model2, "one_stage_anchoring")
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    data = model2_data.copy()
+    ids = data.index.get_level_values("caseid")
+    drop_out = np.random.default_rng(0).integers(0, 9, ids.max() + 1)
+    is_dropped = data.index.get_level_values("period") >= drop_out[ids.astype(int)]
+    measurements = [f"y{i}" for i in range(1, 10)] + ["Q1"]
+    data.loc[is_dropped, measurements] = np.nan
+
+    func_dict = get_maximization_inputs(model, data)
+    params = params.loc[func_dict["params_template"].index]
+
+    # the debug loglike filters all individuals through all periods
+    expected = func_dict["debug_loglike"](params)["contributions"]
+    calculated = func_dict["loglike"](params)["contributions"]
+
+    aaae(calculated, expected)
+    assert (calculated != 0).any()
+
+
+@pytest.mark.parametrize("memory_layout", LAYOUTS)
+def test_incremental_loglike_matches_loglike(model2, model2_data, memory_layout):
+    model = _convert_model(model2, "one_stage_anchoring")
+    model["estimation_options"]["memory_layout"] = memory_layout
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    data = model2_data.copy()
+    ids = data.index.get_level_values("caseid")
+    drop_out = np.random.default_rng(0).integers(3, 9, ids.max() + 1)
+    is_dropped = data.index.get_level_values("period") >= drop_out[ids.astype(int)]
+    measurements = [f"y{i}" for i in range(1, 10)] + ["Q1"]
+    data.loc[is_dropped, measurements] = np.nan
+
+    func_dict = get_maximization_inputs(model, data)
+    params = params.loc[func_dict["params_template"].index]
+
+    changes = [
+        None,
+        ("transition", 6, "fac1", "fac1"),
+        ("loadings", 5, "Q1_fac1", "fac1"),
+        ("meas_sds", 3, "y2", "-"),
+        None,
+        ("initial_states", 0, "mixture_0", "fac2"),
+        ("transition", 6, "fac1", "fac1"),
+    ]
+    for loc in changes:
+        if loc is not None:
+            params.loc[loc, "value"] += 0.05
+        expected = func_dict["loglike"](params)
+        calculated = func_dict["incremental_loglike"](params)
+        assert calculated["value"] == pytest.approx(expected["value"])
+        aaae(calculated["contributions"], expected["contributions"])
+
+
+@pytest.mark.parametrize("model_name", model_names)
+def test_free_params_loglike_matches_loglike(model2, model2_data, model_name):
+    regvault = TEST_DIR / "regression_vault"
+    model = _convert_model(model2, model_name)
+    params = pd.read_csv(regvault / f"{model_name}.csv").set_index(
+        ["category", "period", "name1", "name2"]
+    )
+
+    func_dict = get_maximization_inputs(model, model2_data, free_params=True)
+    params = params.loc[func_dict["params_template"].index]
+
+    free_params = func_dict["free_params_from_params"](params)
+    assert len(free_params) == len(func_dict["free_params_template"])
+    assert len(free_params) < len(params)
+
+    aaae(func_dict["params_from_free_params"](free_params)["value"], params["value"])
+    aaae(
+        func_dict["free_loglike"](free_params)["contributions"],
+        func_dict["loglike"](params)["contributions"],
+    )
+
+
+def test_hessian_and_fisher_vector_products(model2, model2_data):
+    regvault = TEST_DIR / "regression_vault"
+    model = _convert_model(model2, "one_stage_anchoring")
+    caseids = model2_data.index.get_level_values("caseid").unique()[:100]
+    data = model2_data.loc[caseids]
+    params = pd.read_csv(regvault / "one_stage_anchoring.csv").set_index(
+        ["category", "period", "name1", "name2"]
+    )
+
+    func_dict = get_maximization_inputs(model, data, jacobian_type="jacfwd")
+    params = params.loc[func_dict["params_template"].index]
+    vector = np.random.default_rng(0).normal(size=len(params))
+
+    jacobian = func_dict["jacobian"](params)
+    aaae(
+        func_dict["fisher_vector_product"](params, vector),
+        jacobian.T @ (jacobian @ vector),
+    )
+
+    eps = 1e-6
+    upper, lower = params.copy(), params.copy()
+    upper["value"] += eps * vector
+    lower["value"] -= eps * vector
+    expected = (func_dict["gradient"](upper) - func_dict["gradient"](lower)) / (2 * eps)
+    calculated = func_dict["hessian_vector_product"](params, vector)
+    scale = np.abs(expected).max()
+    aaae(calculated / scale, expected / scale)
@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.monte_carlo import get_monte_carlo_statistics
+from skillmodels.monte_carlo import get_simulated_estimation_data
+from skillmodels.monte_carlo import run_monte_carlo
+from skillmodels.simulate_data import simulate_dataset
+from skillmodels.utilities import reduce_n_periods
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    model_dict, params = reduce_n_periods(model_dict, 2, params)
+
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    caseids = data.index.get_level_values("caseid")
+    periods = data.index.get_level_values("period")
+    data = data[(caseids <= 200) & (periods <= 1)]
+    return model_dict, params, data
+
+
+def test_get_simulated_estimation_data(setup):
+    model_dict, params, data = setup
+    simulated = simulate_dataset(model_dict, params, data=data, seed=0)
+    estimation_data = get_simulated_estimation_data(
+        model_dict, simulated["measurements"], data
+    )
+
+    assert estimation_data.index.names == ["id", "period"]
+    assert "Q1" in estimation_data and "Q1_fac1" not in estimation_data
+    aaae(
+        estimation_data.query("period == 1")["Q1"],
+        simulated["measurements"].query("period == 1")["Q1_fac1"],
+    )
+    aaae(estimation_data["x1"], data["x1"].sort_index())
+
+
+def test_run_monte_carlo(setup, tmp_path):
+    model_dict, params, data = setup
+    kwargs = {
+        "n_replications": 2,
+        "data": data,
+        "algo_options": {"max_iterations": 3},
+        "output_dir": tmp_path,
+    }
+    res = run_monte_carlo(model_dict, params, **kwargs)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "replication_0.pickle",
+        "replication_1.pickle",
+    ]
+    assert res["estimates"].shape == (2, len(params))
+    assert res["summary"]["seed"].nunique() == 2
+    assert (res["standard_errors"].to_numpy() >= 0).all()
+    aaae(
+        res["statistics"]["bias"],
+        res["estimates"].mean() - params.loc[res["estimates"].columns, "value"],
+    )
+
+    # the saved replications are loaded instead of being run again
+    resumed = run_monte_carlo(model_dict, params.assign(value=np.nan), **kwargs)
+    pd.testing.assert_frame_equal(resumed["estimates"], res["estimates"])
+
+
+def test_get_monte_carlo_statistics():
+    index = pd.Index(["a", "b"])
+    true_params = pd.DataFrame({"value": [1.0, 0.0]}, index=index)
+    estimates = pd.DataFrame([[1.5, 0.1], [0.5, 0.3]], columns=index)
+    ses = pd.DataFrame([[0.1, 0.1], [1.0, 0.1]], columns=index)
+
+    calculated = get_monte_carlo_statistics(estimates, true_params, ses, 0.95)
+
+    aaae(calculated["bias"], [0, 0.2])
+    aaae(calculated["rmse"], [0.5, np.sqrt(0.05)])
+    aaae(calculated["coverage"], [0.5, 0.5])
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from jax import config
+
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.multistart import fit_multistart
+from skillmodels.multistart import get_multistart_params
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    model_dict.pop("anchoring")
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage.csv").set_index(
+        ["category", "period", "name1", "name2"]
+    )
+    inputs = get_maximization_inputs(model_dict, data, free_params=True)
+    params = params.loc[inputs["params_template"].index]
+    return model_dict, data, params, inputs
+
+
+def test_multistart_params_satisfy_constraints(setup):
+    _, _, params, inputs = setup
+    starts = get_multistart_params(params, inputs, n_starts=5, seed=1)
+
+    assert len(starts) == 5
+    assert np.allclose(starts[0]["value"], params["value"])
+    assert not np.allclose(starts[1]["value"], params["value"])
+
+    free_lower_bounds = inputs["free_params_template"]["lower_bound"]
+    for start in starts:
+        free_params = inputs["free_params_from_params"](start)
+        assert (free_params > free_lower_bounds).all()
+        assert np.isclose(start.loc["mixture_weights", "value"].sum(), 1)
+        assert np.allclose(
+            inputs["params_from_free_params"](free_params)["value"], start["value"]
+        )
+
+
+@pytest.mark.parametrize("n_cores", [1, 2])
+def test_fit_multistart_ranks_results(setup, n_cores):
+    model_dict, data, params, _ = setup
+    res = fit_multistart(
+        model_dict,
+        data,
+        params,
+        n_starts=2,
+        algo_options={"max_iterations": 1},
+        n_cores=n_cores,
+    )
+    values = res["summary"]["value"].tolist()
+    assert values == sorted(values, reverse=True)
+    assert sorted(res["summary"]["start"]) == [0, 1]
+    assert res["best"]["value"] == values[0]
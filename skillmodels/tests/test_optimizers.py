@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.optimizers import maximize_bhhh
+from skillmodels.optimizers import maximize_lbfgs
+
+
+@pytest.fixture
+def logit_problem():
+    rng = np.random.default_rng(1234)
+    x = np.column_stack([np.ones(500), rng.normal(size=(500, 2))])
+    y = (x @ np.array([0.5, -1, 2]) + rng.logistic(size=500) > 0).astype(float)
+
+    def contributions(beta):
+        index = x @ beta
+        return y * index - np.logaddexp(0, index)
+
+    def loglike(beta):
+        return contributions(beta).sum()
+
+    def jacobian(beta):
+        probs = 1 / (1 + np.exp(-x @ beta))
+        return (y - probs).reshape(-1, 1) * x
+
+    def loglike_and_gradient(beta):
+        return loglike(beta), jacobian(beta).sum(axis=0)
+
+    return {
+        "loglike": loglike,
+        "jacobian": jacobian,
+        "loglike_and_gradient": loglike_and_gradient,
+        "lower_bounds": np.full(3, -np.inf),
+        "upper_bounds": np.full(3, np.inf),
+    }
+
+
+def test_lbfgs_and_bhhh_find_the_same_maximum(logit_problem):
+    p = logit_problem
+    lbfgs = maximize_lbfgs(
+        p["loglike_and_gradient"], np.zeros(3), p["lower_bounds"], p["upper_bounds"]
+    )
+    bhhh = maximize_bhhh(
+        p["loglike"], p["jacobian"], np.zeros(3), p["lower_bounds"], p["upper_bounds"]
+    )
+    assert lbfgs["converged"]
+    assert bhhh["converged"]
+    aaae(lbfgs["x"], bhhh["x"], decimal=4)
+    aaae(lbfgs["gradient"], np.zeros(3), decimal=4)
+
+
+@pytest.mark.parametrize("algorithm", ["lbfgs", "bhhh"])
+def test_optimizers_respect_bounds(logit_problem, algorithm):
+    p = logit_problem
+    upper_bounds = np.array([np.inf, np.inf, 1])
+    if algorithm == "lbfgs":
+        res = maximize_lbfgs(
+            p["loglike_and_gradient"], np.zeros(3), p["lower_bounds"], upper_bounds
+        )
+    else:
+        res = maximize_bhhh(
+            p["loglike"], p["jacobian"], np.zeros(3), p["lower_bounds"], upper_bounds
+        )
+    assert res["converged"]
+    assert res["x"][2] == 1
+
+
+@pytest.mark.parametrize("algorithm", ["lbfgs", "bhhh"])
+def test_resumed_optimization_equals_uninterrupted_optimization(
+    logit_problem, algorithm
+):
+    p = logit_problem
+    if algorithm == "lbfgs":
+        args = (p["loglike_and_gradient"],)
+        optimizer = maximize_lbfgs
+    else:
+        args = (p["loglike"], p["jacobian"])
+        optimizer = maximize_bhhh
+    bounds = (p["lower_bounds"], p["upper_bounds"])
+
+    iterations = []
+
+    def callback(state):
+        iterations.append(state["iteration"])
+
+    uninterrupted = optimizer(*args, np.zeros(3), *bounds, callback=callback)
+    interrupted = optimizer(*args, np.zeros(3), *bounds, max_iterations=2)
+    assert not interrupted["converged"]
+    resumed = optimizer(*args, None, *bounds, state=interrupted)
+
+    assert resumed["iteration"] == uninterrupted["iteration"]
+    aaae(resumed["x"], uninterrupted["x"], decimal=12)
+    assert len(resumed["history"]) == uninterrupted["iteration"] + 1
+    assert iterations == list(range(1, uninterrupted["iteration"] + 1))
@@ -41,9 +41,8 @@ def parsed_parameters():
     parsing_info = create_parsing_info(p_index, update_info, labels, anchoring)
 
     params_vec = jnp.arange(len(p_index))
-    n_obs = 5
 
-    parsed = parse_params(params_vec, parsing_info, dimensions, labels, n_obs)
+    parsed = parse_params(params_vec, parsing_info, dimensions, labels)
 
     return dict(zip(["states", "upper_chols", "log_weights", "pardict"], parsed))
 
@@ -71,15 +70,13 @@ def test_shock_sds(parsed_parameters):
 
 
 def test_initial_states(parsed_parameters):
-    expected = jnp.arange(257, 260).reshape(1, 3).repeat(5, axis=0).reshape(5, 1, 3)
+    expected = jnp.arange(257, 260).reshape(1, 1, 3)
     aae(parsed_parameters["states"], expected)
 
 
 def test_initial_upper_chols(parsed_parameters):
-    expected = (
-        jnp.array([[[261, 262, 264], [0, 263, 265], [0, 0, 266]]])
-        .repeat(5, axis=0)
-        .reshape(5, 1, 3, 3)
+    expected = jnp.array([[261, 262, 264], [0, 263, 265], [0, 0, 266]]).reshape(
+        1, 1, 3, 3
     )
     aae(parsed_parameters["upper_chols"], expected)
 
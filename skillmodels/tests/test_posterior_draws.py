@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import jax
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.filtered_states import get_filtered_states
+from skillmodels.posterior_draws import _draw_states
+from skillmodels.posterior_draws import draw_posterior_states
+from skillmodels.smoothed_states import get_smoothed_states
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    data = data[data.index.get_level_values("caseid") <= 100]
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    return model_dict, data, params
+
+
+@pytest.mark.parametrize("smoothed", [False, True])
+def test_posterior_draws_have_posterior_means(setup, smoothed):
+    model_dict, data, params = setup
+    draws = draw_posterior_states(
+        model_dict, data, params, n_draws=2000, smoothed=smoothed, chunk_size=60
+    )
+    if smoothed:
+        expected = get_smoothed_states(model_dict, data, params)
+    else:
+        expected = get_filtered_states(model_dict, data, params)
+
+    for name in ["anchored_states", "unanchored_states"]:
+        means = draws[name].groupby(["id", "period"]).mean().drop(columns="draw")
+        expected_means = expected[name]["states"].set_index(["id", "period"])
+        expected_means = expected_means.sort_index()[means.columns]
+        assert np.abs(means.to_numpy() - expected_means.to_numpy()).max() < 0.15
+
+
+def test_posterior_draws_format(setup):
+    model_dict, data, params = setup
+    draws = draw_posterior_states(model_dict, data, params, n_draws=3, chunk_size=60)
+    states = draws["unanchored_states"]
+    assert list(states.columns) == ["fac1", "fac2", "fac3", "period", "id", "draw"]
+    assert len(states) == 100 * 8 * 3
+    assert states["id"].nunique() == 100
+    assert (states.groupby(["id", "period"])["draw"].nunique() == 3).all()
+
+
+def test_draw_states_from_mixture():
+    states = np.array([[[[-2.0, 0], [3, 1]]]])
+    upper_chols = np.array([[[np.eye(2), 0.5 * np.eye(2)]]])
+    log_weights = np.log(np.array([[[0.25, 0.75]]]))
+    draws = np.array(
+        _draw_states(
+            jax.random.PRNGKey(0),
+            states,
+            upper_chols,
+            log_weights,
+            n_draws=100_000,
+        )
+    )
+    assert draws.shape == (100_000, 1, 1, 2)
+    aaae(draws.mean(axis=0)[0, 0], [1.75, 0.75], decimal=1)
+    aaae((draws[..., 1] > 0.5).mean(), 0.75 * 0.84 + 0.25 * 0.31, decimal=1)
@@ -1,11 +1,15 @@
 import inspect
 from pathlib import Path
 
+import jax.numpy as jnp
+import numpy as np
 import pandas as pd
 import pytest
 import yaml
+from numpy.testing import assert_array_almost_equal as aaae
 from pandas.testing import assert_frame_equal
 
+from skillmodels.decorators import register_params
 from skillmodels.process_model import process_model
 
 # ======================================================================================
@@ -66,7 +70,47 @@ def test_transition_info(model2):
     assert isinstance(res, dict)
     assert callable(res["func"])
 
-    assert list(inspect.signature(res["func"]).parameters) == ["params", "states"]
+    assert list(inspect.signature(res["func"]).parameters) == [
+        "params",
+        "states",
+        "observed_factors",
+    ]
+    assert res["constant_factors"] == [2]
+    assert callable(res["dynamic_func"])
+    assert res["dynamic_inputs"] == [0, 1, 2]
+
+
+def test_transition_inputs_of_custom_transition_functions(model2):
+    @register_params(params=["fac2", "constant"])
+    def only_fac2(fac2, params):
+        return params["constant"] + fac2 * params["fac2"]
+
+    model2["factors"]["fac1"]["transition_function"] = only_fac2
+    model2["factors"]["fac2"]["transition_function"] = only_fac2
+    res = process_model(model2)["transition_info"]
+    assert res["dynamic_inputs"] == [1]
+
+
+def test_transition_function_with_observed_factors(model2):
+    model2["observed_factors"] = ["ob1", "ob2"]
+    res = process_model(model2)["transition_info"]
+    params = {
+        "fac1": jnp.arange(6) / 10,
+        "fac2": jnp.arange(6) / 10,
+        "fac3": jnp.array([]),
+    }
+    rng = np.random.default_rng(0)
+    states = jnp.array(rng.normal(size=(4, 7, 3)))
+    observed_factors = jnp.array(rng.normal(size=(4, 2)))
+
+    calculated = res["func"](params, states, observed_factors)
+
+    all_states = jnp.concatenate(
+        [states, jnp.repeat(observed_factors[:, None], 7, axis=1)], axis=-1
+    ).reshape(-1, 5)
+    for i, factor in enumerate(["fac1", "fac2", "fac3"]):
+        expected = res["individual_functions"][factor](params, all_states)
+        aaae(calculated[..., i].flatten(), expected)
 
 
 def test_update_info(model2):
@@ -0,0 +1,147 @@
+from operator import itemgetter
+from pathlib import Path
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.filtered_states import get_filtered_states
+from skillmodels.kalman_filters import calculate_sigma_scaling_factor_and_weights
+from skillmodels.kalman_filters import kalman_predict
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.process_model import process_model
+from skillmodels.projection import project_states
+from skillmodels.smoothed_states import get_posterior_distributions
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    data = data[data.index.get_level_values("caseid") <= 200]
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    return model_dict, data, params
+
+
+def test_projection_equals_filtering_without_later_measurements(setup):
+    model_dict, data, params = setup
+    projected = project_states(model_dict, data, params, start_period=3)
+
+    # Kalman updates with missing measurements only run the predict step
+    measurements = [f"y{i}" for i in range(1, 10)] + ["Q1"]
+    cut_data = data.copy()
+    cut_data.loc[cut_data.index.get_level_values("period") > 3, measurements] = np.nan
+    filtered = get_filtered_states(model_dict, cut_data, params)
+
+    for name in ["anchored_states", "unanchored_states"]:
+        expected = filtered[name]["states"].query("period >= 3")
+        pd.testing.assert_frame_equal(
+            projected[name]["states"].reset_index(drop=True),
+            expected.reset_index(drop=True),
+        )
+
+    inputs = get_maximization_inputs(model_dict, cut_data)
+    chols = inputs["kalman_filter"](params.loc[inputs["params_template"].index])[
+        "filtered_upper_chols"
+    ][-1, :, 0]
+    covs = projected["unanchored_states"]["covariances"].query("period == 7")
+    aaae(
+        covs[["fac1", "fac2", "fac3"]].to_numpy().reshape(200, 3, 3),
+        np.swapaxes(chols, -1, -2) @ chols,
+    )
+
+
+def test_projection_with_policy(setup):
+    model_dict, data, params = setup
+    policies = [
+        {"period": 2, "factor": "fac1", "effect_size": 1.0, "standard_deviation": 0.5}
+    ]
+    kwargs = {"start_period": 2, "n_periods": 2}
+    baseline = project_states(model_dict, data, params, **kwargs)
+    with_policy = project_states(model_dict, data, params, policies=policies, **kwargs)
+
+    for key in ["states", "covariances"]:
+        pd.testing.assert_frame_equal(
+            with_policy["unanchored_states"][key].query("period == 2"),
+            baseline["unanchored_states"][key].query("period == 2"),
+        )
+
+    def _period_3(res, key):
+        return res["unanchored_states"][key].query("period == 3")
+
+    assert (
+        _period_3(with_policy, "states")["fac1"] > _period_3(baseline, "states")["fac1"]
+    ).all()
+    variances = _period_3(with_policy, "covariances").query("factor == 'fac1'")["fac1"]
+    baseline_variances = _period_3(baseline, "covariances").query("factor == 'fac1'")
+    assert (variances > baseline_variances["fac1"]).all()
+
+
+def test_projection_beyond_last_period_reuses_last_transition(setup):
+    model_dict, data, params = setup
+    # make the last transition differ from the earlier ones
+    params.loc[("transition", 6, "fac2", "fac2"), "value"] = 0.5
+    params.loc[("shock_sds", 6, "fac1", "-"), "value"] = 0.5
+    projected = project_states(model_dict, data, params, start_period=5, n_periods=4)
+    within_model = project_states(model_dict, data, params, start_period=5)
+
+    for name in ["anchored_states", "unanchored_states"]:
+        for key in ["states", "covariances"]:
+            pd.testing.assert_frame_equal(
+                projected[name][key].query("period <= 7"), within_model[name][key]
+            )
+    assert sorted(projected["anchored_states"]["states"]["period"].unique()) == list(
+        range(5, 10)
+    )
+
+    # one predict step with the last transition of the model and the anchoring of
+    # the last period
+    model = process_model(model_dict)
+    pardict = get_posterior_distributions(model_dict, data, params)["pardict"]
+    factors = ["fac1", "fac2", "fac3"]
+    unanchored = projected["unanchored_states"]
+    means = unanchored["states"].query("period == 7")[factors].to_numpy()
+    covs = unanchored["covariances"].query("period == 7")[factors].to_numpy()
+    upper_chols = np.swapaxes(np.linalg.cholesky(covs.reshape(200, 3, 3)), -1, -2)
+    sigma_scaling_factor, sigma_weights = calculate_sigma_scaling_factor_and_weights(
+        3, model["estimation_options"]["sigma_points_scale"]
+    )
+    expected_states, expected_chols = kalman_predict(
+        jnp.array(means[:, None]),
+        jnp.array(upper_chols[:, None]),
+        sigma_scaling_factor,
+        sigma_weights,
+        model["transition_info"],
+        jax.tree_util.tree_map(itemgetter(-1), pardict["transition"]),
+        pardict["shock_sds"][-1],
+        pardict["anchoring_scaling_factors"][np.array([7, 7])],
+        pardict["anchoring_constants"][np.array([7, 7])],
+        jnp.zeros((200, 0)),
+    )
+
+    aaae(
+        unanchored["states"].query("period == 8")[factors].to_numpy(),
+        expected_states[:, 0],
+    )
+    expected_chols = np.array(expected_chols[:, 0])
+    aaae(
+        unanchored["covariances"].query("period == 8")[factors].to_numpy(),
+        (np.swapaxes(expected_chols, -1, -2) @ expected_chols).reshape(-1, 3),
+    )
+
+
+def test_projection_with_invalid_periods_raises_error(setup):
+    model_dict, data, params = setup
+    with pytest.raises(ValueError):
+        project_states(model_dict, data, params, start_period=8, n_periods=1)
+    with pytest.raises(ValueError):
+        project_states(model_dict, data, params, start_period=5, n_periods=-1)
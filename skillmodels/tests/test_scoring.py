@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import yaml
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.filtered_states import get_filtered_states
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.process_data import process_data
+from skillmodels.process_model import process_model
+from skillmodels.scoring import get_scorer
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    data = data[data.index.get_level_values("caseid") <= 250]
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    return model_dict, data, params
+
+
+def test_scorer_matches_filtered_states_and_loglike(setup):
+    model_dict, data, params = setup
+    scored = get_scorer(model_dict, params, batch_size=100)(data)
+
+    inputs = get_maximization_inputs(model_dict, data)
+    loglike = inputs["loglike"](params.loc[inputs["params_template"].index])
+    aaae(scored["loglikes"].to_numpy(), loglike["contributions"])
+    assert scored["loglikes"].index.tolist() == list(range(1, 251))
+
+    filtered = get_filtered_states(model_dict, data, params)
+    for name in ["anchored_states", "unanchored_states"]:
+        expected = filtered[name]["states"]
+        assert scored[name].columns.tolist() == expected.columns.tolist()
+        aaae(scored[name].drop(columns="id"), expected.drop(columns="id"))
+        aaae(scored[name]["id"], expected["id"] + 1)
+
+
+def test_scorer_with_single_individual_and_arrays(setup):
+    model_dict, data, params = setup
+    score = get_scorer(model_dict, params, batch_size=100)
+    all_loglikes = score(data)["loglikes"]
+
+    single = score(data.loc[[7]])
+    assert single["loglikes"].index.tolist() == [7]
+    aaae(single["loglikes"].to_numpy(), all_loglikes.loc[[7]].to_numpy())
+
+    model = process_model(model_dict)
+    arrays = process_data(
+        data, model["labels"], model["update_info"], model["anchoring"]
+    )
+    keys = ["measurements", "controls", "observed_factors"]
+    from_arrays = score(dict(zip(keys, arrays)))
+    aaae(from_arrays["loglikes"].to_numpy(), all_loglikes.to_numpy())
+    assert from_arrays["loglikes"].index.tolist() == list(range(250))
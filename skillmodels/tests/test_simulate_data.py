@@ -7,8 +7,14 @@ import pytest
 import yaml
 from numpy.testing import assert_array_almost_equal as aaae
 
+from skillmodels.process_debug_data import create_state_ranges
+from skillmodels.simulate_data import generate_start_states
+from skillmodels.simulate_data import labelled_array_to_df
 from skillmodels.simulate_data import measurements_from_states
 from skillmodels.simulate_data import simulate_dataset
+from skillmodels.simulate_data import simulate_dataset_chunks
+from skillmodels.simulate_data import simulate_dataset_to_parquet
+from skillmodels.simulate_data import simulate_policy_scenarios
 
 
 # importing the TEST_DIR from config does not work for test run in conda build
@@ -57,3 +63,182 @@ def test_measurements_from_factors():
     }
     expected = np.array([[1, 1, 1], [1.9, 1.9, 1.9]])
     aaae(measurements_from_states(**inputs), expected)
+
+
+def test_generate_start_states_with_mixtures():
+    dimensions = {"n_latent_factors": 2}
+    dist_args = [
+        {"mean": np.array([-1, 0]), "cov": np.array([[1, 0.5], [0.5, 2]])},
+        {"mean": np.array([2, 1]), "cov": np.array([[0.5, 0], [0, 0.25]])},
+        {"mean": np.array([0, 5]), "cov": np.zeros((2, 2))},
+    ]
+    weights = np.array([0.5, 0.3, 0.2])
+
+    states = generate_start_states(200_000, dimensions, dist_args, weights, seed=5)
+    assert np.array_equal(
+        generate_start_states(200_000, dimensions, dist_args, weights, seed=5), states
+    )
+    np.random.seed(123)
+    unseeded = generate_start_states(1_000, dimensions, dist_args, weights)
+    np.random.seed(123)
+    assert np.array_equal(
+        generate_start_states(1_000, dimensions, dist_args, weights), unseeded
+    )
+
+    in_third = (states == [0, 5]).all(axis=1)
+    assert abs(in_third.mean() - 0.2) < 0.01
+
+    means = np.array([args["mean"] for args in dist_args])
+    second_moments = [args["cov"] + np.outer(m, m) for args, m in zip(dist_args, means)]
+    expected_mean = weights @ means
+    expected_cov = np.tensordot(weights, second_moments, axes=1) - np.outer(
+        expected_mean, expected_mean
+    )
+    aaae(states.mean(axis=0), expected_mean, decimal=2)
+    aaae(np.cov(states, rowvar=False), expected_cov, decimal=1)
+
+
+def test_simulate_dataset_is_reproducible_with_seed(model2, model2_data):
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    first = simulate_dataset(model2, params, data=model2_data, seed=123)
+    second = simulate_dataset(model2, params, data=model2_data, seed=123)
+    other = simulate_dataset(model2, params, data=model2_data, seed=124)
+
+    pd.testing.assert_frame_equal(first["measurements"], second["measurements"])
+    assert not first["measurements"].equals(other["measurements"])
+    assert first["measurements"].shape == (len(model2_data), 12)
+
+
+def test_simulate_dataset_array_output(model2, model2_data):
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    frames = simulate_dataset(model2, params, data=model2_data, seed=5)
+    arrays = simulate_dataset(
+        model2, params, data=model2_data, seed=5, output_format="arrays"
+    )
+
+    n_obs = model2_data.index.get_level_values("caseid").nunique()
+    assert arrays["measurements"]["values"].shape == (8, n_obs, 10)
+    assert arrays["anchored_states"]["values"].shape == (8, n_obs, 3)
+    assert arrays["anchored_states"]["variables"] == ["fac1", "fac2", "fac3"]
+
+    pd.testing.assert_frame_equal(
+        labelled_array_to_df(arrays["measurements"]), frames["measurements"]
+    )
+    for name in ["unanchored_states", "anchored_states"]:
+        states = labelled_array_to_df(arrays[name])
+        pd.testing.assert_frame_equal(states, frames[name]["states"])
+        expected_ranges = create_state_ranges(states, ["fac1", "fac2", "fac3"])
+        for factor, expected in expected_ranges.items():
+            aaae(frames[name]["state_ranges"][factor], expected)
+
+
+def test_simulate_dataset_invalid_output_format(model2, model2_data):
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    with pytest.raises(ValueError):
+        simulate_dataset(model2, params, data=model2_data, output_format="xarray")
+
+
+def test_simulate_dataset_with_deterministic_policy(model2, model2_data):
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    policies = [
+        {"period": 0, "factor": "fac2", "effect_size": 0.5, "standard_deviation": 0}
+    ]
+
+    without = simulate_dataset(model2, params, data=model2_data, seed=0)
+    with_policy = simulate_dataset(
+        model2, params, data=model2_data, seed=0, policies=policies
+    )
+
+    states = without["unanchored_states"]["states"].query("period == 0")
+    policy_states = with_policy["unanchored_states"]["states"].query("period == 0")
+    aaae(policy_states["fac2"] - states["fac2"], 0.5)
+    aaae(policy_states["fac1"], states["fac1"])
+
+
+def test_simulate_dataset_chunks(model2, model2_data):
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    chunks = list(
+        simulate_dataset_chunks(model2, params, data=model2_data, chunk_size=1500)
+    )
+    assert len(chunks) == 3
+
+    measurements = pd.concat([chunk["measurements"] for chunk in chunks])
+    states = pd.concat([chunk["anchored_states"] for chunk in chunks])
+    for df in [measurements, states]:
+        assert len(df) == len(model2_data)
+        assert (df["id"].unique() == np.arange(4000)).all()
+
+    # chunks have independent random streams
+    first, second = chunks[0]["measurements"], chunks[1]["measurements"]
+    assert not np.allclose(first["y1"].to_numpy(), second["y1"].to_numpy())
+
+    again = next(
+        simulate_dataset_chunks(model2, params, data=model2_data, chunk_size=1500)
+    )
+    pd.testing.assert_frame_equal(again["measurements"], first)
+
+
+def test_simulate_dataset_chunks_without_data(model2):
+    model_dict = {k: v for k, v in model2.items() if k not in ["controls"]}
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    chunks = list(simulate_dataset_chunks(model_dict, params, n_obs=25, chunk_size=10))
+
+    assert [len(chunk["measurements"]) for chunk in chunks] == [80, 80, 40]
+    assert chunks[-1]["unanchored_states"]["id"].max() == 24
+
+
+def test_simulate_dataset_to_parquet(model2, model2_data, tmp_path):
+    pytest.importorskip("pyarrow")
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+
+    simulate_dataset_to_parquet(
+        model2, params, tmp_path, data=model2_data, chunk_size=1500
+    )
+
+    measurements = pd.read_parquet(tmp_path / "measurements")
+    assert len(measurements) == len(model2_data)
+
+
+def test_simulate_policy_scenarios_uses_common_random_numbers(model2, model2_data):
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    scenarios = {
+        "deterministic": [
+            {"period": 0, "factor": "fac2", "effect_size": 0.5, "standard_deviation": 0}
+        ],
+        "stochastic": [
+            {"period": 1, "factor": "fac1", "effect_size": 1, "standard_deviation": 0.5}
+        ],
+    }
+
+    res = simulate_policy_scenarios(model2, params, scenarios, data=model2_data, seed=5)
+
+    diffs = res["differences"]
+    # fac2 has a linear transition with coefficient 0.65 on itself
+    aaae(diffs.loc[("deterministic", 0), ("mean_difference", "fac2")], 0.5)
+    aaae(diffs.loc[("deterministic", 1), ("mean_difference", "fac2")], 0.325)
+    aaae(diffs.loc[("deterministic", 1), ("std_error", "fac2")], 0)
+    aaae(diffs.loc[("deterministic", 0), ("mean_difference", "fac1")], 0)
+    aaae(diffs.loc["baseline", "mean_difference"], 0)
+    assert diffs.loc[("stochastic", 1), ("std_error", "fac1")] > 0
+
+    single = simulate_dataset(model2, params, data=model2_data, seed=5)
+    baseline = res["states"].query("scenario == 'baseline'")
+    expected = single["anchored_states"]["states"]
+    aaae(baseline[["fac1", "fac2", "fac3"]], expected[["fac1", "fac2", "fac3"]])
+    assert res["summary"].index.get_level_values("scenario").unique().tolist() == [
+        "baseline",
+        "deterministic",
+        "stochastic",
+    ]
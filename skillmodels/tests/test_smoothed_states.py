@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.filtered_states import get_filtered_states
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.process_model import process_model
+from skillmodels.smoothed_states import get_smoothed_states
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    return model_dict, data, params
+
+
+def test_smoothed_states_equal_filtered_states_in_last_period(setup):
+    model_dict, data, params = setup
+    smoothed = get_smoothed_states(model_dict, data, params)
+    filtered = get_filtered_states(model_dict, data, params)
+
+    for name in ["anchored_states", "unanchored_states"]:
+        smoothed_states = smoothed[name]["states"]
+        filtered_states = filtered[name]["states"]
+        assert smoothed_states.columns.equals(filtered_states.columns)
+        aaae(
+            smoothed_states.query("period == 7").to_numpy(),
+            filtered_states.query("period == 7").to_numpy(),
+        )
+        assert not np.allclose(smoothed_states.to_numpy(), filtered_states.to_numpy())
+
+
+def test_smoothed_variances_are_smaller_than_filtered_variances(setup):
+    model_dict, data, params = setup
+    inputs = get_maximization_inputs(model_dict, data)
+    filtered = inputs["kalman_filter"](params.loc[inputs["params_template"].index])
+    update_periods = process_model(model_dict)["update_info"].index.get_level_values(
+        "period"
+    )
+    last_update = np.flatnonzero(update_periods == 0)[-1]
+    chols = filtered["filtered_upper_chols"][last_update, :, 0]
+    filtered_variances = (chols**2).sum(axis=1)
+
+    covs = get_smoothed_states(model_dict, data, params)["unanchored_states"][
+        "covariances"
+    ]
+    first = covs.query("period == 0")
+    for i, factor in enumerate(["fac1", "fac2", "fac3"]):
+        variances = first.query(f"factor == '{factor}'")[factor].to_numpy()
+        assert (variances <= filtered_variances[:, i] + 1e-10).all()
+        assert (variances > 0).all()
+
+
+def test_smoothed_states_do_not_depend_on_chunk_size(setup):
+    model_dict, data, params = setup
+    one_chunk = get_smoothed_states(model_dict, data, params)
+    chunked = get_smoothed_states(model_dict, data, params, chunk_size=1500)
+    for key in ["states", "covariances"]:
+        pd.testing.assert_frame_equal(
+            chunked["anchored_states"][key], one_chunk["anchored_states"][key]
+        )
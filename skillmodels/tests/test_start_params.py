@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from jax import config
+from numpy.testing import assert_array_almost_equal as aaae
+
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.start_params import _get_standardized_loadings
+from skillmodels.start_params import get_start_params
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def setup():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    inputs = get_maximization_inputs(model_dict, data, free_params=True)
+    return model_dict, data, inputs
+
+
+def test_get_start_params_satisfies_constraints(setup):
+    model_dict, data, inputs = setup
+    params = get_start_params(model_dict, data)
+
+    assert params.index.equals(inputs["params_template"].index)
+    assert params["value"].notnull().all()
+
+    loadings = params.loc["loadings", "value"]
+    assert (loadings.xs("y1", level="name1") == 1).all()
+    assert (params.loc["shock_sds", "value"].xs("fac3", level="name1") == 0).all()
+    gammas = params.loc[("transition", 0, "fac1"), "value"].to_numpy()[:-1]
+    aaae(gammas.sum(), 1)
+    aaae(
+        params.loc[("transition", 0), "value"].to_numpy(),
+        params.loc[("transition", 6), "value"].to_numpy(),
+    )
+
+    free = inputs["free_params_from_params"](params)
+    aaae(inputs["params_from_free_params"](free)["value"], params["value"])
+
+
+def test_get_start_params_improves_on_vault_params(setup):
+    model_dict, data, inputs = setup
+    vault = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    vault = vault.set_index(["category", "period", "name1", "name2"])
+    vault = vault.loc[inputs["params_template"].index]
+
+    params = get_start_params(model_dict, data)
+
+    loglike = inputs["loglike"](params)["value"]
+    assert np.isfinite(loglike)
+    assert loglike > inputs["loglike"](vault)["value"]
+
+
+def test_get_standardized_loadings():
+    loadings = np.array([1, -0.5, 2, 0.8])
+    cov = np.outer(loadings, loadings) + np.diag([0.5, 1, 0.4, 0.3])
+    aaae(_get_standardized_loadings(cov), np.abs(loadings))
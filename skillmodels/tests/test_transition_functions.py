@@ -1,8 +1,11 @@
 import jax.numpy as jnp
 import numpy as np
+import pytest
 from jax import config
 from numpy.testing import assert_array_almost_equal as aaae
 
+import skillmodels.transition_functions as tf
+
 from skillmodels.transition_functions import constant
 from skillmodels.transition_functions import linear
 from skillmodels.transition_functions import log_ces
@@ -147,3 +150,59 @@ def test_param_names_log_ces_general():
     expected = ["a", "b", "sigma_a", "sigma_b", "tfp"]
     calculated = params_log_ces_general(factors)
     assert calculated == expected
+
+
+MATRIX_FUNCTIONS = [
+    "linear",
+    "translog",
+    "robust_translog",
+    "linear_and_squares",
+    "log_ces",
+    "log_ces_general",
+]
+
+
+@pytest.mark.parametrize("name", MATRIX_FUNCTIONS)
+def test_matrix_functions_against_scalar_functions(name):
+    rng = np.random.default_rng(0)
+    factors = ["a", "b", "c"]
+    n_params = len(getattr(tf, f"params_{name}")(factors))
+    states = rng.uniform(low=-2, high=2, size=(4, 5, 3))
+    params = rng.uniform(low=0.1, high=1, size=(n_params, 2))
+
+    scalar_func = getattr(tf, name)
+    expected = np.stack(
+        [
+            np.array([[scalar_func(s, params[:, k]) for s in row] for row in states])
+            for k in range(2)
+        ],
+        axis=-1,
+    )
+    calculated = getattr(tf, f"matrix_{name}")(jnp.array(states), jnp.array(params))
+    aaae(calculated, expected)
+
+
+@pytest.mark.parametrize("name", MATRIX_FUNCTIONS)
+@pytest.mark.parametrize("n_observed", [0, 1, 2])
+def test_matrix_functions_with_observed_factors(name, n_observed):
+    rng = np.random.default_rng(1)
+    factors = ["a", "b", "c", "d"]
+    n_params = len(getattr(tf, f"params_{name}")(factors))
+    states = rng.uniform(low=-2, high=2, size=(4, 5, 4 - n_observed))
+    observed = rng.uniform(low=-2, high=2, size=(4, n_observed))
+    params = rng.uniform(low=0.1, high=1, size=(n_params, 2))
+
+    all_states = np.concatenate(
+        [states, np.broadcast_to(observed[:, None], (4, 5, n_observed))], axis=-1
+    )
+    matrix_func = getattr(tf, f"matrix_{name}")
+    expected = matrix_func(jnp.array(all_states), jnp.array(params))
+    calculated = matrix_func(jnp.array(states), jnp.array(params), jnp.array(observed))
+    aaae(calculated, expected)
+
+
+def test_matrix_log_ces_where_all_but_one_gammas_are_zero():
+    states = jnp.ones((2, 3))
+    params = jnp.array([[0, 0, 1, -0.5]]).T
+    calculated = tf.matrix_log_ces(states, params)
+    aaae(calculated, np.ones((2, 1)))
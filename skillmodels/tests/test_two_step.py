@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+from jax import config
+
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.two_step import _get_period_data
+from skillmodels.two_step import fit_two_step
+from skillmodels.utilities import reduce_n_periods
+
+config.update("jax_enable_x64", True)
+
+TEST_DIR = Path(__file__).parent.resolve()
+
+
+def test_fit_two_step():
+    with open(TEST_DIR / "model2.yaml") as y:
+        model_dict = yaml.load(y, Loader=yaml.FullLoader)
+    params = pd.read_csv(TEST_DIR / "regression_vault" / "one_stage_anchoring.csv")
+    params = params.set_index(["category", "period", "name1", "name2"])
+    model_dict, params = reduce_n_periods(model_dict, 3, params)
+
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    data = data.loc[data.index.get_level_values("caseid").unique()[:500]]
+
+    inputs = get_maximization_inputs(model_dict, data)
+    params = params.loc[inputs["params_template"].index]
+
+    res = fit_two_step(model_dict, data, params, algo_options={"max_iterations": 2})
+
+    assert sorted(res["measurement_results"]) == [0, 1, 2]
+    period_params = res["measurement_results"][2]["params"]
+    transition_params = res["transition_result"]["params"]
+    for loc in [("loadings", 2, "y2", "fac1"), ("meas_sds", 2, "y5", "-")]:
+        period_loc = (loc[0], 0, *loc[2:])
+        assert transition_params.loc[loc, "value"] == (
+            period_params.loc[period_loc, "value"]
+        )
+
+    assert res["params"].index.equals(params.index)
+    assert res["joint_result"]["value"] >= res["transition_result"]["value"]
+    assert np.isfinite(res["joint_result"]["value"])
+
+
+def test_get_period_data_with_other_index_names_and_period_codes():
+    data = pd.read_stata(TEST_DIR / "model2_simulated_data.dta")
+    data = data.set_index(["caseid", "period"])
+    relabelled = data.copy()
+    relabelled.index = relabelled.index.set_levels(
+        relabelled.index.levels[1] + 1, level=1
+    )
+    relabelled.index.names = ["id", "year"]
+
+    for period in [0, 7]:
+        expected = _get_period_data(data, period)
+        calculated = _get_period_data(relabelled, period)
+        assert len(calculated) == 4000
+        assert (calculated.index.get_level_values("year") == 0).all()
+        pd.testing.assert_frame_equal(
+            calculated.reset_index(drop=True), expected.reset_index(drop=True)
+        )
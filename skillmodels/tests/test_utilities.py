@@ -19,6 +19,7 @@ from skillmodels.utilities import _remove_from_dict
 from skillmodels.utilities import _remove_from_list
 from skillmodels.utilities import _shorten_if_necessary
 from skillmodels.utilities import extract_factors
+from skillmodels.utilities import extract_period
 from skillmodels.utilities import reduce_n_periods
 from skillmodels.utilities import remove_controls
 from skillmodels.utilities import remove_factors
@@ -97,6 +98,30 @@ def test_reduce_n_periods(model2):
     process_model(reduced)
 
 
+def test_extract_period(model2):
+    full_index = _get_params_index_from_model_dict(model2)
+    params = pd.DataFrame({"value": np.arange(len(full_index))}, index=full_index)
+
+    reduced, reduced_params = extract_period(model2, 3, params)
+
+    assert list(reduced["factors"]) == ["fac1", "fac2"]
+    assert reduced["factors"]["fac1"]["measurements"] == [["y1", "y2", "y3"]]
+    assert reduced["factors"]["fac2"]["normalizations"]["loadings"] == [{"y4": 1}]
+    assert "stagemap" not in reduced
+    assert reduced["anchoring"]["outcomes"] == {"fac1": "Q1"}
+    assert len(model2["factors"]["fac1"]["measurements"]) == 8
+    assert "stagemap" in model2
+
+    expected_index = _get_params_index_from_model_dict(reduced)
+    assert_index_equal(reduced_params.index, expected_index)
+    assert reduced_params.loc[("loadings", 0, "y2", "fac1"), "value"] == (
+        params.loc[("loadings", 3, "y2", "fac1"), "value"]
+    )
+    assert reduced_params.loc[("initial_states", 0, "mixture_0", "fac2"), "value"] == (
+        params.loc[("initial_states", 0, "mixture_0", "fac2"), "value"]
+    )
+
+
 def test_switch_linear_to_translog(model2):
     switched = switch_linear_to_translog(model2)
     assert switched["factors"]["fac2"]["transition_function"] == "translog"
@@ -24,6 +24,25 @@ functions is explained with a transition function called example_func:
 
     ('transition', period, factor, NAME)
 
+
+**matrix_example_func(** *states, params, observed_factors=None* **)**:
+
+    Optional vectorized version of the transition function that is used for all
+    factors with this transition function at once. If it exists for all transition
+    functions of a model, it replaces the vmapped combination of example_func.
+
+    Args:
+        * states: numpy array of shape (..., n_all_factors). If observed_factors is
+          given, numpy array of shape (..., n_points, n_latent_factors).
+        * params: 2d numpy array of shape (n_params, n_outputs). Each column contains
+          the params of one factor in the order given by names_example_func.
+        * observed_factors: numpy array of shape (..., n_observed_factors) with the
+          last factors, which are the same for all n_points states. The part of the
+          result that only depends on them is calculated once and not per point.
+
+    Returns
+        * numpy array of shape (..., n_outputs) or (..., n_points, n_outputs)
+
 The transition functions have to be JAX jittable and differentiable. However, they
 should not be jitted yet.
 
@@ -32,6 +51,7 @@ from itertools import combinations
 
 import jax
 import jax.numpy as jnp
+import numpy as np
 
 
 def linear(states, params):
@@ -46,6 +66,15 @@ def params_linear(factors):
     return factors + ["constant"]
 
 
+def matrix_linear(states, params, observed_factors=None):
+    """Linear production function for several factors at once."""
+    if observed_factors is None:
+        return states @ params[:-1] + params[-1]
+    n_latent = states.shape[-1]
+    observed_part = observed_factors @ params[n_latent:-1] + params[-1]
+    return states @ params[:n_latent] + observed_part[..., None, :]
+
+
 def translog(states, params):
     """Translog transition function.
 
@@ -79,6 +108,59 @@ def params_translog(factors):
     return names
 
 
+def matrix_translog(states, params, observed_factors=None):
+    """Translog transition function for several factors at once."""
+    if observed_factors is None:
+        nfac = states.shape[-1]
+        rows, cols = np.triu_indices(nfac, k=1)
+        features = jnp.concatenate(
+            [states, states**2, states[..., rows] * states[..., cols]], axis=-1
+        )
+        return features @ params[:-1] + params[-1]
+
+    n_latent = states.shape[-1]
+    nfac = n_latent + observed_factors.shape[-1]
+    rows, cols = np.triu_indices(nfac, k=1)
+    interaction_positions = 2 * nfac + np.arange(len(rows))
+    is_latent_pair = cols < n_latent
+    is_observed_pair = rows >= n_latent
+    is_mixed_pair = ~is_latent_pair & ~is_observed_pair
+
+    observed_positions = np.concatenate(
+        [
+            np.arange(n_latent, nfac),
+            np.arange(nfac + n_latent, 2 * nfac),
+            interaction_positions[is_observed_pair],
+            [-1],
+        ]
+    )
+    observed_part = matrix_translog(observed_factors, params[observed_positions])
+
+    # interactions of latent and observed factors are linear in the latent factors
+    # with coefficients that are the same for all points of an individual
+    mixed_params = jnp.zeros((n_latent, nfac, params.shape[-1]))
+    mixed_params = mixed_params.at[rows[is_mixed_pair], cols[is_mixed_pair]].set(
+        params[interaction_positions[is_mixed_pair]]
+    )
+    linear_params = params[:n_latent] + jnp.einsum(
+        "...j,ijk->...ik", observed_factors, mixed_params[:, n_latent:]
+    )
+
+    latent_rows, latent_cols = rows[is_latent_pair], cols[is_latent_pair]
+    features = jnp.concatenate(
+        [states**2, states[..., latent_rows] * states[..., latent_cols]], axis=-1
+    )
+    feature_positions = np.concatenate(
+        [np.arange(nfac, nfac + n_latent), interaction_positions[is_latent_pair]]
+    )
+    out = (
+        jnp.einsum("...pi,...ik->...pk", states, linear_params)
+        + features @ params[feature_positions]
+        + observed_part[..., None, :]
+    )
+    return out
+
+
 def log_ces(states, params):
     """Log CES production function (KLS version)."""
     phi = params[-1]
@@ -106,6 +188,22 @@ def constraints_log_ces(factor, factors, period):
     return {"loc": loc, "type": "probability"}
 
 
+def matrix_log_ces(states, params, observed_factors=None):
+    """Log CES production function for several factors at once."""
+    phi = params[-1]
+    log_gammas = jnp.log(params[:-1])
+    n_latent = states.shape[-1]
+    unscaled = jax.scipy.special.logsumexp(
+        log_gammas[:n_latent] + states[..., None] * phi, axis=-2
+    )
+    if observed_factors is not None and observed_factors.shape[-1] > 0:
+        observed_part = jax.scipy.special.logsumexp(
+            log_gammas[n_latent:] + observed_factors[..., None] * phi, axis=-2
+        )
+        unscaled = jnp.logaddexp(unscaled, observed_part[..., None, :])
+    return unscaled / phi
+
+
 def constant(state, params):
     """Constant production function."""
     return state
@@ -136,6 +234,14 @@ def params_robust_translog(factors):
     return params_translog(factors)
 
 
+def matrix_robust_translog(states, params, observed_factors=None):
+    """Robust translog transition function for several factors at once."""
+    clipped_states = jnp.clip(states, -1e12, 1e12)
+    if observed_factors is not None:
+        observed_factors = jnp.clip(observed_factors, -1e12, 1e12)
+    return matrix_translog(clipped_states, params, observed_factors)
+
+
 def linear_and_squares(states, params):
     """linear_and_squares transition function."""
     nfac = len(states)
@@ -155,6 +261,26 @@ def params_linear_and_squares(factors):
     return names
 
 
+def matrix_linear_and_squares(states, params, observed_factors=None):
+    """linear_and_squares transition function for several factors at once."""
+    features = jnp.concatenate([states, states**2], axis=-1)
+    if observed_factors is None:
+        return features @ params[:-1] + params[-1]
+
+    n_latent = states.shape[-1]
+    nfac = n_latent + observed_factors.shape[-1]
+    latent_positions = np.concatenate(
+        [np.arange(n_latent), np.arange(nfac, nfac + n_latent)]
+    )
+    observed_positions = np.concatenate(
+        [np.arange(n_latent, nfac), np.arange(nfac + n_latent, 2 * nfac), [-1]]
+    )
+    observed_part = matrix_linear_and_squares(
+        observed_factors, params[observed_positions]
+    )
+    return features @ params[latent_positions] + observed_part[..., None, :]
+
+
 def log_ces_general(states, params):
     """Generalized log_ces production function without known location and scale."""
     n = states.shape[-1]
@@ -175,3 +301,22 @@ def log_ces_general(states, params):
 def params_log_ces_general(factors):
     """Index tuples for the generalized log_ces production function."""
     return factors + [f"sigma_{fac}" for fac in factors] + ["tfp"]
+
+
+def matrix_log_ces_general(states, params, observed_factors=None):
+    """Generalized log_ces production function for several factors at once."""
+    n_latent = states.shape[-1]
+    n = n_latent if observed_factors is None else n_latent + observed_factors.shape[-1]
+    tfp = params[-1]
+    log_gammas = jnp.log(params[:n])
+    sigmas = params[n : 2 * n]
+    unscaled = jax.scipy.special.logsumexp(
+        log_gammas[:n_latent] + states[..., None] * sigmas[:n_latent], axis=-2
+    )
+    if observed_factors is not None and observed_factors.shape[-1] > 0:
+        observed_part = jax.scipy.special.logsumexp(
+            log_gammas[n_latent:] + observed_factors[..., None] * sigmas[n_latent:],
+            axis=-2,
+        )
+        unscaled = jnp.logaddexp(unscaled, observed_part[..., None, :])
+    return unscaled * tfp
@@ -0,0 +1,160 @@
+"""Estimate a model in steps, starting with the measurement system of each period."""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from skillmodels.fit import fit
+from skillmodels.fit import get_jacobian_type
+from skillmodels.likelihood_function import get_maximization_inputs
+from skillmodels.process_model import get_dimensions
+from skillmodels.utilities import extract_period
+from skillmodels.utilities import update_parameter_values
+
+MEASUREMENT_CATEGORIES = ["controls", "loadings", "meas_sds"]
+
+
+def fit_two_step(
+    model_dict,
+    data,
+    start_params,
+    algorithm="lbfgs",
+    algo_options=None,
+    n_cores=1,
+    polish=True,
+):
+    """Estimate a model in two steps and optionally polish the estimates jointly.
+
+    1. The measurement system of each period is estimated separately with a model
+       that only has that period (see :func:`skillmodels.utilities.extract_period`).
+       These models are small and can be estimated in parallel.
+    2. The loadings, measurement standard deviations and coefficients of control
+       variables are fixed at the estimates of the first step. The other parameters
+       are estimated with the full model, starting from the intercepts of the first
+       step. The intercepts are not fixed because they depend on the means of the
+       factors, which are not comparable between the models of the two steps.
+    3. If polish is True, all parameters are estimated jointly, starting from the
+       estimates of the second step.
+
+    If polish is False, the loadings, measurement standard deviations and control
+    coefficients stay at the estimates of the one-period models. The resulting
+    parameters are therefore not the maximum likelihood estimates of the full model.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`
+        data (DataFrame): dataset in long format.
+        start_params (pandas.DataFrame): Parameter DataFrame with the start values in
+            the "value" column. It has to satisfy the constraints of the model.
+        algorithm (str): "lbfgs" or "bhhh".
+        algo_options (dict): Keyword arguments for the optimizer.
+        n_cores (int): Number of processes for the models of the first step. The
+            processes are started with the "spawn" method, which means that
+            model_dict and data have to be picklable.
+        polish (bool): Whether all parameters are estimated jointly in the end. Only
+            then are the final estimates maximum likelihood estimates of the full
+            model.
+
+    Returns:
+        dict: Dictionary with the entries:
+            - "params" (pandas.DataFrame): The final estimates.
+            - "measurement_results" (dict): Maps periods to the results of
+              :func:`skillmodels.fit.fit` for the measurement system of that period.
+            - "transition_result" (dict): The result of the second step.
+            - "joint_result" (dict or None): The result of the third step.
+
+    """
+    fit_kwargs = {"algorithm": algorithm, "algo_options": algo_options}
+    jacobian_type = get_jacobian_type(algorithm)
+
+    periods = range(get_dimensions(model_dict)["n_periods"])
+    tasks = []
+    for period in periods:
+        period_model, period_params = extract_period(model_dict, period, start_params)
+        period_data = _get_period_data(data, period)
+        tasks.append((period_model, period_data, period_params, fit_kwargs))
+
+    if n_cores == 1:
+        measurement_results = [_fit_measurement_system(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_cores, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            measurement_results = list(
+                executor.map(_fit_measurement_system, *zip(*tasks))
+            )
+    measurement_results = dict(zip(periods, measurement_results))
+
+    measurement_params = pd.concat(
+        [
+            _get_measurement_params(res["params"], period)
+            for period, res in measurement_results.items()
+        ]
+    )
+    params = update_parameter_values(start_params, measurement_params)
+
+    name2 = measurement_params.index.get_level_values("name2")
+    to_fix = measurement_params[name2 != "constant"]
+    fix_constraint = {
+        "loc": to_fix.index.tolist(),
+        "type": "fixed",
+        "value": to_fix["value"].to_numpy(),
+        "description": "Measurement parameters estimated in the first step.",
+    }
+    transition_inputs = get_maximization_inputs(
+        model_dict,
+        data,
+        jacobian_type=jacobian_type,
+        free_params=True,
+        additional_constraints=[fix_constraint],
+    )
+    transition_result = fit(
+        model_dict,
+        data,
+        params,
+        maximization_inputs=transition_inputs,
+        **fit_kwargs,
+    )
+
+    if polish:
+        joint_result = fit(model_dict, data, transition_result["params"], **fit_kwargs)
+        final_params = joint_result["params"]
+    else:
+        joint_result = None
+        final_params = transition_result["params"]
+
+    out = {
+        "params": final_params,
+        "measurement_results": measurement_results,
+        "transition_result": transition_result,
+        "joint_result": joint_result,
+    }
+    return out
+
+
+def _fit_measurement_system(period_model, period_data, period_params, fit_kwargs):
+    return fit(period_model, period_data, period_params, **fit_kwargs)
+
+
+def _get_period_data(data, period):
+    """Select the data of one period and relabel it as period 0.
+
+    As in :func:`skillmodels.process_data.pre_process_data`, the second index level
+    contains the periods and period is the position in their sorted values. The
+    name and coding of the level do not matter.
+
+    """
+    period_values = data.index.get_level_values(1)
+    selected = sorted(period_values.unique())[period]
+    period_data = data[period_values == selected]
+    return period_data.rename(index={selected: 0}, level=1)
+
+
+def _get_measurement_params(period_params, period):
+    """Select the measurement parameters of a one-period model.
+
+    The period of the selected parameters is relabelled from 0 to period.
+
+    """
+    categories = period_params.index.get_level_values("category")
+    measurement_params = period_params[categories.isin(MEASUREMENT_CATEGORIES)]
+    return measurement_params.rename(index={0: period}, level="period")
@@ -1,6 +1,9 @@
+import os
+import pickle
 import warnings
 from copy import deepcopy
 
+import jax
 import numpy as np
 import pandas as pd
 
@@ -262,6 +265,139 @@ def reduce_n_periods(model_dict, new_n_periods, params=None):
     return out
 
 
+def extract_period(model_dict, period, params=None):
+    """Reduce a specification to the measurement system of one period.
+
+    The reduced model has one period and no transition equations. It contains the
+    factors that are measured in that period. Its measurement parameters have period
+    0 and its initial states describe the distribution of the factors in the
+    extracted period.
+
+    If provided, a params DataFrame is also reduced correspondingly. The measurement
+    parameters are taken from the extracted period, the initial states and mixture
+    weights from the params of the full model.
+
+    Args:
+        model_dict (dict): The model specification. See: :ref:`model_specs`.
+        period (int): The period to extract.
+        params (pandas.DataFrame or None): The params DataFrame for the full model.
+
+    Returns:
+        dict: The reduced model dictionary
+        pandas.DataFrame: The reduced parameter DataFrame (only if params is not None)
+
+    """
+    out = deepcopy(model_dict)
+    unmeasured = []
+    for factor in model_dict["factors"]:
+        measurements = model_dict["factors"][factor]["measurements"]
+        if period < len(measurements) and measurements[period]:
+            out["factors"][factor]["measurements"] = [measurements[period]]
+        else:
+            unmeasured.append(factor)
+
+        norminfo = model_dict["factors"][factor].get("normalizations", {})
+        for key in ["loadings", "intercepts"]:
+            if key in norminfo:
+                norms = norminfo[key]
+                norm = norms[period] if period < len(norms) else {}
+                out["factors"][factor]["normalizations"][key] = [norm]
+
+    out = _remove_from_dict(out, "stagemap")
+    if unmeasured:
+        out = remove_factors(unmeasured, out)
+
+    if params is not None:
+        categories = params.index.get_level_values("category")
+        periods = params.index.get_level_values("period")
+        is_measurement_param = categories.isin(["controls", "loadings", "meas_sds"])
+        measurement_params = params[is_measurement_param & (periods == period)]
+        measurement_params = measurement_params.rename(
+            index={period: 0}, level="period"
+        )
+        initial_params = params[
+            categories.isin(["initial_states", "initial_cholcovs", "mixture_weights"])
+        ]
+        out_params = _extend_params(
+            pd.concat([measurement_params, initial_params]), out, 0.05
+        )
+        out = (out, out_params)
+
+    return out
+
+
+def initialize_compilation_cache(cache_dir):
+    """Store compiled jax functions in cache_dir and load them from there.
+
+    Args:
+        cache_dir (str or pathlib.Path): Directory of the persistent compilation
+            cache.
+
+    """
+    try:
+        jax.config.update("jax_compilation_cache_dir", str(cache_dir))
+    except AttributeError:
+        # older jax versions only provide the experimental interface
+        from jax.experimental.compilation_cache import compilation_cache
+
+        if not compilation_cache.is_initialized():
+            compilation_cache.initialize_cache(str(cache_dir))
+
+
+def save_atomically(obj, path):
+    """Pickle obj to path such that an interruption does not leave a partial file.
+
+    Args:
+        obj: Any picklable object.
+        path (pathlib.Path): Path of the pickle file.
+
+    """
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(temporary_path, path)
+
+
+def anchor_states(states, pardict):
+    """Anchor an array of unanchored states.
+
+    Args:
+        states (numpy.ndarray or jax.numpy.array): Array of shape (..., n_periods,
+            n_obs, n_states) with unanchored states.
+        pardict (dict): See :func:`skillmodels.parse_params.parse_params`.
+
+    Returns:
+        numpy.ndarray: The anchored states.
+
+    """
+    n_states = states.shape[-1]
+    scaling_factors = np.array(pardict["anchoring_scaling_factors"][:, :n_states])
+    constants = np.array(pardict["anchoring_constants"][:, :n_states])
+    return states * scaling_factors[:, None] + constants[:, None]
+
+
+def get_padded_chunk(arr, start, chunk_size):
+    """Select a chunk of individuals from arr and pad it to chunk_size individuals.
+
+    Padding every chunk to the same size allows to compile functions of chunks only
+    once.
+
+    Args:
+        arr (numpy.ndarray or jax.numpy.array): Array of shape (n_periods, n_obs, ...).
+        start (int): Position of the first individual of the chunk.
+        chunk_size (int): Number of individuals per chunk.
+
+    Returns:
+        numpy.ndarray: Array of shape (n_periods, chunk_size, ...). Missing
+            individuals at the end are filled with copies of the last individual.
+
+    """
+    chunk = np.asarray(arr[:, start : start + chunk_size])
+    padding = [(0, 0)] * chunk.ndim
+    padding[1] = (0, chunk_size - chunk.shape[1])
+    return np.pad(chunk, padding, mode="edge")
+
+
 def _remove_from_list(list_, to_remove):
     if isinstance(to_remove, str):
         to_remove = [to_remove]
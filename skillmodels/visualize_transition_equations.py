@@ -334,7 +334,6 @@ def _get_pardict(model, params):
         parsing_info=parsing_info,
         dimensions=model["dimensions"],
         labels=model["labels"],
-        n_obs=1,
     )
     return pardict
 